@@ -0,0 +1,277 @@
+# Indexed replay archives: open any game and jump to any turn without a scan
+#
+#   python coup_archive.py build games.cpa replays/*.cpr   # pack replay files
+#   python coup_archive.py info games.cpa
+#   python coup_archive.py show games.cpa 3141592 --turn 40 [--step]
+#
+#   from coup_archive import Archive
+#   state = Archive.open("games.cpa")[3141592].seek(40)
+#
+# An archive is two files. `games.cpa` holds the games one after another:
+# each one is a small header, a keyframe (the full GameState buffer) at the
+# start of every `keyframe_turns`-th turn, then the game's steps in the
+# coup_replay.py encoding. `games.cpa.idx` is an array of 8-byte offsets,
+# one per game. Both are memory-mapped, so finding a game is one lookup and
+# seeking to a turn replays at most `keyframe_turns` turns from the nearest
+# keyframe.
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+
+from coup_engine import GAME_OVER, GameState, step
+from coup_events import GameEnded, GameStarted, Stepped, TextSink, describe_step
+from coup_replay import Replay, _Replayed, decode_steps, encode_steps, format_state, play_back, read_replays
+
+DATA_MAGIC = b"CPAD"
+INDEX_MAGIC = b"CPAI"
+VERSION = 2  # 2: GameState buffers carry the live-seat bitmask and count
+_FILE_HEADER = struct.Struct("<4sB3x")
+_GAME_HEADER = struct.Struct("<BHI")       # players, keyframes, length of the step bytes
+_KEYFRAME = struct.Struct("<HI")           # turn, steps played before it
+_OFFSET = struct.Struct("<Q")
+_STATE_BYTES = len(GameState(2).key())
+
+
+def _state_bytes(state):
+    buf = state.buf
+    if sys.byteorder == "big":
+        buf = buf[:]
+        buf.byteswap()
+    return buf.tobytes()
+
+
+def _state_from_bytes(data):
+    buf = array('h')
+    buf.frombytes(data)
+    if sys.byteorder == "big":
+        buf.byteswap()
+    state = GameState.__new__(GameState)
+    state.buf = buf
+    return state
+
+
+def _check_header(data, magic, path):
+    found, version = _FILE_HEADER.unpack_from(data)
+    if found != magic:
+        raise ValueError(f"{path} is not a Coup archive.")
+    if version != VERSION:
+        raise ValueError(f"{path} is archive format {version}; this reader handles {VERSION}.")
+
+
+class ArchiveWriter:
+    """
+    Appends games to an archive, creating it if needed. Takes Replays
+    through write() or, as an event sink, whole games from an EventStream.
+    """
+
+    def __init__(self, path, keyframe_turns=8):
+        self.keyframe_turns = keyframe_turns
+        new = not os.path.exists(path)
+        self.data = open(path, "ab")
+        self.index = open(path + ".idx", "ab")
+        if new:
+            self.data.write(_FILE_HEADER.pack(DATA_MAGIC, VERSION))
+            self.index.write(_FILE_HEADER.pack(INDEX_MAGIC, VERSION))
+        self._game = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def emit(self, event):
+        if isinstance(event, GameStarted):
+            self._game = Replay(event.num_players, event.draws, [])
+        elif isinstance(event, Stepped):
+            self._game.steps.append((event.action, event.draws))
+        elif isinstance(event, GameEnded):
+            self.write(self._game)
+            self._game = None
+
+    def write(self, replay):
+        keyframes = []
+        turn = -1
+        for steps, (before, _, _) in enumerate(play_back(replay)):
+            if before.turn != turn:
+                turn = before.turn
+                if turn % self.keyframe_turns == 0:
+                    keyframes.append(_KEYFRAME.pack(turn, steps) + _state_bytes(before))
+        moves = encode_steps(replay.steps)
+        self.index.write(_OFFSET.pack(self.data.tell()))
+        self.data.write(_GAME_HEADER.pack(replay.num_players, len(keyframes), len(moves)))
+        self.data.write(b"".join(keyframes))
+        self.data.write(moves)
+
+
+class ArchivedGame:
+    """One game in an Archive, decoded lazily from the mapped file."""
+
+    def __init__(self, data, offset):
+        self.num_players, count, length = _GAME_HEADER.unpack_from(data, offset)
+        offset += _GAME_HEADER.size
+        size = _KEYFRAME.size + _STATE_BYTES
+        self._keyframes = [(*_KEYFRAME.unpack_from(data, offset + i * size), offset + i * size + _KEYFRAME.size)
+                           for i in range(count)]
+        self._turns = [turn for turn, _, _ in self._keyframes]
+        self._data = data
+        self._moves = offset + count * size
+        self._length = length
+
+    @property
+    def steps(self):
+        """The game's (action, draws) pairs."""
+        return decode_steps(self._data[self._moves:self._moves + self._length])
+
+    @property
+    def turns(self):
+        """How many turns the game lasted."""
+        _, steps, state = self._keyframe(self._turns[-1])
+        for action, draws in self.steps[steps:]:
+            state = step(state, action, _Replayed(draws))
+        return state.turn + 1
+
+    def seek(self, turn):
+        """The state at the start of `turn` (counting from 0)."""
+        return self._seek(turn)[0]
+
+    def play_back(self, turn=0):
+        """Yields (before, action, after) for every step from the start of `turn`."""
+        state, steps = self._seek(turn)
+        for action, draws in self.steps[steps:]:
+            after = step(state, action, _Replayed(draws))
+            yield state, action, after
+            state = after
+
+    def _keyframe(self, turn):
+        """The last keyframe at or before `turn`, as (turn, steps before it, state)."""
+        keyframe_turn, steps, at = self._keyframes[bisect_right(self._turns, turn) - 1]
+        return keyframe_turn, steps, _state_from_bytes(self._data[at:at + _STATE_BYTES])
+
+    def _seek(self, turn):
+        if turn < 0:
+            raise IndexError(f"No turn {turn}.")
+        _, steps, state = self._keyframe(turn)
+        moves = self.steps
+        while state.turn < turn:
+            if steps == len(moves):
+                raise IndexError(f"The game only lasted {state.turn + 1} turns.")
+            action, draws = moves[steps]
+            state = step(state, action, _Replayed(draws))
+            steps += 1
+        if state.turn != turn or state.phase == GAME_OVER:
+            raise IndexError(f"The game only lasted {state.turn + 1} turns.")
+        return state, steps
+
+
+class Archive:
+    """
+    A read-only, memory-mapped archive. `archive[game_id]` is an
+    ArchivedGame; len() is the number of games.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(path + ".idx", "rb") as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _check_header(self._data, DATA_MAGIC, path)
+        _check_header(self._index, INDEX_MAGIC, path + ".idx")
+        self._count = (len(self._index) - _FILE_HEADER.size) // _OFFSET.size
+
+    @classmethod
+    def open(cls, path):
+        return cls(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, game_id):
+        if not 0 <= game_id < self._count:
+            raise IndexError(f"{self.path} holds games 0 to {self._count - 1}.")
+        offset, = _OFFSET.unpack_from(self._index, _FILE_HEADER.size + game_id * _OFFSET.size)
+        return ArchivedGame(self._data, offset)
+
+    def __iter__(self):
+        return (self[game_id] for game_id in range(self._count))
+
+
+def build(path, replay_paths, keyframe_turns=8):
+    """Appends every game in the binary replay files `replay_paths` to the archive at `path`."""
+    count = 0
+    with ArchiveWriter(path, keyframe_turns) as writer:
+        for replay_path in replay_paths:
+            with open(replay_path, "rb") as f:
+                for replay in read_replays(f):
+                    writer.write(replay)
+                    count += 1
+    return count
+
+
+def show(path, game_id, turn=0, interactive=False):
+    with Archive.open(path) as archive:
+        game = archive[game_id]
+        sink = TextSink()
+        current = None
+        for before, action, after in game.play_back(turn):
+            if before.turn != current:
+                if current is not None and interactive:
+                    input("-- Press Enter for the next turn --")
+                current = before.turn
+                print(f"\n{format_state(before)}")
+            for event in describe_step(before, action, after):
+                sink.emit(event)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and browse indexed Coup replay archives.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="append replay files to an archive")
+    build_parser.add_argument("archive")
+    build_parser.add_argument("replays", nargs="+", help="binary replay files (see coup_replay.py)")
+    build_parser.add_argument("--keyframe-turns", type=int, default=8, help="turns between full-state keyframes")
+    info_parser = commands.add_parser("info", help="count the games in an archive")
+    info_parser.add_argument("archive")
+    show_parser = commands.add_parser("show", help="play a game back from any turn")
+    show_parser.add_argument("archive")
+    show_parser.add_argument("game", type=int, help="game number")
+    show_parser.add_argument("--turn", type=int, default=1, help="turn to start from (counting from 1)")
+    show_parser.add_argument("--step", action="store_true", help="wait for Enter after every turn")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build(args.archive, args.replays, args.keyframe_turns)
+        print(f"Added {count} games to {args.archive}.")
+    elif args.command == "info":
+        with Archive.open(args.archive) as archive:
+            size = os.path.getsize(args.archive) + os.path.getsize(args.archive + ".idx")
+            print(f"{args.archive}: {len(archive)} games, {size / 1e6:.1f} MB")
+    else:
+        try:
+            show(args.archive, args.game, args.turn - 1, args.step)
+        except IndexError as e:
+            sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+# Lockstep NumPy simulator: plays a whole array of RandomBot games at once
+#
+#   python coup_batch.py --games 100000 --players 4 --params '{"challenge_rate": 50}'
+#
+# Every game in the batch advances through the same turn pipeline (pick an
+# action, challenge it, block it, apply it). Each decision is one vectorized
+# draw for all the games that reach it, and state updates are masked array
+# writes. Rules and bot behaviour match coup_engine.step and coup_bots.RandomBot.
+
+import argparse
+import inspect
+import json
+import time
+
+import numpy as np
+
+from coup_bots import RandomBot
+from coup_engine import (
+    ACTION_KINDS, AMBASSADOR, ASSASSINATE_COST, CAPTAIN, CARDS_PER_ROLE, CLAIMS, CONTESSA,
+    COUP_COST, DUKE, FORCED_COUP, MAX_PLAYERS, ROLES,
+)
+
+INCOME, FOREIGN_AID, COUP, TAX, ASSASSINATE, EXCHANGE, STEAL = range(len(ACTION_KINDS))
+
+# Role claimed by each action kind, -1 for unclaimed actions
+_CLAIM_ROLE = np.array([CLAIMS.get(kind, -1) for kind in ACTION_KINDS])
+
+# RandomBot parameters and their defaults, taken from its constructor
+DEFAULT_PARAMS = {
+    name: parameter.default
+    for name, parameter in inspect.signature(RandomBot.__init__).parameters.items()
+    if name not in ("self", "rng")
+}
+
+
+def _seat_params(params, num_players):
+    """Stacks one parameter dict per seat into arrays indexed by seat."""
+    if params is None or isinstance(params, dict):
+        params = [params or {}] * num_players
+    if len(params) != num_players:
+        raise ValueError("Need one parameter set per seat.")
+    unknown = {name for p in params for name in p} - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    return {
+        name: np.array([p.get(name, default) for p in params], dtype=np.float64)
+        for name, default in DEFAULT_PARAMS.items()
+    }
+
+
+def _categorical(rng, weights):
+    """Draws one index per row of `weights` (rows need not be normalised)."""
+    cumulative = np.cumsum(weights, axis=1)
+    u = rng.random(len(weights)) * cumulative[:, -1]
+    return (u[:, None] >= cumulative).sum(axis=1)
+
+
+class BatchSimulator:
+    """`num_games` independent games of `num_players` RandomBots, in lockstep."""
+
+    def __init__(self, num_games, num_players, params=None, seed=None):
+        if not 2 <= num_players <= MAX_PLAYERS:
+            raise ValueError("Coup needs between 2 and 6 players.")
+        self.num_games = num_games
+        self.num_players = num_players
+        self.params = _seat_params(params, num_players)
+        self.rng = np.random.default_rng(seed)
+        self.games = np.arange(num_games)
+
+        self.coins = np.full((num_games, num_players), 2, dtype=np.int16)
+        self.cards = np.zeros((num_games, num_players, 2), dtype=np.int8)
+        self.dead = np.zeros((num_games, num_players, 2), dtype=bool)
+        self.deck = np.full((num_games, len(ROLES)), CARDS_PER_ROLE, dtype=np.int16)
+        self.current = np.zeros(num_games, dtype=np.int64)
+        self.turns = np.zeros(num_games, dtype=np.int64)
+        self.done = np.zeros(num_games, dtype=bool)
+        self.winner = np.full(num_games, -1, dtype=np.int64)
+
+        everyone = self.games
+        for seat in range(num_players):
+            for slot in (0, 1):
+                self.cards[everyone, seat, slot] = self._draw(everyone)
+
+    # State queries
+
+    def alive(self):
+        return ~(self.dead[:, :, 0] & self.dead[:, :, 1])
+
+    def _has_role(self, idx, seats, roles):
+        cards = self.cards[idx, seats]
+        live = ~self.dead[idx, seats]
+        return ((cards == np.asarray(roles)[..., None]) & live).any(axis=1)
+
+    # Card movements
+
+    def _draw(self, idx):
+        """Draws one card from the deck of each game in `idx`."""
+        counts = self.deck[idx]
+        index = np.floor(self.rng.random(len(idx)) * counts.sum(axis=1))
+        roles = (np.cumsum(counts, axis=1) <= index[:, None]).sum(axis=1)
+        self.deck[idx, roles] -= 1
+        return roles
+
+    def _lose(self, mask, seats):
+        """The players `seats[mask]` each reveal one of their live cards at random."""
+        idx = np.nonzero(mask)[0]
+        if not len(idx):
+            return
+        seats = seats[idx]
+        live = ~self.dead[idx, seats]
+        has_card = live.any(axis=1)
+        idx, seats, live = idx[has_card], seats[has_card], live[has_card]
+        slot = (live[:, 1] & (~live[:, 0] | (self.rng.random(len(idx)) < 0.5))).astype(np.int64)
+        self.dead[idx, seats, slot] = True
+
+        alive = self.alive()[idx]
+        over = alive.sum(axis=1) == 1
+        self.done[idx[over]] = True
+        self.winner[idx[over]] = alive[over].argmax(axis=1)
+
+    # Decisions shared by several actions
+
+    def _first_challenger(self, mask, claimants, rates):
+        """The first player after each claimant, in seat order, who challenges."""
+        n = self.num_players
+        alive = self.alive()
+        challenger = np.full(self.num_games, -1, dtype=np.int64)
+        for offset in range(1, n):
+            seats = (claimants + offset) % n
+            eligible = mask & (challenger < 0) & alive[self.games, seats]
+            hit = eligible & (self.rng.random(self.num_games) * 100 < rates[seats])
+            challenger[hit] = seats[hit]
+        return challenger
+
+    def _resolve_claim(self, mask, claimants, roles, rates):
+        """
+        Opens the claims `claimants` -> `roles` to challenge. Returns the games
+        where the claim stands.
+        """
+        roles = np.broadcast_to(roles, claimants.shape)
+        challenger = self._first_challenger(mask, claimants, rates)
+        challenged = mask & (challenger >= 0)
+        idx = np.nonzero(challenged)[0]
+        truthful = np.zeros(self.num_games, dtype=bool)
+        truthful[idx] = self._has_role(idx, claimants[idx], roles[idx])
+
+        # Truthful: the revealed card goes back to the deck and is replaced
+        idx = np.nonzero(challenged & truthful)[0]
+        if len(idx):
+            seats, shown = claimants[idx], roles[idx]
+            slot = (~((self.cards[idx, seats, 0] == shown) & ~self.dead[idx, seats, 0])).astype(np.int64)
+            self.deck[idx, shown] += 1
+            self.cards[idx, seats, slot] = self._draw(idx)
+        self._lose(challenged & truthful, challenger)
+        self._lose(challenged & ~truthful, claimants)
+        return mask & ~(challenged & ~truthful)
+
+    # Turn pipeline
+
+    def _choose_actions(self, active):
+        p = self.params
+        actors = self.current
+        coins = self.coins[self.games, actors]
+        weights = np.zeros((self.num_games, len(ACTION_KINDS)))
+        forced = coins >= FORCED_COUP
+        rich = (coins >= COUP_COST) & ~forced
+        mid = (coins >= ASSASSINATE_COST) & (coins < COUP_COST)
+        poor = coins < ASSASSINATE_COST
+        weights[forced, COUP] = 1
+        weights[np.ix_(rich, [COUP, ASSASSINATE])] = p["rich_weights"][actors[rich]]
+        weights[np.ix_(mid, [ASSASSINATE, EXCHANGE, STEAL, FOREIGN_AID, INCOME])] = p["mid_weights"][actors[mid]]
+        weights[np.ix_(poor, [EXCHANGE, STEAL, FOREIGN_AID, INCOME])] = 1
+        kinds = _categorical(self.rng, weights)
+
+        # Targets are uniform among the other players still in the game
+        keys = self.rng.random((self.num_games, self.num_players))
+        keys[~self.alive()] = -1
+        keys[self.games, actors] = -1
+        targets = keys.argmax(axis=1)
+        kinds[~active] = -1
+        return kinds, targets
+
+    def _foreign_aid(self, mask, actors):
+        p = self.params
+        n = self.num_players
+        blocked = np.zeros(self.num_games, dtype=bool)
+        for offset in range(1, n):
+            blockers = (actors + offset) % n
+            asking = mask & ~blocked & ~self.done & self.alive()[self.games, blockers]
+            blocks = asking & (self.rng.random(self.num_games) * 100 < p["block_foreign_aid_rate"][blockers])
+            blocked |= self._resolve_claim(blocks, blockers, DUKE, p["challenge_rate"])
+        gain = mask & ~blocked & ~self.done
+        self.coins[gain, actors[gain]] += 2
+
+    def _assassinate(self, mask, actors, targets):
+        p = self.params
+        idx = np.nonzero(mask)[0]
+        contessa = np.zeros(self.num_games, dtype=bool)
+        contessa[idx] = self._has_role(idx, targets[idx], CONTESSA)
+        blocks = mask & (contessa | (self.rng.random(self.num_games) * 100 < p["bluff_contessa_rate"][targets]))
+        blocked = self._resolve_claim(blocks, targets, CONTESSA, p["block_challenge_rate"])
+        self._lose(mask & ~blocked & ~self.done, targets)
+
+    def _steal(self, mask, actors, targets):
+        p = self.params
+        response = _categorical(self.rng, p["steal_response_weights"][targets])
+        roles = np.where(response == 1, CAPTAIN, AMBASSADOR)
+        idx = np.nonzero(mask & (response > 0))[0]
+        holds = np.zeros(self.num_games, dtype=bool)
+        holds[idx] = self._has_role(idx, targets[idx], roles[idx])
+        blocks = mask & holds & (self.rng.random(self.num_games) * 100 < p["steal_block_rate"][targets])
+        blocked = self._resolve_claim(blocks, targets, roles, p["block_challenge_rate"])
+        take = mask & ~blocked & ~self.done
+        amount = np.minimum(2, self.coins[take, targets[take]])
+        self.coins[take, targets[take]] -= amount
+        self.coins[take, actors[take]] += amount
+
+    def _exchange(self, mask, actors):
+        idx = np.nonzero(mask)[0]
+        if not len(idx):
+            return
+        seats = actors[idx]
+        live = ~self.dead[idx, seats]
+        keep = live.sum(axis=1)
+        pool = np.where(live, self.cards[idx, seats], -1)
+        pool = np.concatenate([pool, self._draw(idx)[:, None], self._draw(idx)[:, None]], axis=1)
+        # Keep a random selection of the available cards
+        keys = self.rng.random(pool.shape)
+        keys[pool < 0] = np.inf
+        pool = np.take_along_axis(pool, np.argsort(keys, axis=1), axis=1)
+        # Live slots are refilled in order from the front of the shuffled pool
+        ranks = np.stack([np.zeros(len(idx), dtype=np.int64), live[:, 0].astype(np.int64)], axis=1)
+        for slot in (0, 1):
+            fill = live[:, slot]
+            self.cards[idx[fill], seats[fill], slot] = pool[fill, ranks[fill, slot]]
+        for rank in range(4):
+            returned = (rank >= keep) & (pool[:, rank] >= 0)
+            np.add.at(self.deck, (idx[returned], pool[returned, rank]), 1)
+
+    def play_turn(self):
+        active = ~self.done
+        actors = self.current
+        kinds, targets = self._choose_actions(active)
+        p = self.params
+
+        income = kinds == INCOME
+        self.coins[income, actors[income]] += 1
+
+        coup = kinds == COUP
+        self.coins[coup, actors[coup]] -= COUP_COST
+        self._lose(coup, targets)
+
+        self._foreign_aid(kinds == FOREIGN_AID, actors)
+
+        assassinate = kinds == ASSASSINATE
+        self.coins[assassinate, actors[assassinate]] -= ASSASSINATE_COST  # Pay the cost first
+        claimed = _CLAIM_ROLE[kinds] >= 0
+        upheld = self._resolve_claim(claimed & active, actors, _CLAIM_ROLE[kinds], p["challenge_rate"])
+        upheld &= ~self.done
+
+        tax = upheld & (kinds == TAX)
+        self.coins[tax, actors[tax]] += 3
+        on_target = upheld & self.alive()[self.games, targets]
+        self._assassinate(on_target & (kinds == ASSASSINATE), actors, targets)
+        self._steal(on_target & (kinds == STEAL), actors, targets)
+        self._exchange(upheld & (kinds == EXCHANGE), actors)
+
+        # Pass the turn to the next player still in the game
+        carry_on = active & ~self.done
+        self.turns[carry_on] += 1
+        alive = self.alive()
+        nxt = self.current.copy()
+        moved = np.zeros(self.num_games, dtype=bool)
+        for offset in range(1, self.num_players + 1):
+            seats = (actors + offset) % self.num_players
+            hit = carry_on & ~moved & alive[self.games, seats]
+            nxt[hit] = seats[hit]
+            moved |= hit
+        self.current = nxt
+
+    def run(self, max_turns=1000):
+        for _ in range(max_turns):
+            if self.done.all():
+                break
+            self.play_turn()
+        return self.results()
+
+    def results(self):
+        finished = self.done
+        wins = np.bincount(self.winner[finished], minlength=self.num_players)
+        turns = self.turns[finished]
+        games = int(finished.sum())
+        return {
+            "games": self.num_games,
+            "finished": games,
+            "seat_wins": wins.tolist(),
+            "seat_win_rates": (wins / max(games, 1)).tolist(),
+            "mean_turns": float(turns.mean()) if games else 0.0,
+            "std_turns": float(turns.std()) if games else 0.0,
+            "turn_percentiles": {q: float(np.percentile(turns, q)) for q in (50, 90, 99)} if games else {},
+        }
+
+
+def simulate(num_games, num_players, params=None, seed=None, max_turns=1000):
+    """
+    Plays `num_games` RandomBot games and returns win-rate statistics.
+
+    `params` is either one dict of RandomBot keyword arguments for every seat,
+    or a list with one dict per seat.
+    """
+    return BatchSimulator(num_games, num_players, params, seed).run(max_turns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many RandomBot games at once with NumPy.")
+    parser.add_argument("--games", type=int, default=100000, help="number of games in the batch")
+    parser.add_argument("--players", type=int, default=4, help="players per game (2-6)")
+    parser.add_argument("--params", default="{}",
+                        help="JSON RandomBot parameters for seat 1; the other seats keep the defaults")
+    parser.add_argument("--all-seats", action="store_true", help="apply --params to every seat")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args(argv)
+
+    candidate = json.loads(args.params)
+    params = candidate if args.all_seats else [candidate] + [{}] * (args.players - 1)
+    start = time.perf_counter()
+    results = simulate(args.games, args.players, params, args.seed)
+    elapsed = time.perf_counter() - start
+
+    print(f"Simulated {results['finished']}/{results['games']} games in {elapsed:.2f}s "
+          f"({results['games'] / elapsed:.0f} games/sec)")
+    print(f"Game length: mean {results['mean_turns']:.2f}, std {results['std_turns']:.2f}, "
+          + ", ".join(f"p{q} {v:.0f}" for q, v in results["turn_percentiles"].items()))
+    for seat, rate in enumerate(results["seat_win_rates"]):
+        print(f"  Seat {seat + 1}: {100 * rate:.2f}%")
+
+
+if __name__ == "__main__":
+    main()
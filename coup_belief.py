@@ -0,0 +1,265 @@
+# Bayesian beliefs about the hidden hands of the other players
+#
+# A BeliefTracker follows one game from one seat's point of view. For every
+# opponent it keeps a weight per possible face-down hand, split into two
+# factors: the chance of being dealt that hand from the cards the seat has
+# not seen (a product of binomials, refreshed only for the roles whose
+# unseen count changed) and the likelihood of everything the opponent has
+# done since they last shuffled their hand (claims, challenges). Every event
+# updates those factors in place and refreshes a small table of marginals,
+# so asking how likely an opponent is to hold a role is a list lookup.
+#
+# Opponents are tracked independently: each hand is weighed against the
+# unseen cards, not against the other opponents' hands.
+
+import random
+from itertools import combinations_with_replacement
+from math import comb
+
+from coup_bots import STRATEGIES, RandomBot
+from coup_engine import (
+    ACTION, BLOCK, CHALLENGE, CHALLENGE_ACTION, CLAIMS, EXCHANGE, LOSE, PASS_ACTION, CARDS_PER_ROLE, ROLES,
+)
+
+
+class _Hands:
+    """The belief about one opponent's face-down hand."""
+    __slots__ = ('hands', 'prior', 'likelihood', 'probability', 'holding')
+
+    def __init__(self, size, unseen):
+        self.hands = list(combinations_with_replacement(range(len(ROLES)), size))
+        self.likelihood = [1.0] * len(self.hands)
+        self.prior = [_dealt(hand, unseen) for hand in self.hands]
+        self.refresh()
+
+    def refresh(self):
+        weights = [p * l for p, l in zip(self.prior, self.likelihood)]
+        total = sum(weights)
+        if total == 0:
+            # Everything seen contradicts the model (a bluff it thought
+            # impossible, say): fall back to the cards alone
+            self.likelihood = [1.0] * len(self.hands)
+            weights = self.prior[:]
+            total = sum(weights)
+        self.probability = [w / total for w in weights]
+        holding = [0.0] * len(ROLES)
+        for hand, p in zip(self.hands, self.probability):
+            for role in set(hand):
+                holding[role] += p
+        self.holding = holding
+
+    def set_posterior(self, weights):
+        """Replaces the belief with `weights` over the current hands."""
+        self.likelihood = [w / p if p else 0.0 for w, p in zip(weights, self.prior)]
+        self.refresh()
+
+
+def _dealt(hand, unseen):
+    """How many ways `hand` can be dealt from the `unseen` cards."""
+    ways = 1
+    for role in set(hand):
+        ways *= comb(unseen[role], hand.count(role))
+    return ways
+
+
+class BeliefTracker:
+    """
+    What `seat` believes about every other player's hand. Feed it each step
+    of the game with observe(), or call the event methods directly; then
+    query holds() and hand_distribution() at any time.
+
+    `bluff_likelihood` is how likely a player is to claim a role they do
+    not hold, relative to one they do.
+    """
+
+    def __init__(self, state, seat, bluff_likelihood=0.3):
+        self.seat = seat
+        self.bluff_likelihood = bluff_likelihood
+        self.own_hand = sorted(state.hands[seat])
+        self.unseen = [CARDS_PER_ROLE] * len(ROLES)
+        for role in self.own_hand:
+            self.unseen[role] -= 1
+        for dead in state.dead:
+            for role in dead:
+                self.unseen[role] -= 1
+        self.beliefs = {p: _Hands(state.influences(p), self.unseen)
+                        for p in range(state.num_players) if p != seat}
+
+    # Queries
+
+    def holds(self, player, role):
+        """The probability that `player` has at least one face-down `role`."""
+        if player == self.seat:
+            return 1.0 if role in self.own_hand else 0.0
+        return self.beliefs[player].holding[role]
+
+    def hand_distribution(self, player):
+        """{sorted hand tuple: probability} for `player`'s face-down cards."""
+        belief = self.beliefs[player]
+        return {hand: p for hand, p in zip(belief.hands, belief.probability) if p > 0}
+
+    # Events
+
+    def claim(self, player, role):
+        """`player` claimed `role`, for an action or a block."""
+        if player == self.seat:
+            return
+        belief = self.beliefs[player]
+        bluff = self.bluff_likelihood
+        belief.likelihood = [l if role in hand else l * bluff for hand, l in zip(belief.hands, belief.likelihood)]
+        belief.refresh()
+
+    def refuted(self, player, role):
+        """`player` was challenged and could not show `role`."""
+        if player == self.seat:
+            return
+        belief = self.beliefs[player]
+        belief.likelihood = [0.0 if role in hand else l for hand, l in zip(belief.hands, belief.likelihood)]
+        belief.refresh()
+
+    def upheld(self, player, role):
+        """
+        `player` showed `role` to a challenger, shuffled it into the deck and
+        drew a replacement.
+        """
+        if player == self.seat:
+            return  # Our own new card arrives through sync()
+        belief = self.beliefs[player]
+        unseen = self.unseen
+        total = sum(unseen)
+        index = {hand: i for i, hand in enumerate(belief.hands)}
+        weights = [0.0] * len(belief.hands)
+        for hand, p in zip(belief.hands, belief.probability):
+            if p == 0 or role not in hand:
+                continue
+            rest = list(hand)
+            rest.remove(role)
+            for new in range(len(ROLES)):
+                if unseen[new]:
+                    weights[index[tuple(sorted(rest + [new]))]] += p * unseen[new] / total
+        if not any(weights):
+            # We were sure they could not hold it; all we know is that they did
+            weights = [p if role in hand else 0.0 for hand, p in zip(belief.hands, belief.prior)]
+        belief.set_posterior(weights)
+
+    def reveal(self, player, role):
+        """`player` turned `role` face up."""
+        if player == self.seat:
+            self.own_hand.remove(role)
+            return
+        belief = self.beliefs[player]
+        smaller = {}
+        for hand, p in zip(belief.hands, belief.probability):
+            if role in hand:
+                rest = list(hand)
+                rest.remove(role)
+                rest = tuple(rest)
+                smaller[rest] = smaller.get(rest, 0.0) + p
+        self.unseen[role] -= 1
+        self.beliefs[player] = _Hands(len(belief.hands[0]) - 1, self.unseen)
+        new = self.beliefs[player]
+        if any(smaller.values()):
+            new.set_posterior([smaller.get(hand, 0.0) for hand in new.hands])
+        self._unseen_changed(role, skip=player)
+
+    def exchange(self, player):
+        """`player` swapped cards with the deck, so nothing they did before says much."""
+        if player == self.seat:
+            return
+        belief = self.beliefs[player]
+        belief.likelihood = [1.0] * len(belief.hands)
+        belief.refresh()
+
+    def sync(self, hand):
+        """Updates our own face-down cards after an Exchange or a replaced card."""
+        hand = sorted(hand)
+        if hand == self.own_hand:
+            return
+        changed = {role for role in set(hand) | set(self.own_hand) if hand.count(role) != self.own_hand.count(role)}
+        for role in self.own_hand:
+            self.unseen[role] += 1
+        for role in hand:
+            self.unseen[role] -= 1
+        self.own_hand = hand
+        for role in changed:
+            self._unseen_changed(role)
+
+    def _unseen_changed(self, role, skip=None):
+        unseen = self.unseen
+        for player, belief in self.beliefs.items():
+            if player == skip:
+                continue
+            belief.prior = [_dealt(hand, unseen) if role in hand else p
+                            for hand, p in zip(belief.hands, belief.prior)]
+            belief.refresh()
+
+    def observe(self, before, action, after):
+        """Updates the beliefs from one step of the game, using only what `seat` can see."""
+        mover = before.to_move
+        phase = before.phase
+        if phase == ACTION and action.kind in CLAIMS:
+            self.claim(mover, CLAIMS[action.kind])
+        elif phase == BLOCK and action.kind == "Block":
+            self.claim(mover, action.role)
+        elif phase == CHALLENGE and action.kind == "Challenge":
+            claimant = before.claimant
+            lost = after.influences(claimant) < before.influences(claimant)
+            if lost or (after.phase == LOSE and after.to_move == claimant):
+                self.refuted(claimant, before.claim)
+            else:
+                self.upheld(claimant, before.claim)
+        elif phase == EXCHANGE:
+            self.exchange(mover)
+        for player in range(before.num_players):
+            revealed = list(after.dead[player])
+            for role in before.dead[player]:
+                revealed.remove(role)
+            for role in revealed:
+                self.reveal(player, role)
+        self.sync(after.hands[self.seat])
+
+
+class BeliefBot(RandomBot):
+    """
+    A RandomBot that challenges by belief rather than at a flat rate: it
+    challenges a claim when it thinks the claimant holds the role with less
+    than `challenge_threshold` probability.
+    """
+    name = "belief"
+
+    def __init__(self, rng=random, challenge_threshold=0.35, bluff_likelihood=0.3, **weights):
+        super().__init__(rng=rng, **weights)
+        self.challenge_threshold = challenge_threshold
+        self.bluff_likelihood = bluff_likelihood
+        self.tracker = None
+        self._last = None
+
+    def observe(self, seat, before, action, after):
+        # A state we did not see last time means a new game
+        if self.tracker is None or before is not self._last:
+            self.tracker = BeliefTracker(before, seat, self.bluff_likelihood)
+        self.tracker.observe(before, action, after)
+        self._last = after
+
+    def choose_challenge(self, state):
+        if self.tracker is None or not self._up_to_date(state):
+            return super().choose_challenge(state)
+        if self.tracker.holds(state.claimant, state.claim) < self.challenge_threshold:
+            return CHALLENGE_ACTION
+        return PASS_ACTION
+
+    def _up_to_date(self, state):
+        """
+        Whether the beliefs hold for `state`: it is the last state observed,
+        or the same claim put to a later player. Only passes can lie between
+        those, and passes change no beliefs.
+        """
+        last = self._last
+        if last is state:
+            return True
+        return (last is not None and last.phase == CHALLENGE == state.phase
+                and (last.turn, last.claimant, last.claim, last.blocking)
+                == (state.turn, state.claimant, state.claim, state.blocking))
+
+
+STRATEGIES[BeliefBot.name] = BeliefBot
@@ -0,0 +1,304 @@
+# Benchmarks with fixed seeds, saved as JSON and compared between runs
+#
+#   python coup_bench.py run --out before.json
+#   ...change something...
+#   python coup_bench.py run --out after.json
+#   python coup_bench.py compare before.json after.json --recheck
+#
+# Cases:
+#
+#   games.<N>p       random-bot games at 2, 4 and 6 players, as the tournament plays them (games/sec)
+#   decide           one random-bot decision, over the decisions of those games (µs)
+#   challenge        resolving a challenge: revealing, redrawing and losing influence (µs)
+#   exchange         an Exchange: drawing two cards and shuffling two back (µs)
+#   clone            copying a GameState (µs)
+#   rss.peak         peak memory of a fresh process playing 10,000 four-player games (MB)
+#
+# Every timed case runs `repeats` times and keeps the fastest, the least
+# disturbed by whatever else the machine was doing, along with its spread:
+# how much slower the median timing was, in percent. The inputs of the
+# isolated cases are states collected from seeded games, so every run times
+# exactly the same work. compare exits with status 1 if any case got worse
+# by more than the threshold, or is missing from the new results. A case's
+# spreads in both runs widen its allowance, since a change smaller than the
+# noise of its own timings says nothing. --recheck runs the cases that still
+# look worse again and keeps the better result, which weeds out a run that
+# hit a busy moment. On a busy or shared machine whole runs can still differ
+# by 10-25%; raise --threshold there.
+
+import argparse
+import gc
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from coup_bots import RandomBot, play_game
+from coup_engine import (
+    AMBASSADOR, CHALLENGE, CHALLENGE_ACTION, EXCHANGE, GAME_OVER, PASS_ACTION, legal_actions, new_game, step,
+)
+from coup_rng import GameRng, game_seed
+
+FORMAT = 1
+DEFAULT_SEED = 0
+RSS_GAMES = 10_000
+DEFAULT_THRESHOLD = 5.0
+MIN_TIME = 0.2  # seconds per timing at least, so a timing spans more than a burst of noise
+
+# Unit of a case -> whether a higher value is better
+UNITS = {"games/sec": True, "µs": False, "MB": False}
+
+
+def _best(run, repeats, min_time=0.0):
+    """
+    The shortest of `repeats` timings of run(), each repeating run() until
+    it has taken at least `min_time` seconds and divided by the number of
+    calls, and the percent by which the median timing was slower. The
+    garbage collector is off while timing, as in timeit.
+    """
+    timings = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            calls = 0
+            start = time.perf_counter()
+            while True:
+                run()
+                calls += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_time:
+                    break
+            timings.append(elapsed / calls)
+    finally:
+        if enabled:
+            gc.enable()
+    timings.sort()
+    best = timings[0]
+    return best, 100 * (timings[len(timings) // 2] - best) / best
+
+
+def _play(num_players, games, seed, decisions=None):
+    for game in range(games):
+        game_rng = GameRng(game_seed(seed, game))
+        bots = [RandomBot(rng=game_rng.seat(seat)) for seat in range(num_players)]
+        play_game(bots, game_rng.deck, decisions=decisions)
+
+
+def _sample_states(games, seed):
+    """Challenge and Exchange inputs taken from seeded four-player games of random moves."""
+    rng = random.Random(seed)
+    challenges, exchanges = [], []
+    for _ in range(games):
+        state = new_game(4, rng)
+        while state.phase != GAME_OVER:
+            action = rng.choice(legal_actions(state))
+            after = step(state, action, rng)
+            if state.phase == CHALLENGE:
+                challenges.append(state)
+                if action == PASS_ACTION and after.phase == EXCHANGE and state.claim == AMBASSADOR:
+                    exchanges.append(state)  # passing here draws the Exchange's cards
+            state = after
+    return challenges, exchanges
+
+
+# Each case returns its value and its spread in percent
+def bench_games(num_players, games, seed, repeats):
+    best, spread = _best(lambda: _play(num_players, games, seed), repeats, MIN_TIME)
+    return games / best, spread
+
+
+def _per_call(run, calls, repeats):
+    """The fastest time of `calls` calls of a case, in µs per call, and its spread."""
+    best, spread = _best(run, repeats, MIN_TIME)
+    return 1e6 * best / calls, spread
+
+
+def bench_decide(games, seed, repeats):
+    decisions = []
+    _play(4, games, seed, decisions)
+    states = [state for state, _ in decisions]
+    bot = RandomBot(rng=random.Random(seed))
+
+    def run():
+        for state in states:
+            bot.choose(state)
+    return _per_call(run, len(states), repeats)
+
+
+def bench_challenge(states, seed, repeats):
+    rng = random.Random(seed)
+
+    def run():
+        for state in states:
+            step(state, CHALLENGE_ACTION, rng)
+    return _per_call(run, len(states), repeats)
+
+
+def bench_exchange(states, seed, repeats):
+    rng = random.Random(seed)
+
+    def run():
+        for state in states:
+            drawn = step(state, PASS_ACTION, rng)
+            step(drawn, legal_actions(drawn)[0], rng)
+    return _per_call(run, len(states), repeats)
+
+
+def bench_clone(states, repeats):
+    def run():
+        for state in states:
+            state.clone()
+    return _per_call(run, len(states), repeats)
+
+
+def _peak_rss(games, seed):
+    _play(4, games, seed)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10  # bytes on macOS, KiB elsewhere
+
+
+def bench_rss(games, seed):
+    """Peak resident memory, in MB, of a newly started process that plays `games` games. It is measured once."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_peak_rss, games, seed).result(), 0.0
+
+
+def run_benchmarks(seed=DEFAULT_SEED, scale=1.0, repeats=5, cases=None, progress=None):
+    """
+    Runs the cases named in `cases` (all by default) and returns the results.
+    `scale` multiplies the amount of work each case does.
+    """
+    games = max(1, int(1000 * scale))
+    challenges, exchanges = _sample_states(max(1, int(500 * scale)), seed)
+    plan = {
+        "games.2p": ("games/sec", lambda: bench_games(2, games, seed, repeats)),
+        "games.4p": ("games/sec", lambda: bench_games(4, games, seed, repeats)),
+        "games.6p": ("games/sec", lambda: bench_games(6, games, seed, repeats)),
+        "decide": ("µs", lambda: bench_decide(games // 2, seed, repeats)),
+        "challenge": ("µs", lambda: bench_challenge(challenges, seed, repeats)),
+        "exchange": ("µs", lambda: bench_exchange(exchanges, seed, repeats)),
+        "clone": ("µs", lambda: bench_clone(challenges, repeats)),
+        "rss.peak": ("MB", lambda: bench_rss(RSS_GAMES, seed)),
+    }
+    unknown = set(cases or ()) - set(plan)
+    if unknown:
+        raise ValueError(f"Unknown benchmark: {', '.join(sorted(unknown))}.")
+    results = {"format": FORMAT, "seed": seed, "scale": scale, "repeats": repeats,
+               "python": platform.python_version(), "platform": platform.platform(), "cases": {}}
+    for name, (unit, bench) in plan.items():
+        if cases and name not in cases:
+            continue
+        value, spread = bench()
+        results["cases"][name] = {"value": value, "unit": unit, "spread": spread}
+        if progress:
+            progress(name, results["cases"][name])
+    return results
+
+
+def compare(old, new, threshold=DEFAULT_THRESHOLD):
+    """
+    (name, old value, new value, % change for the better, % allowed, failed)
+    for every case in the old results. A case may get worse by `threshold`
+    percent plus the spreads of its timings in both runs, and failed if it
+    got worse by more, or if the new results do not have it; then its new
+    value, change and allowance are None.
+    """
+    rows = []
+    for name, case in old["cases"].items():
+        before = case["value"]
+        if name not in new["cases"]:
+            rows.append((name, before, None, None, None, True))
+            continue
+        after = new["cases"][name]["value"]
+        change = 100 * (after - before) / before
+        better = change if UNITS[case["unit"]] else -change
+        # Results saved before spreads were recorded count as noiseless
+        allowed = threshold + case.get("spread", 0.0) + new["cases"][name].get("spread", 0.0)
+        rows.append((name, before, after, better, allowed, better < -allowed))
+    return rows
+
+
+def keep_better(results, again):
+    """`results` with each case in `again` replaced by whichever of the two measured better."""
+    cases = dict(results["cases"])
+    for name, case in again["cases"].items():
+        if name not in cases or (case["value"] > cases[name]["value"]) == UNITS[case["unit"]]:
+            cases[name] = case
+    return {**results, "cases": cases}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the engine and bots, and compare runs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--out", metavar="FILE", help="save the results as JSON")
+    run_parser.add_argument("--cases", help="comma separated cases to run (default: all)")
+    run_parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seed of every case")
+    run_parser.add_argument("--scale", type=float, default=1.0,
+                            help="multiply the work per case, e.g. 0.1 for a quick look")
+    run_parser.add_argument("--repeats", type=int, default=5, help="timings per case; the fastest is kept")
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="percent by which a case may get worse, on top of the spread of its timings, "
+                                     f"before it counts as a regression (default: {DEFAULT_THRESHOLD:g}); "
+                                     "on a busy or shared machine raise it to 20-25")
+    compare_parser.add_argument("--recheck", action="store_true",
+                                help="time the regressed cases again on this machine and keep the better result; "
+                                     "run it from the new code")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        def progress(name, case):
+            print(f"{name:<12} {case['value']:>12.2f} {case['unit']}", flush=True)
+
+        try:
+            results = run_benchmarks(args.seed, args.scale, args.repeats,
+                                     args.cases.split(",") if args.cases else None, progress)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=2)
+                f.write("\n")
+        return
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if (old["seed"], old["scale"]) != (new["seed"], new["scale"]):
+        print("Warning: the runs used different seeds or scales, so they timed different work.")
+    rows = compare(old, new, args.threshold)
+    regressed = [row[0] for row in rows if row[5] and row[2] is not None]
+    if args.recheck and regressed:
+        print(f"Timing {', '.join(regressed)} again...", flush=True)
+        again = run_benchmarks(new["seed"], new["scale"], new["repeats"], regressed)
+        new = keep_better(new, again)
+        rows = compare(old, new, args.threshold)
+    print(f"{'case':<12} {'old':>12} {'new':>12} {'better':>8} {'allowed':>8}")
+    for name, before, after, better, allowed, failed in rows:
+        unit = old["cases"][name]["unit"]
+        if after is None:
+            print(f"{name:<12} {before:>12.2f} {'missing':>12} {'':>8} {'':>8}  {unit}  MISSING")
+            continue
+        flag = "  REGRESSION" if failed else ""
+        print(f"{name:<12} {before:>12.2f} {after:>12.2f} {better:>+7.1f}% {-allowed:>+7.1f}%  {unit}{flag}")
+    for name in new["cases"]:
+        if name not in old["cases"]:
+            print(f"{name:<12} {'new case':>12} {new['cases'][name]['value']:>12.2f}")
+    failures = [row[0] for row in rows if row[5]]
+    if failures:
+        print(f"\n{len(failures)} case(s) regressed beyond their allowance or missing: {', '.join(failures)}")
+        sys.exit(1)
+    print("\nNo regressions beyond the allowance of any case.")
+
+
+if __name__ == "__main__":
+    main()
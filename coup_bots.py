@@ -0,0 +1,133 @@
+# Bot players for the Coup engine, with no terminal I/O
+
+import random
+
+from coup_engine import (
+    ACTION, BLOCK, CHALLENGE, EXCHANGE, GAME_OVER, LOSE, CHALLENGE_ACTION, PASS_ACTION, CLAIMS,
+    AMBASSADOR, CAPTAIN, CONTESSA, DUKE, Action, legal_actions, new_game, step,
+)
+
+
+class RandomBot:
+    """
+    The weighted-random bot from coup+.py. Every probability it uses can be
+    overridden, which is what the tournament runner is for.
+    """
+    name = "random"
+
+    def __init__(self, rng=random, rich_weights=(70, 30), mid_weights=(40, 10, 10, 20, 20),
+                 challenge_rate=30, block_challenge_rate=20, block_foreign_aid_rate=30,
+                 bluff_contessa_rate=30, steal_response_weights=(50, 25, 25), steal_block_rate=60):
+        self.rng = rng
+        self.rich_weights = rich_weights                      # Coup, Assassinate at 7-9 coins
+        self.mid_weights = mid_weights                        # Assassinate, Exchange, Steal, Foreign Aid, Income at 3-6 coins
+        self.challenge_rate = challenge_rate                  # % of action claims challenged
+        self.block_challenge_rate = block_challenge_rate      # % of Contessa/Captain/Ambassador blocks challenged
+        self.block_foreign_aid_rate = block_foreign_aid_rate  # % of Foreign Aid blocked with Duke
+        self.bluff_contessa_rate = bluff_contessa_rate        # % of assassinations blocked without a Contessa
+        self.steal_response_weights = steal_response_weights  # allow, block with Captain, block with Ambassador
+        self.steal_block_rate = steal_block_rate              # % of chosen steal blocks actually made
+
+    def choose(self, state):
+        phase = state.phase
+        if phase == ACTION:
+            return self.choose_action(state)
+        if phase == CHALLENGE:
+            return self.choose_challenge(state)
+        if phase == BLOCK:
+            return self.choose_block(state)
+        if phase == LOSE:
+            return Action('Lose', role=self.rng.choice(state.hands[state.to_move]))
+        if phase == EXCHANGE:
+            # Keep a random selection of the available cards
+            hand = state.hands[state.to_move]
+            keep = self.rng.sample(hand + state.drawn, len(hand))
+            return Action('Keep', role=tuple(sorted(keep)))
+        raise ValueError("The game is over.")
+
+    def choose_action(self, state):
+        actions = legal_actions(state)
+        kind = self.choose_kind(state.coins[state.to_move])
+        options = [a for a in actions if a.kind == kind] or actions
+        return self.rng.choice(options)
+
+    def choose_kind(self, coins):
+        if coins >= 10:
+            return "Coup"
+        elif coins >= 7:
+            return self.rng.choices(["Coup", "Assassinate"], weights=self.rich_weights, k=1)[0]
+        elif coins >= 3:
+            return self.rng.choices(
+                ["Assassinate", "Exchange", "Steal", "Foreign Aid", "Income"], weights=self.mid_weights, k=1
+            )[0]
+        else:
+            return self.rng.choice(["Exchange", "Steal", "Foreign Aid", "Income"])
+
+    def choose_challenge(self, state):
+        if state.blocking and state.action.kind != "Foreign Aid":
+            rate = self.block_challenge_rate
+        else:
+            rate = self.challenge_rate
+        return CHALLENGE_ACTION if self.rng.random() * 100 < rate else PASS_ACTION
+
+    def choose_block(self, state):
+        rng = self.rng
+        kind = state.action.kind
+        hand = state.hands[state.to_move]
+        if kind == "Foreign Aid":
+            return Action('Block', role=DUKE) if rng.random() * 100 < self.block_foreign_aid_rate else PASS_ACTION
+        if kind == "Assassinate":
+            # Block with a real Contessa, otherwise bluff it some of the time
+            if CONTESSA in hand or rng.random() * 100 < self.bluff_contessa_rate:
+                return Action('Block', role=CONTESSA)
+            return PASS_ACTION
+        # Steal: allow or block, but only block with a role actually held
+        block_choice = rng.choices([1, 2, 3], weights=self.steal_response_weights, k=1)[0]
+        if block_choice == 1:
+            return PASS_ACTION
+        block_role = CAPTAIN if block_choice == 2 else AMBASSADOR
+        if block_role in hand and rng.random() * 100 < self.steal_block_rate:
+            return Action('Block', role=block_role)
+        return PASS_ACTION
+
+
+class HonestBot(RandomBot):
+    """A RandomBot that never claims a role it does not hold."""
+    name = "honest"
+
+    def choose_action(self, state):
+        actions = legal_actions(state)
+        hand = state.hands[state.to_move]
+        honest = [a for a in actions if a.kind not in CLAIMS or CLAIMS[a.kind] in hand]
+        kind = self.choose_kind(state.coins[state.to_move])
+        options = [a for a in honest if a.kind == kind] or honest
+        return self.rng.choice(options)
+
+    def choose_block(self, state):
+        action = super().choose_block(state)
+        if action.kind == "Block" and action.role not in state.hands[state.to_move]:
+            return PASS_ACTION
+        return action
+
+
+STRATEGIES = {bot.name: bot for bot in (RandomBot, HonestBot)}
+
+
+def play_game(bots, rng=random, events=None, decisions=None):
+    """
+    Plays one game between `bots` (one per seat) and returns the final state.
+    Pass an EventStream as `events` to send the game's events to its sinks,
+    and a list as `decisions` to have every (state, action) chosen appended.
+    """
+    state = (events.new_game if events else new_game)(len(bots), rng)
+    advance = events.step if events else step
+    observers = [(seat, bot) for seat, bot in enumerate(bots) if hasattr(bot, "observe")]
+    while state.phase != GAME_OVER:
+        action = bots[state.to_move].choose(state)
+        if decisions is not None:
+            decisions.append((state, action))
+        after = advance(state, action, rng)
+        for seat, bot in observers:
+            bot.observe(seat, state, action, after)
+        state = after
+    return state
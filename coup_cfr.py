@@ -0,0 +1,326 @@
+# Monte Carlo CFR for heads-up Coup, and a bot that plays the result
+#
+#   python coup_cfr.py train cfr.ckpt.npz --hours 8 --export coup_cfr.npz
+#   python coup_cfr.py export cfr.ckpt.npz coup_cfr.npz
+#   python coup_match.py cfr random
+#
+# Heads-up Coup is far too big to solve exactly, so the trainer works on an
+# abstraction. An information set is what the player to move can see,
+# coarsened to:
+#
+#   phase, own live cards, the opponent's influence, both players' coins
+#   in the brackets the bots use (0-2, 3-6, 7-9, 10+), and the open claim,
+#   the action that may be blocked or the cards drawn by an Exchange
+#
+# which numbers every information set densely, so regrets and strategy
+# sums are plain arrays indexed by (information set, action code). Targets
+# are always "the opponent", so actions use the codes of coup_replay.ACTIONS
+# with target 1.
+#
+# Training is outcome-sampling MCCFR: each iteration plays one sampled game
+# and updates regrets along its path only, so an iteration costs one game
+# however wide the tree is. Rounds of iterations run on a process pool, each
+# worker starting from the merged regrets and sending back only the rows of
+# the information sets it touched; the rows are merged and checkpointed
+# after every round, and training resumes from the checkpoint. The tables
+# are float32, which halves what every round loads. The average strategy
+# exports to a compact lookup table holding only the information sets that
+# were visited.
+
+import argparse
+import os
+import random
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+from coup_bots import STRATEGIES, RandomBot
+from coup_engine import (
+    ACTION, BLOCK, BLOCKS, CHALLENGE, EXCHANGE, GAME_OVER, LOSE, ROLES, Action, legal_actions, new_game, step,
+)
+from coup_replay import ACTIONS, CODES
+
+CHECKPOINT_VERSION = 1
+DEFAULT_TABLE = "coup_cfr.npz"
+NUM_ACTIONS = len(ACTIONS)
+
+_PHASES = (ACTION, CHALLENGE, BLOCK, LOSE, EXCHANGE)
+_HANDS = [(role,) for role in range(len(ROLES))] + list(combinations_with_replacement(range(len(ROLES)), 2))
+_HAND_INDEX = {hand: i for i, hand in enumerate(_HANDS)}
+_PAIR_INDEX = {pair: i for i, pair in enumerate(combinations_with_replacement(range(len(ROLES)), 2))}
+_BLOCKABLE = list(BLOCKS)
+_COIN_BRACKETS = (3, 7, 10)   # bracket boundaries
+_CONTEXTS = max(2 * len(ROLES), len(_BLOCKABLE), len(_PAIR_INDEX))
+NUM_INFOSETS = len(_PHASES) * len(_HANDS) * 2 * (len(_COIN_BRACKETS) + 1) ** 2 * _CONTEXTS
+
+
+def infoset(state, seat):
+    """The abstract information set of `seat`, who must be one of the last two players in the game."""
+    opponent = state.opponents(seat)[0]
+    phase = state.phase
+    if phase == CHALLENGE:
+        context = 2 * state.claim + state.blocking
+    elif phase == BLOCK:
+        context = _BLOCKABLE.index(state.action.kind)
+    elif phase == EXCHANGE:
+        context = _PAIR_INDEX[tuple(sorted(state.drawn))]
+    else:
+        context = 0
+    coins = state.coins
+    index = _PHASES.index(phase)
+    index = index * len(_HANDS) + _HAND_INDEX[tuple(sorted(state.hands[seat]))]
+    index = index * 2 + state.influences(opponent) - 1
+    index = index * (len(_COIN_BRACKETS) + 1) + bisect_right(_COIN_BRACKETS, coins[seat])
+    index = index * (len(_COIN_BRACKETS) + 1) + bisect_right(_COIN_BRACKETS, coins[opponent])
+    return index * _CONTEXTS + context
+
+
+def abstract_code(action):
+    """The table column of `action`: its code with any target replaced by 1."""
+    if action.target is not None:
+        action = Action(action.kind, 1)
+    return CODES[action]
+
+
+def concrete_action(code, state):
+    """The Action of table column `code` in `state`, aimed at the one opponent."""
+    action = ACTIONS[code]
+    if action.target is not None:
+        action = Action(action.kind, state.opponents(state.to_move)[0])
+    return action
+
+
+def regret_matching(regrets, codes):
+    """The strategy over `codes` that plays in proportion to positive regret, uniform if there is none."""
+    positive = np.maximum(regrets[codes], 0)
+    total = positive.sum()
+    if total > 0:
+        return positive / total
+    return np.full(len(codes), 1 / len(codes))
+
+
+def load_checkpoint(path, tables=("regrets", "strategy")):
+    """The named float32 `tables` of the checkpoint at `path`, followed by its iteration count."""
+    with np.load(path) as data:
+        if int(data["version"]) != CHECKPOINT_VERSION:
+            raise ValueError(f"{path} is checkpoint version {int(data['version'])}, not {CHECKPOINT_VERSION}.")
+        # Checkpoints written before the tables were float32 hold float64
+        return (*(data[name].astype(np.float32, copy=False) for name in tables), int(data["iterations"]))
+
+
+class Trainer:
+    """
+    Outcome-sampling MCCFR tables: cumulative regrets and strategy sums,
+    NUM_INFOSETS x NUM_ACTIONS float32. `epsilon` is the exploration mixed
+    into the updating player's sampling; games longer than `max_depth` steps
+    score as draws. `touched` collects the information sets updated, so a
+    worker can send back just their rows.
+    """
+
+    def __init__(self, regrets=None, strategy=None, iterations=0, epsilon=0.6, max_depth=300, rng=random):
+        shape = (NUM_INFOSETS, NUM_ACTIONS)
+        self.regrets = np.zeros(shape, np.float32) if regrets is None else regrets
+        self.strategy = np.zeros(shape, np.float32) if strategy is None else strategy
+        self.touched = set()
+        self.iterations = iterations
+        self.epsilon = epsilon
+        self.max_depth = max_depth
+        self.rng = rng
+
+    def iterate(self, count):
+        for _ in range(count):
+            self._sample(new_game(2, self.rng), self.iterations % 2, 1.0, 1.0, 0)
+            self.iterations += 1
+
+    def _sample(self, state, player, opponent_reach, sample_reach, depth):
+        """
+        Plays out one sampled game from `state`, updating `player`'s regrets
+        and the other player's strategy sums; returns `player`'s sampled
+        utility (1 for a win, -1 for a loss).
+        """
+        if state.phase == GAME_OVER:
+            return 1.0 if state.winner == player else -1.0
+        if depth >= self.max_depth:
+            return 0.0
+        seat = state.to_move
+        index = infoset(state, seat)
+        actions = legal_actions(state)
+        codes = [abstract_code(action) for action in actions]
+        policy = regret_matching(self.regrets[index], codes)
+        if seat == player:
+            sampling = self.epsilon / len(codes) + (1 - self.epsilon) * policy
+        else:
+            sampling = policy
+        choice = self.rng.choices(range(len(codes)), weights=sampling)[0]
+        child = step(state, actions[choice], self.rng)
+        if seat != player:
+            opponent_reach *= policy[choice]
+        value = self._sample(child, player, opponent_reach, sample_reach * sampling[choice], depth + 1)
+        values = np.zeros(len(codes))
+        values[choice] = value / sampling[choice]
+        expected = policy @ values
+        self.touched.add(index)
+        if seat == player:
+            self.regrets[index, codes] += (values - expected) * (opponent_reach / sample_reach)
+        else:
+            self.strategy[index, codes] += policy * (opponent_reach / sample_reach)
+        return expected
+
+    def average_strategy(self):
+        """The average strategy of every visited information set, as (infosets, probabilities)."""
+        totals = self.strategy.sum(axis=1)
+        visited = np.flatnonzero(totals > 0)
+        return visited, self.strategy[visited] / totals[visited, None]
+
+    def save(self, path):
+        """Checkpoints the tables to `path`, replacing it only once the new file is complete."""
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, version=CHECKPOINT_VERSION, regrets=self.regrets, strategy=self.strategy,
+                 iterations=self.iterations)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        return cls(*load_checkpoint(path), **kwargs)
+
+    def export(self, path):
+        """Writes the average strategy as a lookup table for CFRBot."""
+        visited, probabilities = self.average_strategy()
+        np.savez_compressed(path, infosets=visited.astype(np.int32),
+                            policy=np.round(probabilities * 255).astype(np.uint8),
+                            iterations=self.iterations)
+
+
+def train_round(checkpoint, iterations, seed, epsilon, max_depth):
+    """
+    Runs `iterations` from the regrets in `checkpoint` (fresh ones if None)
+    and returns the information sets they touched as (rows, regrets,
+    strategy): the rows' new regrets and what was added to their strategy
+    sums. The strategy sums themselves are never read, so they start at
+    zero here rather than being loaded.
+    """
+    regrets = load_checkpoint(checkpoint, ("regrets",))[0] if checkpoint else None
+    trainer = Trainer(regrets, epsilon=epsilon, max_depth=max_depth, rng=random.Random(seed))
+    trainer.iterate(iterations)
+    rows = np.array(sorted(trainer.touched), dtype=np.intp)
+    return rows, trainer.regrets[rows], trainer.strategy[rows]
+
+
+def train(checkpoint, iterations=None, hours=None, workers=None, round_iterations=20_000, seed=0,
+          epsilon=0.6, max_depth=300, progress=None):
+    """
+    Trains in rounds of `round_iterations` per worker until `iterations`
+    in total or `hours` have passed, checkpointing after every round.
+    Resumes from `checkpoint` if it exists. Returns the Trainer.
+    """
+    workers = workers or os.cpu_count()
+    trainer = Trainer.load(checkpoint) if os.path.exists(checkpoint) else Trainer()
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while iterations is None or trainer.iterations < iterations:
+            if hours is not None and time.monotonic() - start > hours * 3600:
+                break
+            per_worker = round_iterations
+            if iterations is not None:
+                per_worker = min(per_worker, -(-(iterations - trainer.iterations) // workers))
+            source = checkpoint if os.path.exists(checkpoint) else None
+            futures = [pool.submit(train_round, source, per_worker, f"{seed}:{trainer.iterations}:{worker}", epsilon,
+                                   max_depth)
+                       for worker in range(workers)]
+            # Every worker started from the same regrets, so take each one's change against them before merging any
+            rounds = [future.result() for future in futures]
+            deltas = [(rows, regrets - trainer.regrets[rows], strategy) for rows, regrets, strategy in rounds]
+            for rows, regrets, strategy in deltas:
+                trainer.regrets[rows] += regrets
+                trainer.strategy[rows] += strategy
+            trainer.iterations += per_worker * workers
+            trainer.save(checkpoint)
+            if progress:
+                progress(trainer, time.monotonic() - start)
+    return trainer
+
+
+_TABLES = {}
+
+
+def load_table(path):
+    """The (infosets, policy) lookup table at `path`, loaded once per process."""
+    if path not in _TABLES:
+        with np.load(path) as data:
+            _TABLES[path] = data["infosets"], data["policy"]
+    return _TABLES[path]
+
+
+class CFRBot(RandomBot):
+    """
+    Plays the exported CFR strategy whenever exactly two players are left,
+    and like a RandomBot otherwise or in information sets training never
+    reached.
+    """
+    name = "cfr"
+
+    def __init__(self, rng=random, table=DEFAULT_TABLE, **weights):
+        super().__init__(rng=rng, **weights)
+        if table not in _TABLES and not os.path.exists(table):
+            raise FileNotFoundError(f"No CFR strategy table at {table}; train one first with "
+                                    f"`python coup_cfr.py train cfr.ckpt.npz --hours 1 --export {table}`.")
+        self.infosets, self.policy = load_table(table)
+
+    def choose(self, state):
+        seat = state.to_move
+        if len(state.opponents(seat)) == 1:
+            index = infoset(state, seat)
+            row = np.searchsorted(self.infosets, index)
+            if row < len(self.infosets) and self.infosets[row] == index:
+                actions = legal_actions(state)
+                weights = [int(self.policy[row, abstract_code(action)]) for action in actions]
+                if sum(weights):
+                    return self.rng.choices(actions, weights=weights)[0]
+        return super().choose(state)
+
+
+STRATEGIES[CFRBot.name] = CFRBot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a heads-up Coup strategy with Monte Carlo CFR.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="train, resuming from the checkpoint if it exists")
+    train_parser.add_argument("checkpoint", help="checkpoint file (.npz)")
+    train_parser.add_argument("--iterations", type=int, help="stop after this many iterations in total")
+    train_parser.add_argument("--hours", type=float, help="stop after this long")
+    train_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    train_parser.add_argument("--round-iterations", type=int, default=20_000,
+                              help="iterations per worker between merges and checkpoints")
+    train_parser.add_argument("--epsilon", type=float, default=0.6, help="exploration of the updating player")
+    train_parser.add_argument("--seed", type=int, default=0, help="base random seed")
+    train_parser.add_argument("--export", metavar="TABLE", help="export the average strategy when done")
+    export_parser = commands.add_parser("export", help="write the lookup table CFRBot plays from")
+    export_parser.add_argument("checkpoint")
+    export_parser.add_argument("table", nargs="?", default=DEFAULT_TABLE)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        if args.iterations is None and args.hours is None:
+            parser.error("give --iterations, --hours or both")
+
+        def progress(trainer, elapsed):
+            visited = np.count_nonzero(trainer.strategy.any(axis=1))
+            print(f"{trainer.iterations:>12} iterations  {visited:>6} information sets  "
+                  f"{elapsed:8.0f}s", flush=True)
+
+        trainer = train(args.checkpoint, args.iterations, args.hours, args.workers, args.round_iterations,
+                        args.seed, args.epsilon, progress=progress)
+        if args.export:
+            trainer.export(args.export)
+    else:
+        trainer = Trainer.load(args.checkpoint)
+        trainer.export(args.table)
+        print(f"Exported {len(trainer.average_strategy()[0])} information sets to {args.table}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+# Exact solver for heads-up endgames
+#
+# Once only two players are left the game is small enough to solve. The
+# solver plays each dealt position with every card face up (expectimax over
+# court deck draws, minimax over the two players), solving every position
+# reachable from it at once by value iteration, and memoizes the values in a
+# bounded LRU transposition table. EndgameBot turns
+# that into play for a seat that cannot see its opponent's cards: it weighs
+# the solved value of each action over every hand the opponent could hold,
+# given the cards it can see.
+#
+# Positions are keyed relative to the player whose turn it is, without the
+# turn counter or any dead card, so the same endgame reached from different
+# games (or seats) shares one entry. Play that can repeat forever (stealing
+# coins back and forth, say) is scored as a draw.
+
+import argparse
+import os
+import pickle
+import random
+from array import array
+from collections import Counter, OrderedDict, deque
+from itertools import combinations
+from math import comb
+
+from coup_bots import STRATEGIES, RandomBot
+from coup_rng import break_tie
+from coup_engine import (
+    CARDS_PER_ROLE, EXCHANGE, GAME_OVER, ROLES, legal_actions, new_game, step,
+    _AFTER_LOSS, _BLOCKING, _CARD0, _CLAIM, _CLAIMANT, _COINS, _CURRENT, _DEAD0, _DECK,
+    _DECK_TOTAL, _DRAWN0, _DRAWN1, _KIND, _PHASE, _SEAT_SIZE, _SEATS, _TARGET, _TO_MOVE,
+)
+
+TABLE_VERSION = 1
+DRAW = 0.5
+
+
+class TranspositionTable:
+    """
+    A bounded LRU map from position keys to the value of the position for
+    the player whose turn it is. save() and load() persist it with pickle.
+    """
+
+    def __init__(self, maxsize=500_000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)  # Least recently used
+
+    def save(self, path):
+        """Writes the table to `path`, replacing the file atomically."""
+        temp = f"{path}.tmp"
+        with open(temp, "wb") as f:
+            pickle.dump((TABLE_VERSION, list(self.entries.items())), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+
+    @classmethod
+    def load(cls, path, maxsize=500_000):
+        """Reads a table written by save(). A missing file gives an empty table."""
+        table = cls(maxsize)
+        if not os.path.exists(path):
+            return table
+        with open(path, "rb") as f:
+            version, items = pickle.load(f)
+        if version != TABLE_VERSION:
+            raise ValueError(f"{path} holds an endgame table in format {version}, expected {TABLE_VERSION}.")
+        for key, value in items[-maxsize:]:  # Most recently used entries were saved last
+            table.entries[key] = value
+        return table
+
+
+class _Draws:
+    """
+    Stands in for the RNG passed to step(), returning scripted card indices
+    so every possible court deck draw can be enumerated.
+    """
+    __slots__ = ('script', 'sizes', 'used')
+
+    def __init__(self, script):
+        self.script = script
+        self.sizes = []
+        self.used = 0
+
+    def randrange(self, n):
+        if self.used == len(self.script):
+            self.script.append(0)
+        self.sizes.append(n)
+        self.used += 1
+        return self.script[self.used - 1]
+
+
+def outcomes(state, action):
+    """
+    Every state `action` can lead to, as a list of (probability, state). An
+    action that draws no cards has exactly one outcome.
+    """
+    results = {}
+    script = []
+    while True:
+        draws = _Draws(script)
+        child = step(state, action, draws)
+        probability = 1.0
+        for size in draws.sizes:
+            probability /= size
+        key = child.key()
+        if key in results:
+            results[key][0] += probability
+        else:
+            results[key] = [probability, child]
+        # Advance the script like an odometer over the draw sizes seen
+        while script and script[-1] == draws.sizes[len(script) - 1] - 1:
+            script.pop()
+        if not script:
+            break
+        script[-1] += 1
+    return [(p, child) for p, child in results.values()]
+
+
+def heads_up(state):
+    """Whether exactly two players are left."""
+    return state.phase != GAME_OVER and state.alive == 2
+
+
+def position_key(state):
+    """
+    The canonical key of a heads-up position: the two players in order
+    starting from the current one, their coins and face-down cards, the
+    court deck and whatever is pending this turn.
+    """
+    buf = state.buf
+    a = buf[_CURRENT]
+    b = state.next_alive(a)
+
+    def seat(p):
+        return -1 if p < 0 else (0 if p == a else 1)
+
+    drawn = sorted((buf[_DRAWN0], buf[_DRAWN1]))
+    key = [buf[_PHASE], seat(buf[_TO_MOVE]), buf[_KIND], seat(buf[_TARGET]), seat(buf[_CLAIMANT]),
+           buf[_CLAIM], buf[_BLOCKING], buf[_AFTER_LOSS], drawn[0], drawn[1]]
+    key += buf[_DECK:_DECK_TOTAL]
+    for p in (a, b):
+        base = _SEATS + p * _SEAT_SIZE
+        hand = sorted(buf[base + _CARD0 + i] for i in (0, 1) if buf[base + _DEAD0 + i] == 0)
+        key += [buf[base + _COINS]] + hand + [-1] * (2 - len(hand))
+    return array('h', key).tobytes()
+
+
+class EndgameSolver:
+    """
+    Solves heads-up positions with every card face up. Asking for a position
+    that is not in the table solves every position reachable from it (up to
+    `max_states` of them) by value iteration, so later decisions in the same
+    endgame are lookups. Positions are only attempted while the two players
+    hold at most `max_influence` face-down cards between them: with one
+    influence each an endgame reaches around 80,000 positions, with three
+    cards it is already over a million.
+
+    `table` is the transposition table to use; pass `path` to warm-load it
+    from disk and save() it back there. A fresh endgame takes seconds to
+    solve, so `on_solve`, if given, is called before each one, e.g. to tell
+    a waiting player.
+    """
+
+    def __init__(self, table=None, path=None, maxsize=500_000, max_states=200_000, max_influence=2,
+                 tolerance=1e-9, max_sweeps=1000, on_solve=None):
+        if table is None:
+            table = TranspositionTable.load(path, maxsize) if path else TranspositionTable(maxsize)
+        self.table = table
+        self.path = path
+        self.max_states = max_states
+        self.max_influence = max_influence
+        self.tolerance = tolerance
+        self.max_sweeps = max_sweeps
+        self.on_solve = on_solve
+        self.solved = 0
+
+    def save(self, path=None):
+        self.table.save(path or self.path)
+
+    def can_solve(self, state):
+        if state.phase == GAME_OVER:
+            return True
+        if not heads_up(state):
+            return False
+        seat = state.current
+        return state.influences(seat) + state.influences(state.next_alive(seat)) <= self.max_influence
+
+    def value(self, state, seat=None):
+        """
+        The probability that `seat` (default: the player to move) wins from
+        `state`, or None if the position is too big to solve.
+        """
+        if seat is None:
+            seat = state.to_move
+        if state.phase == GAME_OVER:
+            return 1.0 if state.winner == seat else 0.0
+        v = self._lookup(state)
+        if v is None:
+            return None
+        return v if seat == state.current else 1.0 - v
+
+    def action_values(self, state):
+        """
+        {action: probability that the player to move wins after playing it},
+        or None if the position is too big to solve.
+        """
+        seat = state.to_move
+        values = {}
+        for action in legal_actions(state):
+            expected = 0.0
+            for p, child in outcomes(state, action):
+                v = self.value(child, seat)
+                if v is None:
+                    return None
+                expected += p * v
+            values[action] = expected
+        return values
+
+    def best_action(self, state):
+        values = self.action_values(state)
+        if values is None:
+            return None
+        return max(values, key=values.get)  # Ties go to the first legal action
+
+    def _lookup(self, state):
+        """The probability that the current player wins, solving the endgame if needed."""
+        key = position_key(state)
+        v = self.table.get(key)
+        if v is None and self.can_solve(state) and self.solve(state):
+            v = self.table.get(key)
+        return v
+
+    def solve(self, state):
+        """
+        Solves every position reachable from `state` that is not already in
+        the table. Returns False, storing nothing, if there are more than
+        `max_states` of them.
+        """
+        if self.on_solve:
+            self.on_solve()
+        # Each position records, per action, its outcomes as
+        # (probability, index of the next position, whether its current
+        # player is the one choosing here); known values are folded into a
+        # constant so the sweeps below only touch unsolved positions
+        table = self.table
+        keys = [position_key(state)]
+        index = {keys[0]: 0}
+        movers_current = []
+        choices = []
+        frontier = deque([state])
+        while frontier:
+            s = frontier.popleft()
+            mover = s.to_move
+            movers_current.append(mover == s.current)
+            options = []
+            for action in legal_actions(s):
+                constant = 0.0
+                edges = []
+                for p, child in outcomes(s, action):
+                    if child.phase == GAME_OVER:
+                        constant += p if child.winner == mover else 0.0
+                        continue
+                    key = position_key(child)
+                    same = child.current == mover
+                    known = table.entries.get(key)
+                    if known is not None:
+                        constant += p * (known if same else 1.0 - known)
+                        continue
+                    i = index.get(key)
+                    if i is None:
+                        if len(keys) == self.max_states:
+                            return False
+                        i = index[key] = len(keys)
+                        keys.append(key)
+                        frontier.append(child)
+                    edges.append((p, i, same))
+                options.append((constant, edges))
+            choices.append(options)
+
+        # Gauss-Seidel value iteration, deepest positions first. Every value
+        # starts as a draw, so a line that can repeat forever stays one
+        values = [DRAW] * len(keys)
+        for _ in range(self.max_sweeps):
+            change = 0.0
+            for i in range(len(keys) - 1, -1, -1):
+                best = -1.0
+                for constant, edges in choices[i]:
+                    expected = constant
+                    for p, j, same in edges:
+                        expected += p * (values[j] if same else 1.0 - values[j])
+                    if expected > best:
+                        best = expected
+                v = best if movers_current[i] else 1.0 - best
+                if abs(v - values[i]) > change:
+                    change = abs(v - values[i])
+                values[i] = v
+            if change < self.tolerance:
+                break
+        for key, v in zip(keys, values):
+            table.put(key, v)
+        self.solved += len(keys)
+        return True
+
+
+def opponent_hands(state, seat):
+    """
+    Every face-down hand the other player could hold, as (probability,
+    hand), given the cards `seat` can see.
+    """
+    opponent = state.next_alive(seat)
+    unseen = Counter({role: CARDS_PER_ROLE for role in range(len(ROLES))})
+    unseen.subtract(state.hands[seat])
+    for dead in state.dead:
+        unseen.subtract(dead)
+    if state.phase == EXCHANGE and state.current == seat:
+        unseen.subtract(state.drawn)
+    pool = [role for role in range(len(ROLES)) for _ in range(unseen[role])]
+    size = len(state.hands[opponent])
+    total = comb(len(pool), size)
+    hands = Counter(combinations(pool, size))  # Combinations of card positions, so duplicates count
+    return opponent, [(count / total, list(hand)) for hand, count in hands.items()]
+
+
+def deal(state, seat, hand):
+    """A copy of `state` where `seat` holds `hand` and the court deck holds the rest."""
+    s = state.clone()
+    buf = s.buf
+    deck = s.deck
+    for role in s.hands[seat]:
+        deck.put(role)
+    cards = iter(hand)
+    base = _SEATS + seat * _SEAT_SIZE
+    for i in (0, 1):
+        if buf[base + _CARD0 + i] >= 0 and buf[base + _DEAD0 + i] == 0:
+            role = next(cards)
+            buf[base + _CARD0 + i] = role
+            buf[_DECK + role] -= 1
+            buf[_DECK_TOTAL] -= 1
+    return s
+
+
+_SOLVERS = {}
+
+
+def shared_solver(path=None, max_influence=2):
+    """
+    The process's EndgameSolver for the table file `path` (warm-loaded if it
+    exists) and `max_influence`, so the bots built for each game of a run
+    share every endgame solved before.
+    """
+    key = (path, max_influence)
+    if key not in _SOLVERS:
+        _SOLVERS[key] = EndgameSolver(path=path, max_influence=max_influence)
+    return _SOLVERS[key]
+
+
+class EndgameBot:
+    """
+    Plays heads-up positions with the endgame solver, averaging each
+    action's solved value over the hands the opponent could hold, and hands
+    every other decision to `fallback` (a RandomBot by default).
+
+    This is not equilibrium play. The values are perfect-information ones,
+    and the opponent's hand is weighted by the unseen cards alone, ignoring
+    any claim the opponent has just made. Only endgames within the solver's
+    `max_influence` are played this way, which by default means one card
+    each. Unless `solver` is given, the bot uses the process's shared solver
+    for `table` (see shared_solver).
+    """
+    name = "endgame"
+
+    def __init__(self, rng=random, fallback=None, solver=None, tiebreak=None, table=None, max_influence=2):
+        self.rng = rng
+        self.tiebreak = tiebreak
+        self.fallback = fallback or RandomBot(rng=rng)
+        self.solver = solver or shared_solver(table, max_influence)
+
+    def observe(self, seat, before, action, after):
+        if hasattr(self.fallback, "observe"):
+            self.fallback.observe(seat, before, action, after)
+
+    def choose(self, state):
+        actions = legal_actions(state)
+        if len(actions) == 1:
+            return actions[0]
+        if not self.solver.can_solve(state):
+            return self.fallback.choose(state)
+        seat = state.to_move
+        opponent, hands = opponent_hands(state, seat)
+        values = dict.fromkeys(actions, 0.0)
+        for p, hand in hands:
+            solved = self.solver.action_values(deal(state, opponent, hand))
+            if solved is None:
+                return self.fallback.choose(state)
+            for action, v in solved.items():
+                values[action] += p * v
+        return break_tie(actions, values.get, self.tiebreak)
+
+
+STRATEGIES[EndgameBot.name] = EndgameBot
+
+
+def warm(solver, games, num_players=2, seed=0):
+    """
+    Plays `games` games between RandomBots and solves every endgame they
+    reach, so the table can be saved and shipped warm.
+    """
+    rng = random.Random(seed)
+    bot = RandomBot(rng=rng)
+    for _ in range(games):
+        state = new_game(num_players, rng)
+        while state.phase != GAME_OVER:
+            if solver.can_solve(state):
+                solver.value(state)
+            state = step(state, bot.choose(state), rng)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve heads-up Coup endgames into a table file.")
+    parser.add_argument("table", help="table file to load and save")
+    parser.add_argument("--games", type=int, default=10, help="random games whose endgames are solved")
+    parser.add_argument("--players", type=int, default=2, help="players per game (2-6)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--max-influence", type=int, default=2,
+                        help="most face-down cards left between the two players for a position to be solved")
+    args = parser.parse_args(argv)
+    solver = EndgameSolver(path=args.table, max_influence=args.max_influence)
+    start = len(solver.table)
+    warm(solver, args.games, args.players, args.seed)
+    solver.save()
+    print(f"Solved {solver.solved} positions; {args.table} now holds {len(solver.table)} (was {start}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,596 @@
+# Headless Coup rules engine shared by the terminal games and the simulators
+
+import random
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import combinations
+
+ROLES = ('Duke', 'Assassin', 'Captain', 'Ambassador', 'Contessa')
+DUKE, ASSASSIN, CAPTAIN, AMBASSADOR, CONTESSA = range(len(ROLES))
+CARDS_PER_ROLE = 3
+MAX_PLAYERS = 6
+
+# Turn phases
+ACTION = 0      # the current player picks an action
+CHALLENGE = 1   # `to_move` may challenge the pending claim
+BLOCK = 2       # `to_move` may block the pending action
+LOSE = 3        # `to_move` picks which influence to reveal
+EXCHANGE = 4    # the Ambassador picks which cards to keep
+GAME_OVER = 5
+
+Action = namedtuple('Action', ['kind', 'target', 'role'], defaults=(None, None))
+
+CHALLENGE_ACTION = Action('Challenge')
+PASS_ACTION = Action('Pass')
+
+ACTION_KINDS = ('Income', 'Foreign Aid', 'Coup', 'Tax', 'Assassinate', 'Exchange', 'Steal')
+
+# Role an action claims, and the roles that can block it
+CLAIMS = {'Tax': DUKE, 'Assassinate': ASSASSIN, 'Exchange': AMBASSADOR, 'Steal': CAPTAIN}
+BLOCKS = {'Foreign Aid': (DUKE,), 'Assassinate': (CONTESSA,), 'Steal': (CAPTAIN, AMBASSADOR)}
+
+COUP_COST = 7
+ASSASSINATE_COST = 3
+FORCED_COUP = 10
+
+# What happens once a player has lost influence
+_END, _UPHELD, _REFUTED = range(3)
+
+# Layout of the GameState buffer: a header, the deck counts, then one record per seat
+(_NUM_PLAYERS, _CURRENT, _TURN, _PHASE, _TO_MOVE, _KIND, _TARGET, _CLAIMANT, _CLAIM,
+ _BLOCKING, _AFTER_LOSS, _WINNER, _DRAWN0, _DRAWN1, _LIVE, _ALIVE) = range(16)
+_DECK = 16
+_DECK_TOTAL = _DECK + len(ROLES)
+_SEATS = _DECK_TOTAL + 1
+_COINS, _INFLUENCE, _CARD0, _CARD1, _DEAD0, _DEAD1 = range(6)
+_SEAT_SIZE = 6
+_SIZE = _SEATS + MAX_PLAYERS * _SEAT_SIZE
+
+_BLANK = array('h', [-1] * _SIZE)
+_BLANK[_LIVE] = _BLANK[_ALIVE] = 0
+for _role in range(len(ROLES)):
+    _BLANK[_DECK + _role] = CARDS_PER_ROLE
+_BLANK[_DECK_TOTAL] = CARDS_PER_ROLE * len(ROLES)
+del _role
+
+
+class CourtDeck:
+    """
+    The face-down court deck, stored as a count per role. The deck is always
+    uniformly shuffled, so drawing a random card stands in for shuffling.
+    """
+    __slots__ = ('buf',)
+
+    def __init__(self, buf):
+        self.buf = buf
+
+    def __len__(self):
+        return self.buf[_DECK_TOTAL]
+
+    @property
+    def counts(self):
+        return self.buf[_DECK:_DECK_TOTAL].tolist()
+
+    def put(self, role):
+        self.buf[_DECK + role] += 1
+        self.buf[_DECK_TOTAL] += 1
+
+    def draw(self, rng):
+        buf = self.buf
+        index = rng.randrange(buf[_DECK_TOTAL])
+        for slot in range(_DECK, _DECK_TOTAL):
+            if index < buf[slot]:
+                buf[slot] -= 1
+                buf[_DECK_TOTAL] -= 1
+                return slot - _DECK
+            index -= buf[slot]
+
+
+class _Coins:
+    """The coins of every seat, indexable like a list."""
+    __slots__ = ('buf', 'num_players')
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.num_players = buf[_NUM_PLAYERS]
+
+    def __len__(self):
+        return self.num_players
+
+    def __getitem__(self, seat):
+        if not 0 <= seat < self.num_players:
+            raise IndexError(seat)
+        return self.buf[_SEATS + seat * _SEAT_SIZE + _COINS]
+
+    def __setitem__(self, seat, value):
+        if not 0 <= seat < self.num_players:
+            raise IndexError(seat)
+        self.buf[_SEATS + seat * _SEAT_SIZE + _COINS] = value
+
+    def __iter__(self):
+        return iter(self.buf[_SEATS + _COINS:_SEATS + self.num_players * _SEAT_SIZE:_SEAT_SIZE])
+
+
+class _Cards:
+    """The face-down (or revealed) cards of every seat, as lists of role IDs."""
+    __slots__ = ('buf', 'num_players', 'dead')
+
+    def __init__(self, buf, dead):
+        self.buf = buf
+        self.num_players = buf[_NUM_PLAYERS]
+        self.dead = dead
+
+    def __len__(self):
+        return self.num_players
+
+    def __getitem__(self, seat):
+        if not 0 <= seat < self.num_players:
+            raise IndexError(seat)
+        buf = self.buf
+        base = _SEATS + seat * _SEAT_SIZE
+        return [buf[base + _CARD0 + i] for i in (0, 1)
+                if buf[base + _CARD0 + i] >= 0 and (buf[base + _DEAD0 + i] == 1) == self.dead]
+
+    def __iter__(self):
+        return (self[seat] for seat in range(self.num_players))
+
+
+class GameState:
+    """
+    The whole game packed into one fixed-size array, so cloning a state for a
+    search rollout is a single buffer copy. The properties below are views
+    that keep the rules readable.
+    """
+    __slots__ = ('buf',)
+
+    def __init__(self, num_players):
+        buf = self.buf = _BLANK[:]
+        buf[_NUM_PLAYERS] = num_players
+        buf[_CURRENT] = buf[_TURN] = buf[_PHASE] = buf[_TO_MOVE] = buf[_BLOCKING] = 0
+        for seat in range(num_players):
+            base = _SEATS + seat * _SEAT_SIZE
+            buf[base + _COINS] = 2
+            buf[base + _INFLUENCE] = buf[base + _DEAD0] = buf[base + _DEAD1] = 0
+
+    def clone(self):
+        other = GameState.__new__(GameState)
+        other.buf = self.buf[:]
+        return other
+
+    def key(self):
+        """The raw state as bytes, for hashing and comparing states."""
+        return self.buf.tobytes()
+
+    def _field(index):
+        return property(lambda self: self.buf[index], lambda self, value: self.buf.__setitem__(index, value))
+
+    num_players = _field(_NUM_PLAYERS)
+    current = _field(_CURRENT)
+    turn = _field(_TURN)
+    phase = _field(_PHASE)
+    claimant = _field(_CLAIMANT)    # who claimed `claim`
+    claim = _field(_CLAIM)          # role currently open to challenge
+    del _field
+
+    @property
+    def to_move(self):
+        seat = self.buf[_TO_MOVE]
+        return None if seat < 0 else seat
+
+    @property
+    def winner(self):
+        seat = self.buf[_WINNER]
+        return None if seat < 0 else seat
+
+    @property
+    def blocking(self):
+        """Whether the open claim is a block rather than an action."""
+        return self.buf[_BLOCKING] == 1
+
+    @property
+    def action(self):
+        """The Action being resolved this turn."""
+        kind = self.buf[_KIND]
+        if kind < 0:
+            return None
+        target = self.buf[_TARGET]
+        return Action(ACTION_KINDS[kind], None if target < 0 else target)
+
+    @property
+    def drawn(self):
+        """Cards drawn by an Exchange."""
+        return [role for role in (self.buf[_DRAWN0], self.buf[_DRAWN1]) if role >= 0]
+
+    @property
+    def coins(self):
+        return _Coins(self.buf)
+
+    @property
+    def hands(self):
+        return _Cards(self.buf, False)
+
+    @property
+    def dead(self):
+        return _Cards(self.buf, True)
+
+    @property
+    def deck(self):
+        return CourtDeck(self.buf)
+
+    @property
+    def alive(self):
+        """How many players are still in the game."""
+        return self.buf[_ALIVE]
+
+    def in_game(self, seat):
+        return self.buf[_LIVE] >> seat & 1 == 1
+
+    def influences(self, seat):
+        return self.buf[_SEATS + seat * _SEAT_SIZE + _INFLUENCE]
+
+    def next_alive(self, seat):
+        """The first player still in the game after `seat`."""
+        return _NEXT_ALIVE[seat << MAX_PLAYERS | self.buf[_LIVE]]
+
+    def opponents(self, seat):
+        """Players still in the game, in seat order starting after `seat`, as a tuple."""
+        return _OPPONENTS[seat << MAX_PLAYERS | self.buf[_LIVE]]
+
+
+# The seats still in the game are a bitmask in the header, kept up to date
+# as players are eliminated. The seat after any seat, and its live
+# opponents, are looked up by (seat, bitmask) in these tables.
+_RING = [[(seat + i) % MAX_PLAYERS for i in range(1, MAX_PLAYERS + 1)] for seat in range(MAX_PLAYERS)]
+_NEXT_ALIVE = [next((p for p in _RING[seat] if live >> p & 1), None)
+               for seat in range(MAX_PLAYERS) for live in range(1 << MAX_PLAYERS)]
+_OPPONENTS = [tuple(p for p in _RING[seat][:-1] if live >> p & 1)
+              for seat in range(MAX_PLAYERS) for live in range(1 << MAX_PLAYERS)]
+
+
+def new_game(num_players, rng=random):
+    if not 2 <= num_players <= MAX_PLAYERS:
+        raise ValueError("Coup needs between 2 and 6 players.")
+    state = GameState(num_players)
+    deck = state.deck
+    buf = state.buf
+    for seat in range(num_players):
+        base = _SEATS + seat * _SEAT_SIZE
+        buf[base + _CARD0] = deck.draw(rng)
+        buf[base + _CARD1] = deck.draw(rng)
+        buf[base + _INFLUENCE] = 2
+    buf[_LIVE] = (1 << num_players) - 1
+    buf[_ALIVE] = num_players
+    return state
+
+
+def determinize(state, seat, rng=random):
+    """
+    Returns a copy of `state` where every card `seat` cannot see (the other
+    players' face-down cards, the deck and anyone else's Exchange draw) is
+    dealt again at random from the cards `seat` has not seen.
+    """
+    s = state.clone()
+    buf = s.buf
+    unseen = [CARDS_PER_ROLE] * len(ROLES)
+    for role in s.hands[seat]:
+        unseen[role] -= 1
+    for dead in s.dead:
+        for role in dead:
+            unseen[role] -= 1
+    own_draw = buf[_PHASE] == EXCHANGE and buf[_CURRENT] == seat
+    if own_draw:
+        for role in s.drawn:
+            unseen[role] -= 1
+    pool = [role for role in range(len(ROLES)) for _ in range(unseen[role])]
+    rng.shuffle(pool)
+
+    for other in range(buf[_NUM_PLAYERS]):
+        if other == seat:
+            continue
+        base = _SEATS + other * _SEAT_SIZE
+        for i in (0, 1):
+            if buf[base + _CARD0 + i] >= 0 and buf[base + _DEAD0 + i] == 0:
+                buf[base + _CARD0 + i] = pool.pop()
+    if buf[_PHASE] == EXCHANGE and not own_draw:
+        buf[_DRAWN0] = pool.pop()
+        buf[_DRAWN1] = pool.pop()
+    for role in range(len(ROLES)):
+        buf[_DECK + role] = 0
+    for role in pool:
+        buf[_DECK + role] += 1
+    buf[_DECK_TOTAL] = len(pool)
+    return s
+
+
+def legal_actions(state):
+    return list(_legal(state))
+
+
+def _legal(state):
+    """The legal actions as a shared tuple, which must not be changed."""
+    buf = state.buf
+    phase = buf[_PHASE]
+    if phase == ACTION:
+        seat = buf[_CURRENT]
+        coins = buf[_SEATS + seat * _SEAT_SIZE + _COINS]
+        return _TURN_ACTIONS[(bisect_right(_COIN_TIERS, coins) * MAX_PLAYERS + seat) << MAX_PLAYERS | buf[_LIVE]]
+    if phase == CHALLENGE:
+        return _RESPONSES
+    if phase == BLOCK:
+        return _BLOCK_ACTIONS[buf[_KIND]]
+    if phase == LOSE:
+        return tuple(Action('Lose', role=role) for role in sorted(set(state.hands[buf[_TO_MOVE]])))
+    if phase == EXCHANGE:
+        hand = state.hands[buf[_CURRENT]]
+        pool = hand + state.drawn
+        keeps = sorted(set(tuple(sorted(keep)) for keep in combinations(pool, len(hand))))
+        return tuple(Action('Keep', role=keep) for keep in keeps)
+    return ()
+
+
+def _turn_actions(tier, seat, live):
+    """The legal actions of `seat` on its turn, given its coin tier and the bitmask of live seats."""
+    targets = _OPPONENTS[seat << MAX_PLAYERS | live]
+    coups = [Action('Coup', t) for t in targets] if tier >= 2 else []
+    if tier == 3:
+        return tuple(coups)
+    actions = [Action('Income'), Action('Foreign Aid')] + coups + [Action('Tax')]
+    if tier >= 1:
+        actions += [Action('Assassinate', t) for t in targets]
+    actions.append(Action('Exchange'))
+    actions += [Action('Steal', t) for t in targets]
+    return tuple(actions)
+
+
+# Every turn's legal actions, looked up by coin tier (below the cost of an
+# Assassination, of a Coup, then forced to Coup), seat and live-seat bitmask
+_COIN_TIERS = (ASSASSINATE_COST, COUP_COST, FORCED_COUP)
+_TURN_ACTIONS = [_turn_actions(tier, seat, live)
+                 for tier in range(len(_COIN_TIERS) + 1) for seat in range(MAX_PLAYERS)
+                 for live in range(1 << MAX_PLAYERS)]
+_RESPONSES = (CHALLENGE_ACTION, PASS_ACTION)
+_BLOCK_ACTIONS = tuple(tuple(Action('Block', role=role) for role in BLOCKS.get(kind, ())) + (PASS_ACTION,)
+                       for kind in ACTION_KINDS)
+
+
+def step(state, action, rng=random):
+    """
+    Applies `action` for `state.to_move` and returns the resulting state.
+
+    `state` itself is left untouched; `rng` is only used to draw cards from
+    the court deck.
+    """
+    if action not in _legal(state):
+        raise ValueError(f"Illegal action {action} in phase {state.phase}.")
+    s = state.clone()
+    _PHASE_HANDLERS[s.buf[_PHASE]](s, s.buf[_TO_MOVE], action, rng)
+    return s
+
+
+def _act(s, seat, action, rng):
+    kind = _KIND_CODES[action.kind]
+    s.buf[_KIND] = kind
+    s.buf[_TARGET] = -1 if action.target is None else action.target
+    _ACTION_HANDLERS[kind](s, seat, action.target, rng)
+
+
+def _income(s, seat, target, rng):
+    s.coins[seat] += 1
+    _end_turn(s)
+
+
+def _foreign_aid(s, seat, target, rng):
+    _open_block(s, s.next_alive(seat))
+
+
+def _coup(s, seat, target, rng):
+    s.coins[seat] -= COUP_COST
+    _lose(s, target, _END, rng)
+
+
+def _assassinate(s, seat, target, rng):
+    s.coins[seat] -= ASSASSINATE_COST  # Pay the cost first
+    _open_challenge(s, seat, ASSASSIN, False)
+
+
+def _claim(role):
+    def claim(s, seat, target, rng):
+        _open_challenge(s, seat, role, False)
+    return claim
+
+
+def _respond_to_claim(s, seat, action, rng):
+    buf = s.buf
+    claimant = buf[_CLAIMANT]
+    if action.kind == "Pass":
+        responder = s.next_alive(seat)
+        if responder != claimant:
+            buf[_TO_MOVE] = responder
+        else:
+            _claim_upheld(s, rng)
+    elif buf[_CLAIM] in s.hands[claimant]:
+        # Truthful: the revealed card goes back to the deck and is replaced
+        deck = s.deck
+        deck.put(buf[_CLAIM])
+        _replace_card(s, claimant, buf[_CLAIM], deck.draw(rng))
+        _lose(s, seat, _UPHELD, rng)
+    else:
+        _lose(s, claimant, _REFUTED, rng)
+
+
+def _respond_to_action(s, seat, action, rng):
+    if action.kind == "Block":
+        _open_challenge(s, seat, action.role, True)
+    else:
+        _next_blocker(s, seat, rng)
+
+
+def _choose_loss(s, seat, action, rng):
+    _reveal(s, seat, action.role)
+    _resume(s, s.buf[_AFTER_LOSS], rng)
+
+
+def _keep(s, seat, action, rng):
+    buf = s.buf
+    pool = s.hands[seat] + s.drawn
+    for role in action.role:
+        pool.remove(role)
+    base = _SEATS + seat * _SEAT_SIZE
+    kept = iter(action.role)
+    for i in (0, 1):
+        if buf[base + _DEAD0 + i] == 0:
+            buf[base + _CARD0 + i] = next(kept)
+    deck = s.deck
+    for role in pool:
+        deck.put(role)
+    buf[_DRAWN0] = buf[_DRAWN1] = -1
+    _end_turn(s)
+
+
+# Integer codes of the action kinds, as stored in the buffer, and what each does
+_INCOME, _FOREIGN_AID, _COUP, _TAX, _ASSASSINATE, _EXCHANGE, _STEAL = range(len(ACTION_KINDS))
+_KIND_CODES = {kind: code for code, kind in enumerate(ACTION_KINDS)}
+_ACTION_HANDLERS = (_income, _foreign_aid, _coup, _claim(DUKE), _assassinate, _claim(AMBASSADOR), _claim(CAPTAIN))
+_PHASE_HANDLERS = (_act, _respond_to_claim, _respond_to_action, _choose_loss, _keep)
+
+
+def _start_turn(s):
+    buf = s.buf
+    buf[_PHASE] = ACTION
+    buf[_TO_MOVE] = buf[_CURRENT]
+    buf[_KIND] = buf[_TARGET] = buf[_CLAIMANT] = buf[_CLAIM] = buf[_AFTER_LOSS] = -1
+    buf[_BLOCKING] = 0
+
+
+def _end_turn(s):
+    s.buf[_TURN] += 1
+    s.buf[_CURRENT] = s.next_alive(s.buf[_CURRENT])
+    _start_turn(s)
+
+
+def _open_challenge(s, seat, role, blocking):
+    buf = s.buf
+    buf[_CLAIMANT] = seat
+    buf[_CLAIM] = role
+    buf[_BLOCKING] = 1 if blocking else 0
+    buf[_PHASE] = CHALLENGE
+    buf[_TO_MOVE] = s.next_alive(seat)
+
+
+def _open_block(s, blocker):
+    s.buf[_PHASE] = BLOCK
+    s.buf[_TO_MOVE] = blocker
+
+
+def _next_blocker(s, seat, rng):
+    """Moves the block on from `seat`, who passed or failed to block."""
+    buf = s.buf
+    if buf[_KIND] == _FOREIGN_AID:
+        # Every other player may block Foreign Aid in turn
+        blocker = s.next_alive(seat)
+        if blocker != buf[_CURRENT]:
+            _open_block(s, blocker)
+            return
+    _unblocked(s, rng)
+
+
+def _claim_upheld(s, rng):
+    buf = s.buf
+    if buf[_BLOCKING]:
+        _end_turn(s)  # The block stands
+        return
+    kind = buf[_KIND]
+    target = buf[_TARGET]
+    if kind == _TAX:
+        s.coins[buf[_CURRENT]] += 3
+        _end_turn(s)
+    elif kind == _EXCHANGE:
+        deck = s.deck
+        if len(deck) < 2:
+            _end_turn(s)  # Not enough cards in the deck to perform an exchange
+            return
+        buf[_DRAWN0] = deck.draw(rng)
+        buf[_DRAWN1] = deck.draw(rng)
+        buf[_PHASE] = EXCHANGE
+        buf[_TO_MOVE] = buf[_CURRENT]
+    elif s.in_game(target):
+        _open_block(s, target)  # Assassinate or Steal
+    else:
+        _end_turn(s)
+
+
+def _claim_refuted(s, rng):
+    buf = s.buf
+    if not buf[_BLOCKING]:
+        _end_turn(s)  # Bluff caught, the action fails
+    else:
+        _next_blocker(s, buf[_CLAIMANT], rng)
+
+
+def _unblocked(s, rng):
+    buf = s.buf
+    kind = buf[_KIND]
+    player = buf[_CURRENT]
+    if kind == _FOREIGN_AID:
+        s.coins[player] += 2
+    elif kind == _ASSASSINATE:
+        _lose(s, buf[_TARGET], _END, rng)
+        return
+    elif kind == _STEAL:
+        coins = s.coins
+        target = buf[_TARGET]
+        amount = min(2, coins[target])
+        coins[target] -= amount
+        coins[player] += amount
+    _end_turn(s)
+
+
+def _lose(s, seat, then, rng):
+    hand = s.hands[seat]
+    if len(set(hand)) > 1:
+        s.buf[_PHASE] = LOSE
+        s.buf[_TO_MOVE] = seat
+        s.buf[_AFTER_LOSS] = then
+        return
+    if hand:
+        _reveal(s, seat, hand[0])  # No choice to make
+    _resume(s, then, rng)
+
+
+def _replace_card(s, seat, role, new_role):
+    buf = s.buf
+    base = _SEATS + seat * _SEAT_SIZE
+    for i in (0, 1):
+        if buf[base + _CARD0 + i] == role and buf[base + _DEAD0 + i] == 0:
+            buf[base + _CARD0 + i] = new_role
+            return
+
+
+def _reveal(s, seat, role):
+    buf = s.buf
+    base = _SEATS + seat * _SEAT_SIZE
+    for i in (0, 1):
+        if buf[base + _CARD0 + i] == role and buf[base + _DEAD0 + i] == 0:
+            buf[base + _DEAD0 + i] = 1
+            break
+    buf[base + _INFLUENCE] -= 1
+    if buf[base + _INFLUENCE] == 0:
+        # Eliminated: the only time the ring of live seats changes
+        buf[_LIVE] &= ~(1 << seat)
+        buf[_ALIVE] -= 1
+        if buf[_ALIVE] == 1:
+            buf[_WINNER] = _NEXT_ALIVE[seat << MAX_PLAYERS | buf[_LIVE]]
+
+
+def _resume(s, then, rng):
+    buf = s.buf
+    if buf[_WINNER] >= 0:
+        buf[_PHASE] = GAME_OVER
+        buf[_TO_MOVE] = -1
+    elif then == _UPHELD:
+        _claim_upheld(s, rng)
+    elif then == _REFUTED:
+        _claim_refuted(s, rng)
+    else:
+        _end_turn(s)
@@ -0,0 +1,178 @@
+# Typed game events, and a stream that sends them to pluggable sinks
+#
+# The engine itself stays pure: EventStream wraps new_game() and step(),
+# records the court deck draws made along the way and works out what
+# happened by comparing the states either side of each step. Every sink
+# gets every event through emit(); a sink keeps the events it cares about.
+#
+# GameStarted and Stepped carry everything needed to play the game again
+# (see coup_replay.py); the other events describe what each step did.
+# Claimed events say whether a claim was truthful, which no player at the
+# table could know: they are for analysis, not for bots.
+
+import json
+import random
+import sys
+from collections import namedtuple
+
+from coup_engine import ACTION, BLOCK, CHALLENGE, CLAIMS, EXCHANGE, GAME_OVER, LOSE, ROLES, new_game, step
+
+GameStarted = namedtuple('GameStarted', ['num_players', 'draws'])
+Stepped = namedtuple('Stepped', ['turn', 'player', 'action', 'draws'])
+ActionTaken = namedtuple('ActionTaken', ['turn', 'player', 'kind', 'target', 'coins'])
+Claimed = namedtuple('Claimed', ['turn', 'player', 'role', 'blocking', 'truthful'])
+Blocked = namedtuple('Blocked', ['turn', 'player', 'role'])
+Challenged = namedtuple('Challenged', ['turn', 'player', 'claimant', 'role', 'blocking', 'upheld'])
+Redrawn = namedtuple('Redrawn', ['turn', 'player', 'role'])
+Exchanged = namedtuple('Exchanged', ['turn', 'player'])
+InfluenceLost = namedtuple('InfluenceLost', ['turn', 'player', 'role'])
+Eliminated = namedtuple('Eliminated', ['turn', 'player'])
+GameEnded = namedtuple('GameEnded', ['turn', 'winner'])
+
+
+class RecordingRng:
+    """Passes draws through to `rng` and remembers the ones made since the last take()."""
+    __slots__ = ('rng', 'draws')
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.draws = []
+
+    def randrange(self, n):
+        value = self.rng.randrange(n)
+        self.draws.append(value)
+        return value
+
+    def take(self):
+        draws = self.draws
+        self.draws = []
+        return tuple(draws)
+
+
+def describe_step(before, action, after):
+    """The events (other than Stepped) that `action` caused between `before` and `after`."""
+    turn = before.turn
+    mover = before.to_move
+    phase = before.phase
+    events = []
+    if phase == ACTION:
+        events.append(ActionTaken(turn, mover, action.kind, action.target, before.coins[mover]))
+        if action.kind in CLAIMS:
+            role = CLAIMS[action.kind]
+            events.append(Claimed(turn, mover, role, False, role in before.hands[mover]))
+    elif phase == BLOCK and action.kind == "Block":
+        events.append(Blocked(turn, mover, action.role))
+        events.append(Claimed(turn, mover, action.role, True, action.role in before.hands[mover]))
+    elif phase == CHALLENGE and action.kind == "Challenge":
+        claimant = before.claimant
+        refuted = (after.influences(claimant) < before.influences(claimant)
+                   or (after.phase == LOSE and after.to_move == claimant))
+        events.append(Challenged(turn, mover, claimant, before.claim, before.blocking, not refuted))
+        if not refuted:
+            events.append(Redrawn(turn, claimant, before.claim))
+    elif phase == EXCHANGE:
+        events.append(Exchanged(turn, mover))
+    for player in range(before.num_players):
+        revealed = list(after.dead[player])
+        for role in before.dead[player]:
+            revealed.remove(role)
+        for role in revealed:
+            events.append(InfluenceLost(turn, player, role))
+        if before.in_game(player) and not after.in_game(player):
+            events.append(Eliminated(turn, player))
+    if after.phase == GAME_OVER:
+        events.append(GameEnded(turn, after.winner))
+    return events
+
+
+class EventStream:
+    """
+    new_game() and step() with the same arguments as the engine's, sending
+    the events of every game to each of `sinks`.
+    """
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+    def emit(self, event):
+        for sink in self.sinks:
+            sink.emit(event)
+
+    def new_game(self, num_players, rng=random):
+        recorder = RecordingRng(rng)
+        state = new_game(num_players, recorder)
+        self.emit(GameStarted(num_players, recorder.take()))
+        return state
+
+    def step(self, state, action, rng=random):
+        recorder = RecordingRng(rng)
+        after = step(state, action, recorder)
+        self.emit(Stepped(state.turn, state.to_move, action, recorder.take()))
+        for event in describe_step(state, action, after):
+            self.emit(event)
+        return after
+
+
+class ListSink:
+    """Keeps every event in `events`."""
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+class JsonSink:
+    """Writes one JSON object per event (except the raw Stepped records) to `file`."""
+
+    def __init__(self, file=sys.stdout):
+        self.file = file
+
+    def emit(self, event):
+        if isinstance(event, Stepped):
+            return
+        record = {"event": type(event).__name__, **event._asdict()}
+        self.file.write(json.dumps(record) + "\n")
+
+
+class TextSink:
+    """Prints a line per event, naming players with `names` (default "Player N")."""
+
+    def __init__(self, names=None, file=sys.stdout):
+        self.names = names
+        self.file = file
+
+    def emit(self, event):
+        line = format_event(event, self.names)
+        if line:
+            print(line, file=self.file)
+
+
+def format_event(event, names=None):
+    """A one-line description of `event`, or None for the raw Stepped records."""
+    def name(seat):
+        return names[seat] if names else f"Player {seat + 1}"
+
+    if isinstance(event, GameStarted):
+        return f"New game with {event.num_players} players."
+    if isinstance(event, ActionTaken):
+        target = f" on {name(event.target)}" if event.target is not None else ""
+        return f"Turn {event.turn + 1}: {name(event.player)} ({event.coins} coins) uses {event.kind}{target}."
+    if isinstance(event, Blocked):
+        return f"{name(event.player)} blocks with {ROLES[event.role]}."
+    if isinstance(event, Challenged):
+        result = "but it holds up" if event.upheld else "and catches the bluff"
+        claim = "block with" if event.blocking else "claim of"
+        return f"{name(event.player)} challenges {name(event.claimant)}'s {claim} {ROLES[event.role]} {result}."
+    if isinstance(event, Redrawn):
+        return f"{name(event.player)} shuffles {ROLES[event.role]} into the deck and draws a new card."
+    if isinstance(event, Exchanged):
+        return f"{name(event.player)} exchanges cards with the deck."
+    if isinstance(event, InfluenceLost):
+        return f"{name(event.player)} loses {ROLES[event.role]}."
+    if isinstance(event, Eliminated):
+        return f"{name(event.player)} has been eliminated."
+    if isinstance(event, GameEnded):
+        return f"{name(event.winner)} wins after {event.turn + 1} turns."
+    return None
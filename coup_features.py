@@ -0,0 +1,265 @@
+# Fixed-width observation vectors and legal-action masks, many games at a time
+#
+#   encoder = ObservationEncoder(capacity=256)
+#   observations = np.empty((256, OBS_SIZE), np.float32)
+#   masks = np.empty((256, NUM_ACTIONS), bool)
+#   encoder.encode(states, seats, observations, masks)
+#
+# Each observation is what one seat can see: its own cards, everyone's
+# coins, influence and revealed cards, how many of each role it has not seen
+# (not the deck itself, which nobody may look at), the turn's phase, action
+# and open claim, and the cards it drew if it is exchanging. LAYOUT names
+# the slice each feature occupies. Masks mark the legal codes of
+# coup_replay.ACTIONS.
+#
+# The encoder copies the GameState buffers of the whole batch into the rows
+# of one int16 array and computes every feature with array operations on
+# it, writing straight into the caller's arrays. Every intermediate result,
+# down to the index arrays, has its own working array, sized once for
+# `capacity` states, so a call allocates no arrays; the only memory it takes
+# is the scratch NumPy's loops use internally for broadcasting.
+
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+from coup_engine import (
+    ACTION, ACTION_KINDS, ASSASSINATE_COST, BLOCK, BLOCKS, CARDS_PER_ROLE, CHALLENGE,
+    CHALLENGE_ACTION, COUP_COST, EXCHANGE, FORCED_COUP, GAME_OVER, LOSE, MAX_PLAYERS, PASS_ACTION,
+    ROLES, Action,
+    _BLOCKING, _CARD0, _CARD1, _CLAIM, _CLAIMANT, _COINS, _CURRENT, _DEAD0, _DEAD1, _DECK_TOTAL,
+    _DRAWN0, _DRAWN1, _INFLUENCE, _KIND, _NUM_PLAYERS, _PHASE, _SEAT_SIZE, _SEATS, _SIZE,
+    _TARGET, _TO_MOVE,
+)
+from coup_replay import ACTIONS, CODES
+
+NUM_ACTIONS = len(ACTIONS)
+_NUM_ROLES = len(ROLES)
+
+_FEATURES = (
+    ("hand", _NUM_ROLES),                 # own live cards per role
+    ("seat", MAX_PLAYERS),                # one-hot: the seat observing
+    ("current", MAX_PLAYERS),             # one-hot: whose turn it is
+    ("players", MAX_PLAYERS - 1),         # one-hot: 2 to 6 players
+    ("coins", MAX_PLAYERS),               # coins per seat / 10
+    ("influence", MAX_PLAYERS),           # live cards per seat
+    ("dead", MAX_PLAYERS * _NUM_ROLES),   # revealed cards per seat and role
+    ("unseen", _NUM_ROLES),               # cards per role the observer has not seen / 3
+    ("deck", 1),                          # court deck size / 15
+    ("phase", GAME_OVER + 1),             # one-hot
+    ("kind", len(ACTION_KINDS)),          # one-hot: the turn's action
+    ("target", MAX_PLAYERS),              # one-hot: its target
+    ("claimant", MAX_PLAYERS),            # one-hot: who made the open claim
+    ("claim", _NUM_ROLES),                # one-hot: the role claimed
+    ("blocking", 1),                      # 1 if the open claim is a block
+    ("drawn", _NUM_ROLES),                # cards drawn per role, for the player exchanging
+)
+LAYOUT = {}
+OBS_SIZE = 0
+for _name, _width in _FEATURES:
+    LAYOUT[_name] = slice(OBS_SIZE, OBS_SIZE + _width)
+    OBS_SIZE += _width
+del _name, _width
+
+_ROLE_IDS = np.arange(_NUM_ROLES, dtype=np.int16)
+_SEAT_IDS = np.arange(MAX_PLAYERS, dtype=np.int16)
+_PLAYER_COUNTS = np.arange(2, MAX_PLAYERS + 1, dtype=np.int16)
+_KIND_IDS = np.arange(len(ACTION_KINDS), dtype=np.int16)
+_PHASE_IDS = np.arange(GAME_OVER + 1, dtype=np.int16)
+
+
+def _span(actions):
+    """The slice of action codes that `actions` take up, which must be consecutive."""
+    codes = [CODES[action] for action in actions]
+    assert codes == list(range(codes[0], codes[0] + len(codes))), actions
+    return slice(codes[0], codes[0] + len(codes))
+
+
+# Action codes, as slices of the masks
+_ALWAYS = _span([Action(kind) for kind in ("Income", "Foreign Aid", "Tax", "Exchange")])
+_COUPS = _span([Action('Coup', t) for t in range(MAX_PLAYERS)])
+_ASSASSINATIONS = _span([Action('Assassinate', t) for t in range(MAX_PLAYERS)])
+_STEALS = _span([Action('Steal', t) for t in range(MAX_PLAYERS)])
+_LOSES = _span([Action('Lose', role=role) for role in range(_NUM_ROLES)])
+_CHALLENGE = CODES[CHALLENGE_ACTION]
+_PASS = CODES[PASS_ACTION]
+
+# Legal responses to each kind of action in the BLOCK phase
+_BLOCK_MASKS = np.zeros((len(ACTION_KINDS), NUM_ACTIONS), bool)
+for _kind, _roles in BLOCKS.items():
+    _BLOCK_MASKS[ACTION_KINDS.index(_kind), [CODES[Action('Block', role=role)] for role in _roles]] = True
+    _BLOCK_MASKS[ACTION_KINDS.index(_kind), _PASS] = True
+
+# Legal Keeps for every Exchange pool, indexed by the pool's role counts in
+# base 5 (a pool holds at most 4 cards of a role). A drawn card adds its
+# role's weight; an empty draw slot (-1) wraps round to the trailing 0.
+_POOL_BASE = (5 ** np.arange(_NUM_ROLES)).astype(np.int16)
+_DRAW_WEIGHTS = np.append(_POOL_BASE, 0).astype(np.int16)
+_KEEP_MASKS = np.zeros((5 ** _NUM_ROLES, NUM_ACTIONS), bool)
+for _size in (3, 4):
+    for _pool in combinations_with_replacement(range(_NUM_ROLES), _size):
+        _counts = np.bincount(_pool, minlength=_NUM_ROLES)
+        for _keep in combinations_with_replacement(range(_NUM_ROLES), _size - 2):
+            if (np.bincount(_keep, minlength=_NUM_ROLES) <= _counts).all():
+                _KEEP_MASKS[_counts @ _POOL_BASE, CODES[Action('Keep', role=_keep)]] = True
+del _kind, _roles, _size, _pool, _counts, _keep
+
+
+class ObservationEncoder:
+    """Encodes batches of up to `capacity` states."""
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._raw = np.empty((capacity, _SIZE), np.int16)
+        self._raw_items = memoryview(self._raw).cast("B").cast("h")
+        self._seats = np.empty(capacity, np.int16)
+        self._seat_rows = np.arange(capacity) * MAX_PLAYERS  # index of each row's seat 0 among all (row, seat)
+        self._coin_offsets = np.arange(capacity) * _SIZE + _SEATS + _COINS  # of seat 0's coins in the raw rows
+        self._index = np.empty(capacity, np.intp)
+        self._match = np.empty((capacity, MAX_PLAYERS, 2, _NUM_ROLES), bool)
+        self._revealed = np.empty((capacity, MAX_PLAYERS, 2), bool)
+        self._hidden = np.empty((capacity, MAX_PLAYERS, 2, _NUM_ROLES), bool)
+        self._faceup = np.empty((capacity, MAX_PLAYERS, 2, _NUM_ROLES), bool)
+        self._hands = np.empty((capacity, MAX_PLAYERS, _NUM_ROLES), np.int16)
+        self._own = np.empty((capacity, _NUM_ROLES), np.int16)
+        self._seen = np.empty((capacity, _NUM_ROLES), np.float32)
+        self._drawn = np.empty((capacity, _NUM_ROLES), np.int16)
+        self._draw = np.empty((capacity, _NUM_ROLES), bool)
+        # For the masks
+        self._in_phase = np.empty(capacity, bool)
+        self._free = np.empty(capacity, bool)
+        self._affords = np.empty(capacity, bool)
+        self._coins = np.empty(capacity, np.int16)
+        self._pool = np.empty(capacity, np.int16)
+        self._weights = np.empty(capacity, np.int16)
+        self._targets = np.empty((capacity, MAX_PLAYERS), bool)
+        self._others = np.empty((capacity, MAX_PLAYERS), bool)
+        self._mover_hand = np.empty((capacity, _NUM_ROLES), np.int16)
+        self._held = np.empty((capacity, _NUM_ROLES), bool)
+        self._looked_up = np.empty((capacity, NUM_ACTIONS), bool)
+
+    def encode(self, states, seats, observations, masks=None):
+        """
+        Writes the observation of `seats[i]` in `states[i]` into row i of
+        `observations` (float32, OBS_SIZE wide) and, if given, the legal
+        actions of `states[i]` into row i of `masks` (bool, NUM_ACTIONS wide).
+        Both must be C-contiguous. Every intermediate result goes into the
+        encoder's own arrays, so no array is allocated per call.
+        """
+        n = len(states)
+        if n > self.capacity:
+            raise ValueError(f"This encoder takes at most {self.capacity} states at a time.")
+        if not observations.flags.c_contiguous or (masks is not None and not masks.flags.c_contiguous):
+            raise ValueError("The observations and masks must be C-contiguous.")
+        raw = self._raw[:n]
+        items = self._raw_items
+        end = 0
+        for state in states:
+            items[end:end + _SIZE] = state.buf
+            end += _SIZE
+        seats_ = self._seats[:n]
+        seats_[:] = seats
+        records = raw[:, _SEATS:].reshape(n, MAX_PLAYERS, _SEAT_SIZE)
+
+        # Which card slot holds which role, and which are face up
+        match = np.equal(records[:, :, _CARD0:_CARD1 + 1, None], _ROLE_IDS, out=self._match[:n])
+        revealed = np.equal(records[:, :, _DEAD0:_DEAD1 + 1], 1, out=self._revealed[:n])
+        hidden = np.greater(match, revealed[..., None], out=self._hidden[:n])
+        hands = np.sum(hidden, axis=2, out=self._hands[:n])
+        index = np.add(self._seat_rows[:n], seats_, out=self._index[:n])
+        own = np.take(hands.reshape(-1, _NUM_ROLES), index, axis=0, out=self._own[:n])
+
+        # The cards drawn by the observer, if it is the one exchanging
+        exchanging = np.equal(raw[:, _PHASE], EXCHANGE, out=self._in_phase[:n])
+        np.logical_and(exchanging, np.equal(raw[:, _TO_MOVE], seats_, out=self._free[:n]), out=exchanging)
+        drawn = self._drawn[:n]
+        drawn.fill(0)
+        draw = self._draw[:n]
+        for slot in (_DRAWN0, _DRAWN1):
+            np.equal(raw[:, slot, None], _ROLE_IDS, out=draw)
+            np.logical_and(draw, exchanging[:, None], out=draw)
+            drawn += draw
+
+        obs = observations[:n]
+        obs.fill(0)
+        obs[:, LAYOUT["hand"]] = own
+        np.equal(seats_[:, None], _SEAT_IDS, out=obs[:, LAYOUT["seat"]])
+        np.equal(raw[:, _CURRENT, None], _SEAT_IDS, out=obs[:, LAYOUT["current"]])
+        np.equal(raw[:, _NUM_PLAYERS, None], _PLAYER_COUNTS, out=obs[:, LAYOUT["players"]])
+        coins = obs[:, LAYOUT["coins"]]
+        np.maximum(records[:, :, _COINS], 0, out=coins, casting="unsafe")
+        coins *= 0.1
+        np.maximum(records[:, :, _INFLUENCE], 0, out=obs[:, LAYOUT["influence"]], casting="unsafe")
+        dead = obs[:, LAYOUT["dead"]].reshape(n, MAX_PLAYERS, _NUM_ROLES)
+        np.sum(np.logical_and(match, revealed[..., None], out=self._faceup[:n]), axis=2, out=dead)
+        unseen = obs[:, LAYOUT["unseen"]]
+        unseen[:] = CARDS_PER_ROLE
+        unseen -= own
+        unseen -= np.sum(dead, axis=1, out=self._seen[:n])
+        unseen -= drawn
+        unseen *= 1 / CARDS_PER_ROLE
+        np.multiply(raw[:, _DECK_TOTAL], 1 / (CARDS_PER_ROLE * _NUM_ROLES), out=obs[:, LAYOUT["deck"].start])
+        np.equal(raw[:, _PHASE, None], _PHASE_IDS, out=obs[:, LAYOUT["phase"]])
+        # A field that is not set holds -1, which matches no column
+        np.equal(raw[:, _KIND, None], _KIND_IDS, out=obs[:, LAYOUT["kind"]])
+        np.equal(raw[:, _TARGET, None], _SEAT_IDS, out=obs[:, LAYOUT["target"]])
+        np.equal(raw[:, _CLAIMANT, None], _SEAT_IDS, out=obs[:, LAYOUT["claimant"]])
+        np.equal(raw[:, _CLAIM, None], _ROLE_IDS, out=obs[:, LAYOUT["claim"]])
+        np.equal(raw[:, _BLOCKING], 1, out=obs[:, LAYOUT["blocking"].start])
+        obs[:, LAYOUT["drawn"]] = drawn
+
+        if masks is not None:
+            self._legal(raw, records, hands, masks[:n])
+
+    def _legal(self, raw, records, hands, masks):
+        """
+        Writes the legal actions of every row into `masks`. Each phase's rule
+        is worked out for every row and kept only in the rows in that phase,
+        so nothing is gathered into new arrays.
+        """
+        n = len(raw)
+        masks.fill(False)
+        phase = raw[:, _PHASE]
+        in_phase = self._in_phase[:n]
+        looked_up = self._looked_up[:n]
+
+        np.equal(phase, ACTION, out=in_phase)
+        current = raw[:, _CURRENT]
+        index = np.multiply(current, _SEAT_SIZE, out=self._index[:n])
+        index += self._coin_offsets[:n]
+        coins = np.take(raw.reshape(-1), index, out=self._coins[:n], mode="clip")
+        targets = np.greater(records[:, :, _INFLUENCE], 0, out=self._targets[:n])
+        targets &= np.not_equal(current[:, None], _SEAT_IDS, out=self._others[:n])
+        targets &= in_phase[:, None]
+        free = np.less(coins, FORCED_COUP, out=self._free[:n])  # not forced to Coup
+        free &= in_phase
+        masks[:, _ALWAYS] = free[:, None]
+        affords = self._affords[:n]
+        np.logical_and(targets, np.greater_equal(coins, COUP_COST, out=affords)[:, None], out=masks[:, _COUPS])
+        np.greater_equal(coins, ASSASSINATE_COST, out=affords)
+        affords &= free
+        np.logical_and(targets, affords[:, None], out=masks[:, _ASSASSINATIONS])
+        np.logical_and(targets, free[:, None], out=masks[:, _STEALS])
+
+        np.equal(phase, CHALLENGE, out=in_phase)
+        masks[:, _CHALLENGE] = masks[:, _PASS] = in_phase
+
+        np.equal(phase, BLOCK, out=in_phase)
+        np.take(_BLOCK_MASKS, raw[:, _KIND], axis=0, out=looked_up, mode="clip")
+        looked_up &= in_phase[:, None]
+        masks |= looked_up
+
+        # The hand of whoever is to move, for losing a card or exchanging
+        index = np.add(self._seat_rows[:n], raw[:, _TO_MOVE], out=self._index[:n])
+        hand = np.take(hands.reshape(-1, _NUM_ROLES), index, axis=0, out=self._mover_hand[:n], mode="clip")
+
+        np.equal(phase, LOSE, out=in_phase)
+        np.logical_and(np.greater(hand, 0, out=self._held[:n]), in_phase[:, None], out=masks[:, _LOSES])
+
+        np.equal(phase, EXCHANGE, out=in_phase)
+        pool = np.dot(hand, _POOL_BASE, out=self._pool[:n])
+        for slot in (_DRAWN0, _DRAWN1):
+            pool += np.take(_DRAW_WEIGHTS, raw[:, slot], out=self._weights[:n], mode="wrap")
+        np.take(_KEEP_MASKS, pool, axis=0, out=looked_up, mode="clip")
+        looked_up &= in_phase[:, None]
+        masks |= looked_up
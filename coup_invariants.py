@@ -0,0 +1,213 @@
+# Invariant checks on the states a simulation reaches, cheap enough to leave on
+#
+#   python coup_tournament.py --games 1000000 --check
+#   python coup_tournament.py --games 100000 --check --check-every 1   # every state of every game
+#
+#   checker = InvariantChecker(dump_dir="bad-games")
+#   play_game(bots, rng, events=checker)   # takes an EventStream's place,
+#   checker.flush()                         # or wraps one: InvariantChecker(events)
+#
+# The rules every reachable state obeys:
+#
+# - the 15 cards are all somewhere: in hands (face down or revealed), in an
+#   Exchange draw or in the court deck, three of each role
+# - the deck's total matches its counts, and nobody has negative coins
+# - each player's influence is their face-down card count, the live-seat
+#   bitmask and count agree with it, and there is a winner exactly when one
+#   player is left and the game is over
+# - whoever is to move is still in the game
+#
+# Checking a state in Python would cost about as much as playing the step,
+# so the checker only keeps each state's buffer as it is made and checks
+# them in batches of `capacity` with array operations, transposed so that
+# every field of the batch is one contiguous row. Even so, keeping every
+# state and recording every game's moves and deck draws for a replay costs
+# 5-15%. So only one game in `every` is checked state by state and
+# recorded. The others are checked at the deal and at the end, and in
+# between their steps go straight to the engine. A broken count of cards or
+# lives carries through to the end of a game, so those games still catch
+# most bugs, at about 1-2% in all.
+#
+# A state that breaks a rule in a recorded game gets its game written to
+# `dump_dir` as a replay, up to that state, and InvariantError names the
+# rules, the step and the file. A game checked only at its ends cannot be
+# saved, so the error says to check every game instead.
+
+import os
+from bisect import bisect_right
+
+import numpy as np
+
+from coup_engine import (
+    CARDS_PER_ROLE, GAME_OVER, MAX_PLAYERS, ROLES, new_game, step,
+    _ALIVE, _CARD0, _CARD1, _COINS, _DEAD0, _DEAD1, _DECK, _DECK_TOTAL, _DRAWN0, _DRAWN1, _INFLUENCE,
+    _LIVE, _NUM_PLAYERS, _PHASE, _SEAT_SIZE, _SEATS, _SIZE, _TO_MOVE, _TURN, _WINNER,
+)
+from coup_events import RecordingRng
+from coup_replay import Replay, ReplayWriter, _Replayed
+
+_SEAT_IDS = np.arange(MAX_PLAYERS, dtype=np.int16)[:, None]
+_SEAT_BITS = (1 << np.arange(MAX_PLAYERS, dtype=np.int16))[:, None]
+_LIVE_COUNTS = np.array([bin(live).count("1") for live in range(1 << MAX_PLAYERS)], np.int16)
+# Every card weighs 16 ** role (nothing, for an empty slot), so the cards of
+# each role add up to one hex digit of the total: three of each role is 0x33333
+_WEIGHTS = np.array([0] + [16 ** role for role in range(len(ROLES))], np.int32)
+_ALL_CARDS = CARDS_PER_ROLE * int(_WEIGHTS.sum())
+
+
+class InvariantError(RuntimeError):
+    """A state reached in play broke one of the rules above."""
+
+
+def check(fields):
+    """
+    Checks a batch of GameState buffers laid out field by field: row i of
+    `fields` is buffer index i of every state in the batch. Returns a dict of
+    rule name -> boolean array, True where the states obey the rule; the last
+    axis is the state.
+    """
+    seats = fields[_SEATS:].reshape(MAX_PLAYERS, _SEAT_SIZE, -1)
+    seated = _SEAT_IDS < fields[_NUM_PLAYERS]
+    deck = fields[_DECK:_DECK_TOTAL]
+    cards = (_WEIGHTS.take(seats[:, _CARD0:_CARD1 + 1] + 1, mode="clip").sum(axis=(0, 1))
+             + _WEIGHTS.take(fields[_DRAWN0:_DRAWN1 + 1] + 1, mode="clip").sum(axis=0))
+    for role in range(len(ROLES)):
+        cards += deck[role] * _WEIGHTS[role + 1]
+    influence = seats[:, _INFLUENCE]
+    live = ((influence > 0) * _SEAT_BITS).sum(axis=0)
+    alive = _LIVE_COUNTS[live]
+    over = fields[_PHASE] == GAME_OVER
+    winner = fields[_WINNER]
+    to_move = fields[_TO_MOVE]
+    return {
+        "cards conserved": cards == _ALL_CARDS,
+        "deck total matches its counts": deck.sum(axis=0) == fields[_DECK_TOTAL],
+        "coins never negative": (seats[:, _COINS] >= 0) == seated,
+        "influence matches face-down cards": (influence + seats[:, _DEAD0] + seats[:, _DEAD1] == 2) == seated,
+        "live seats match influence": (live == fields[_LIVE]) & (alive == fields[_ALIVE]),
+        "winner exactly when one player is left": ((alive == 1) == over) & ((winner >= 0) == over)
+                                                  & (~over | (live >> np.maximum(winner, 0) & 1 == 1)),
+        "player to move is in the game": over | ((to_move >= 0) & (live >> np.maximum(to_move, 0) & 1 == 1)),
+    }
+
+
+class _Game:
+    """Enough to replay one game: its moves, and the deck draws they made."""
+    __slots__ = ('num_players', 'rng', 'actions')
+
+    def __init__(self, num_players, rng):
+        self.num_players = num_players
+        self.rng = RecordingRng(rng)
+        self.actions = []
+
+    def replay(self, steps):
+        """The Replay of the game's first `steps` steps."""
+        recorder = RecordingRng(_Replayed(self.rng.draws))
+        state = new_game(self.num_players, recorder)
+        replay = Replay(self.num_players, recorder.take(), [])
+        for action in self.actions[:steps]:
+            state = step(state, action, recorder)
+            replay.steps.append((action, recorder.take()))
+        return replay
+
+
+class InvariantChecker:
+    """
+    new_game() and step() with the same arguments as the engine's, checking
+    every state of one game in `every`, and the first and last states of
+    the others. Pass an EventStream as `events` to have it do the playing.
+    States are checked `capacity` at a time; flush() checks the rest and
+    should be called once the last game is over.
+    """
+
+    def __init__(self, events=None, dump_dir=".", capacity=4096, every=8):
+        self.dump_dir = dump_dir
+        self.capacity = capacity
+        self.every = every
+        self.checked = 0
+        self._new_game = events.new_game if events else new_game
+        self._step = events.step if events else step
+        self._fields = np.empty((_SIZE, capacity), np.int16)
+        self._buffers = []  # of the states waiting; arrays, unlike GameStates, cost the GC nothing
+        self._games = []   # the games with states waiting, and where their states start
+        self._starts = []
+        self._game = None  # None while a game checked only at its ends is played
+        self._last = None  # the latest state of such a game
+        self._played = 0
+        self._dumps = 0
+
+    def new_game(self, num_players, rng):
+        self._finish()
+        if len(self._buffers) >= self.capacity:
+            self.flush()
+        self._starts.append(len(self._buffers))
+        if self._played % self.every:
+            game = None
+            state = self._new_game(num_players, rng)
+        else:
+            game = _Game(num_players, rng)
+            state = self._new_game(num_players, game.rng)
+        self._game = game
+        self._games.append(game)
+        self._buffers.append(state.buf)
+        self._played += 1
+        return state
+
+    def step(self, state, action, rng):
+        game = self._game
+        if game is None:
+            after = self._last = self._step(state, action, rng)
+            return after
+        game.actions.append(action)
+        try:
+            after = self._step(state, action, game.rng)
+        except Exception:
+            self.flush()  # A broken state upstream is the likelier story
+            raise
+        self._buffers.append(after.buf)
+        return after
+
+    def _finish(self):
+        """Queues the last state of a game checked only at its ends."""
+        if self._last is not None:
+            self._buffers.append(self._last.buf)
+            self._last = None
+
+    def flush(self):
+        """Checks every state waiting, raising InvariantError at the first that breaks a rule."""
+        self._finish()
+        buffers, games, starts = self._buffers, self._games, self._starts
+        self._buffers, self._games, self._starts = [], [], []
+        if buffers and buffers[-1][_PHASE] != GAME_OVER:
+            # The game in progress goes on into the next batch
+            game = self._game
+            self._games.append(game)
+            self._starts.append(-len(game.actions) - 1 if game else -1)
+        for first in range(0, len(buffers), self.capacity):
+            batch = buffers[first:first + self.capacity]
+            fields = self._fields[:, :len(batch)]
+            fields[:] = np.frombuffer(b"".join(batch), np.int16).reshape(len(batch), _SIZE).T
+            results = check(fields)
+            if all(passed.all() for passed in results.values()):
+                self.checked += len(batch)
+                continue
+            bad = first + int(np.argmin(np.logical_and.reduce(
+                [passed.reshape(-1, len(batch)).all(axis=0) for passed in results.values()])))
+            broken = [rule for rule, passed in results.items() if not passed[..., bad - first].all()]
+            owner = bisect_right(starts, bad) - 1
+            if games[owner] is None:
+                raise InvariantError(f"{', '.join(broken)}: broken by turn {buffers[bad][_TURN] + 1} of a game "
+                                     "checked only at its ends, so it was not saved; check every state of every "
+                                     "game (every=1) to save it")
+            steps = bad - starts[owner]
+            path = self._dump(games[owner].replay(steps))
+            raise InvariantError(f"{', '.join(broken)}: broken on turn {buffers[bad][_TURN] + 1} after step "
+                                 f"{steps} of a game, saved to {path}")
+
+    def _dump(self, replay):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        self._dumps += 1
+        path = os.path.join(self.dump_dir, f"invariant-{os.getpid()}-{self._dumps}.cpr")
+        with open(path, "wb") as f:
+            ReplayWriter(f).write(replay)
+        return path
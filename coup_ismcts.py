@@ -0,0 +1,164 @@
+# Information-set Monte Carlo Tree Search bot
+#
+# Each iteration deals the cards the bot cannot see at random (consistent with
+# every revealed card), walks the shared tree with UCB, expands one node and
+# finishes the game with fast RandomBot rollouts. Search covers every
+# decision the engine asks for: actions, challenges, blocks, which influence
+# to lose and which cards to keep after an Exchange.
+
+import math
+import random
+import time
+
+from coup_bots import STRATEGIES, RandomBot
+from coup_engine import GAME_OVER, determinize, legal_actions, step
+from coup_rng import break_tie
+
+
+class _Node:
+    __slots__ = ('player', 'children', 'visits', 'available', 'wins')
+
+    def __init__(self, player):
+        self.player = player     # who chose the action leading here
+        self.children = {}       # Action -> _Node
+        self.visits = 0
+        self.available = 0       # iterations in which this action was legal
+        self.wins = 0.0          # reward for `player`
+
+
+class ISMCTSBot:
+    """
+    Searches each decision for `time_limit` seconds or `iterations`
+    determinizations, whichever comes first. After every search `stats`
+    holds the iteration count, nodes expanded and engine steps/sec. Equally
+    visited actions go to the first legal one, or to a random one drawn
+    from `tiebreak`.
+    """
+    name = "ismcts"
+
+    def __init__(self, rng=random, time_limit=0.1, iterations=None, exploration=0.7, rollout_limit=200,
+                 tiebreak=None):
+        if time_limit is None and iterations is None:
+            raise ValueError("ISMCTSBot needs a time limit or an iteration budget.")
+        self.rng = rng
+        self.time_limit = time_limit
+        self.iterations = iterations
+        self.exploration = exploration
+        self.rollout_limit = rollout_limit
+        self.tiebreak = tiebreak
+        self.rollout_policy = RandomBot(rng=rng)
+        self.stats = {}
+        self.expanded = 0
+
+    def choose(self, state):
+        actions = legal_actions(state)
+        if len(actions) == 1:
+            return actions[0]
+        root = self.search(state)
+        return break_tie(actions, lambda a: root.children[a].visits if a in root.children else -1, self.tiebreak)
+
+    def search(self, state, deadline=None):
+        """
+        Runs the search from `state` and returns the root node. `deadline` is
+        a time.perf_counter() value that overrides the bot's own time limit.
+        """
+        me = state.to_move
+        start = time.perf_counter()
+        if deadline is None and self.time_limit is not None:
+            deadline = start + self.time_limit
+        root = _Node(None)
+        iterations = steps = 0
+        self.expanded = 0
+        while self.iterations is None or iterations < self.iterations:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            iterations += 1
+            s, path, tree_steps = self.descend(root, state, me)
+            rewards, rollout_steps = self.rollout(s)
+            self.backpropagate(path, rewards)
+            steps += tree_steps + rollout_steps
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            "iterations": iterations,
+            "nodes": self.expanded,
+            "steps": steps,
+            "elapsed": elapsed,
+            "steps_per_sec": steps / elapsed if elapsed else 0.0,
+        }
+        return root
+
+    def descend(self, root, state, me):
+        """
+        Deals a determinization of `state` for `me` and walks it down the tree
+        until a new node is expanded. Returns the state reached, the nodes on
+        the way and the number of steps taken.
+        """
+        rng = self.rng
+        s = determinize(state, me, rng)
+        node = root
+        path = [root]
+        steps = 0
+        # Selection: descend while every legal action has been tried
+        while s.phase != GAME_OVER:
+            actions = legal_actions(s)
+            untried = [a for a in actions if a not in node.children]
+            if untried:
+                action = rng.choice(untried)
+                child = node.children[action] = _Node(s.to_move)
+                self.expanded += 1
+            else:
+                action, child = self._select(node, actions)
+            for a in actions:
+                if a in node.children:
+                    node.children[a].available += 1
+            s = step(s, action, rng)
+            steps += 1
+            node = child
+            path.append(node)
+            if untried:
+                break
+        return s, path, steps
+
+    def rollout(self, s):
+        """Finishes the game with the weighted-random bot. Returns rewards and steps."""
+        return rollout(s, self.rollout_policy, self.rng, self.rollout_limit)
+
+    @staticmethod
+    def backpropagate(path, rewards, visit=True):
+        for node in path:
+            if visit:
+                node.visits += 1
+            if node.player is not None:
+                node.wins += rewards[node.player]
+
+    def _select(self, node, actions):
+        c = self.exploration
+        best = None
+        best_score = -math.inf
+        for a in actions:
+            child = node.children[a]
+            score = child.wins / child.visits + c * math.sqrt(math.log(max(child.available, 1)) / child.visits)
+            if score > best_score:
+                best, best_score = a, score
+        return best, node.children[best]
+
+
+def rollout(s, policy, rng, limit):
+    depth = 0
+    while s.phase != GAME_OVER and depth < limit:
+        s = step(s, policy.choose(s), rng)
+        depth += 1
+    return _rewards(s), depth
+
+
+def _rewards(state):
+    """1 for the winner; an unfinished rollout is shared out by influence."""
+    if state.winner is not None:
+        return [1.0 if p == state.winner else 0.0 for p in range(state.num_players)]
+    influence = [state.influences(p) for p in range(state.num_players)]
+    total = sum(influence)
+    return [i / total for i in influence]
+
+
+STRATEGIES[ISMCTSBot.name] = ISMCTSBot
@@ -0,0 +1,194 @@
+# A/B matches between two bot variants that stop as soon as the answer is clear
+#
+#   python coup_match.py random honest
+#   python coup_match.py random random --b-params '{"challenge_rate": 50}' --players 4
+#
+# Variant A sits in one seat and variant B fills the others; A's seat moves
+# round the table from game to game so nobody keeps the first move. Games
+# are played in batches on a process pool, and after each batch (taken in
+# order, so the outcome does not depend on the worker count) two sequential
+# probability ratio tests are updated on A's win rate: one asking whether A
+# wins `delta` more often than its fair share, one whether it wins `delta`
+# less often. The match stops as soon as both tests have decided.
+
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from coup_bots import play_game
+from coup_rng import GameRng, game_seed, seat_bots
+from coup_strategies import STRATEGIES
+
+
+class SPRT:
+    """
+    Wald's sequential probability ratio test of a win rate: H0 is p = p0,
+    H1 is p = p1. `alpha` and `beta` are the chances of wrongly accepting H1
+    and H0. Once decided, further results are ignored.
+    """
+
+    def __init__(self, p0, p1, alpha=0.05, beta=0.05):
+        self.p0 = p0
+        self.p1 = p1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.win = math.log(p1 / p0)
+        self.loss = math.log((1 - p1) / (1 - p0))
+        self.llr = 0.0
+        self.decision = None  # "H0" or "H1"
+
+    def update(self, wins, games):
+        if self.decision:
+            return
+        self.llr += wins * self.win + (games - wins) * self.loss
+        if self.llr >= self.upper:
+            self.decision = "H1"
+        elif self.llr <= self.lower:
+            self.decision = "H0"
+
+
+def variant(name, params=None):
+    """A bot class for strategy `name` with its parameters overridden by `params`."""
+    return partial(STRATEGIES[name], **params) if params else STRATEGIES[name]
+
+
+def play_match_batch(a, b, num_players, first, games, seed):
+    """
+    Plays games `first` to `first + games - 1` of the match. `a` and `b` are
+    (strategy name, parameters) pairs. A sits in seat `game % num_players`.
+    """
+    a_cls, b_cls = variant(*a), variant(*b)
+    results = {
+        "games": 0,
+        "a_wins": 0,
+        "turns": 0,
+        "a_seat_games": [0] * num_players,
+        "a_seat_wins": [0] * num_players,
+    }
+    for game in range(first, first + games):
+        seat = game % num_players
+        classes = [a_cls if s == seat else b_cls for s in range(num_players)]
+        game_rng = GameRng(game_seed(seed, game))
+        state = play_game(seat_bots(classes, game_rng), game_rng.deck)
+        won = state.winner == seat
+        results["games"] += 1
+        results["a_wins"] += won
+        results["turns"] += state.turn + 1
+        results["a_seat_games"][seat] += 1
+        results["a_seat_wins"][seat] += won
+    return results
+
+
+def run_match(a, b, num_players=2, seed=0, delta=0.05, alpha=0.05, beta=0.05, batch_size=200,
+              workers=None, max_games=100_000):
+    """
+    Plays A against B until the sequential tests decide, or `max_games`.
+    Yields a progress dict after every batch; the last one has a "result"
+    of "A stronger", "A weaker", "no difference" or "undecided".
+    """
+    fair = 1 / num_players
+    stronger = SPRT(fair, fair + delta, alpha, beta)
+    weaker = SPRT(fair, fair - delta, alpha, beta)
+    totals = {"games": 0, "a_wins": 0, "turns": 0,
+              "a_seat_games": [0] * num_players, "a_seat_wins": [0] * num_players}
+    starts = iter(range(0, max_games, batch_size))
+    workers = workers or os.cpu_count()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending = []
+    try:
+        while True:
+            # Keep every worker busy, with the next batch already queued
+            while len(pending) < 2 * workers:
+                first = next(starts, None)
+                if first is None:
+                    break
+                count = min(batch_size, max_games - first)
+                pending.append(pool.submit(play_match_batch, a, b, num_players, first, count, seed))
+            if not pending:
+                break
+            part = pending.pop(0).result()
+            for key in ("games", "a_wins", "turns"):
+                totals[key] += part[key]
+            for key in ("a_seat_games", "a_seat_wins"):
+                totals[key] = [x + y for x, y in zip(totals[key], part[key])]
+            stronger.update(part["a_wins"], part["games"])
+            weaker.update(part["a_wins"], part["games"])
+            progress = dict(totals, fair_share=fair, llr_stronger=stronger.llr, llr_weaker=weaker.llr,
+                            bounds=(stronger.lower, stronger.upper))
+            if stronger.decision == "H1":
+                progress["result"] = "A stronger"
+            elif weaker.decision == "H1":
+                progress["result"] = "A weaker"
+            elif stronger.decision == weaker.decision == "H0":
+                progress["result"] = "no difference"
+            elif totals["games"] >= max_games:
+                progress["result"] = "undecided"
+            yield progress
+            if "result" in progress:
+                break
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def format_progress(progress):
+    games = progress["games"]
+    rate = progress["a_wins"] / games
+    error = 1.96 * math.sqrt(rate * (1 - rate) / games)
+    lower, upper = progress["bounds"]
+    return (f"{games:>7} games  A wins {100 * rate:5.2f}% ± {100 * error:4.2f}% "
+            f"(fair {100 * progress['fair_share']:.1f}%)  "
+            f"LLR stronger {progress['llr_stronger']:+6.2f}, weaker {progress['llr_weaker']:+6.2f} "
+            f"[{lower:.2f}, {upper:.2f}]")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Play two bot variants against each other until one is clearly better.")
+    parser.add_argument("a", help=f"strategy of variant A ({', '.join(STRATEGIES)})")
+    parser.add_argument("b", help="strategy of variant B")
+    parser.add_argument("--a-params", type=json.loads, default={}, help="JSON parameters for variant A")
+    parser.add_argument("--b-params", type=json.loads, default={}, help="JSON parameters for variant B")
+    parser.add_argument("--players", type=int, default=2, help="players per game (2-6); A takes one seat")
+    parser.add_argument("--delta", type=float, default=0.05,
+                        help="win rate difference from the fair share worth detecting")
+    parser.add_argument("--alpha", type=float, default=0.05, help="false positive rate")
+    parser.add_argument("--beta", type=float, default=0.05, help="false negative rate")
+    parser.add_argument("--max-games", type=int, default=100_000, help="stop undecided after this many games")
+    parser.add_argument("--batch-size", type=int, default=200, help="games per work item")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="base random seed")
+    args = parser.parse_args(argv)
+    if not 2 <= args.players <= 6:
+        parser.error("--players must be between 2 and 6")
+    for name in (args.a, args.b):
+        if name not in STRATEGIES:
+            parser.error(f"unknown strategy: {name}")
+    if not 0 < args.delta < 1 / args.players:
+        parser.error("--delta must be positive and below the fair share")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.perf_counter()
+    try:
+        for progress in run_match((args.a, args.a_params), (args.b, args.b_params), args.players, args.seed,
+                                  args.delta, args.alpha, args.beta, args.batch_size, args.workers,
+                                  args.max_games):
+            print(format_progress(progress), flush=True)
+    except FileNotFoundError as e:  # a bot missing the table it plays from
+        raise SystemExit(str(e))
+    print()
+    print(f"Result: {progress['result']} after {progress['games']} games "
+          f"({time.perf_counter() - start:.1f}s)")
+    print("A's win rate by seat:")
+    for seat, (games, wins) in enumerate(zip(progress["a_seat_games"], progress["a_seat_wins"])):
+        if games:
+            print(f"  Seat {seat + 1}: {100 * wins / games:.2f}% of {games}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# Multi-core ISMCTS: root-parallel and leaf-parallel search on a process pool
+#
+# Root parallel (the default) sends the decision to every worker once. Each
+# worker searches its own determinizations with its own seed until the
+# shared deadline, then the root statistics are summed in worker order, so
+# iteration-bounded searches give the same answer on every run.
+#
+# Leaf parallel keeps one tree in the calling process. Each round it selects
+# a batch of leaves (visits are counted on the way down as a virtual loss so
+# the batch spreads out), plays the rollouts on the workers and backs the
+# results up in batch order.
+
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from coup_bots import RandomBot
+from coup_engine import legal_actions
+from coup_ismcts import ISMCTSBot, _Node, rollout
+from coup_rng import break_tie
+
+
+def _search_root(state, seed, deadline, iterations, exploration, rollout_limit):
+    """Worker: one independent ISMCTS search, reported as root statistics."""
+    # `deadline` is wall-clock time so every process agrees on it
+    time_left = None if deadline is None else max(0.0, deadline - time.time())
+    bot = ISMCTSBot(rng=random.Random(seed), time_limit=time_left, iterations=iterations,
+                    exploration=exploration, rollout_limit=rollout_limit)
+    root = bot.search(state)
+    children = {action: (child.visits, child.wins) for action, child in root.children.items()}
+    return children, bot.stats
+
+
+def _rollouts(states, seed, rollout_limit):
+    """Worker: plays out each state with the weighted-random bot."""
+    rng = random.Random(seed)
+    policy = RandomBot(rng=rng)
+    results = [rollout(s, policy, rng, rollout_limit) for s in states]
+    return [rewards for rewards, _ in results], sum(steps for _, steps in results)
+
+
+class ParallelISMCTSBot:
+    """
+    ISMCTS spread over `workers` processes in "root" or "leaf" mode. Budgets
+    are the same as ISMCTSBot: seconds of wall-clock time and/or a total
+    iteration count, which root mode splits evenly between the workers.
+    Bots can share one executor through `pool`; otherwise each bot starts
+    its own on first use and shuts it down in close().
+    """
+    name = "parallel-ismcts"
+
+    def __init__(self, rng=random, workers=None, time_limit=0.1, iterations=None, mode="root",
+                 exploration=0.7, rollout_limit=200, leaves_per_worker=8, pool=None, tiebreak=None):
+        if mode not in ("root", "leaf"):
+            raise ValueError("mode must be 'root' or 'leaf'.")
+        if time_limit is None and iterations is None:
+            raise ValueError("ParallelISMCTSBot needs a time limit or an iteration budget.")
+        self.rng = rng
+        self.workers = workers or os.cpu_count()
+        self.time_limit = time_limit
+        self.iterations = iterations
+        self.mode = mode
+        self.exploration = exploration
+        self.rollout_limit = rollout_limit
+        self.leaves_per_worker = leaves_per_worker
+        self.tiebreak = tiebreak
+        self.stats = {}
+        self._pool = pool
+        self._owns_pool = pool is None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None and self._owns_pool:
+            self._pool.shutdown()
+            self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def choose(self, state):
+        actions = legal_actions(state)
+        if len(actions) == 1:
+            return actions[0]
+        visits = self.search(state)
+        return break_tie(actions, lambda a: visits.get(a, (-1, 0))[0], self.tiebreak)
+
+    def search(self, state):
+        """Returns the merged root statistics as {action: (visits, wins)}."""
+        # Worker seeds come from our own stream, so a seeded bot is reproducible
+        seed = self.rng.getrandbits(64)
+        start = time.perf_counter()
+        if self.mode == "root":
+            merged, steps, iterations = self._search_root(state, seed)
+        else:
+            merged, steps, iterations = self._search_leaf(state, seed, start)
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            "mode": self.mode,
+            "workers": self.workers,
+            "iterations": iterations,
+            "steps": steps,
+            "elapsed": elapsed,
+            "steps_per_sec": steps / elapsed if elapsed else 0.0,
+        }
+        return merged
+
+    def _search_root(self, state, seed):
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        per_worker = math.ceil(self.iterations / self.workers) if self.iterations is not None else None
+        futures = [
+            self.pool.submit(_search_root, state, f"{seed}:{i}", deadline, per_worker,
+                             self.exploration, self.rollout_limit)
+            for i in range(self.workers)
+        ]
+        merged = {}
+        steps = iterations = 0
+        for future in futures:  # Worker order, not completion order
+            children, stats = future.result()
+            for action, (visits, wins) in children.items():
+                total = merged.get(action, (0, 0.0))
+                merged[action] = (total[0] + visits, total[1] + wins)
+            steps += stats["steps"]
+            iterations += stats["iterations"]
+        return merged, steps, iterations
+
+    def _search_leaf(self, state, seed, start):
+        me = state.to_move
+        tree = ISMCTSBot(rng=random.Random(seed), time_limit=None, iterations=0,
+                         exploration=self.exploration, rollout_limit=self.rollout_limit)
+        deadline = start + self.time_limit if self.time_limit is not None else None
+        root = _Node(None)
+        batch_size = self.workers * self.leaves_per_worker
+        steps = iterations = rounds = 0
+        while self.iterations is None or iterations < self.iterations:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            size = batch_size if self.iterations is None else min(batch_size, self.iterations - iterations)
+            leaves = []
+            for _ in range(size):
+                s, path, tree_steps = tree.descend(root, state, me)
+                for node in path:
+                    node.visits += 1  # Virtual loss until the rollout comes back
+                leaves.append((s, path))
+                steps += tree_steps
+            chunk = math.ceil(size / self.workers)
+            futures = [
+                self.pool.submit(_rollouts, [s for s, _ in leaves[i:i + chunk]], f"{seed}:{rounds}:{i}",
+                                 self.rollout_limit)
+                for i in range(0, size, chunk)
+            ]
+            rewards = []
+            for future in futures:
+                chunk_rewards, rollout_steps = future.result()
+                rewards.extend(chunk_rewards)
+                steps += rollout_steps
+            for (_, path), result in zip(leaves, rewards):
+                tree.backpropagate(path, result, visit=False)
+            iterations += size
+            rounds += 1
+        merged = {action: (child.visits, child.wins) for action, child in root.children.items()}
+        return merged, steps, iterations
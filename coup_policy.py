@@ -0,0 +1,191 @@
+# Batched decisions: one vectorized policy call answers many games at once
+#
+#   python coup_policy.py --games 20000 --players 4 --tables 512
+#
+# A policy is any callable taking `(observations, masks)`: a float32 array
+# with one observation row per decision (see coup_features.py) and a boolean
+# array of the same number of rows marking the legal action codes
+# (coup_replay.ACTIONS). It returns one action code per row. Two drivers
+# feed it:
+#
+# - BatchScheduler, for asyncio servers: every table awaits decide(), and
+#   requests are collected into preallocated buffers until `max_batch` are
+#   waiting or the first has waited `max_wait` seconds, then answered by a
+#   single policy call.
+# - play_batched(), for simulations: a fixed number of tables advance in
+#   step, with one policy call per step covering every table's decision.
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from coup_engine import GAME_OVER, MAX_PLAYERS, new_game, step
+from coup_features import NUM_ACTIONS, OBS_SIZE, ObservationEncoder
+from coup_replay import ACTIONS
+from coup_rng import GameRng, game_seed
+
+
+class RandomPolicy:
+    """Picks uniformly among the legal actions of every row."""
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, observations, masks):
+        return (self.rng.random(masks.shape) * masks).argmax(axis=1)
+
+
+class LinearPolicy:
+    """
+    Samples from a softmax over `observations @ weights + bias`, with illegal
+    actions masked out. `weights` is OBS_SIZE x NUM_ACTIONS; with
+    `greedy=True` the best legal action is taken instead.
+    """
+
+    def __init__(self, weights, bias=None, greedy=False, seed=None):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        if self.weights.shape != (OBS_SIZE, NUM_ACTIONS):
+            raise ValueError(f"Weights must be {OBS_SIZE} x {NUM_ACTIONS}, not {self.weights.shape}.")
+        self.bias = np.zeros(NUM_ACTIONS, np.float32) if bias is None else np.asarray(bias, dtype=np.float32)
+        self.greedy = greedy
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """A policy from an .npz file holding `weights` and optionally `bias`."""
+        with np.load(path) as data:
+            return cls(data["weights"], data["bias"] if "bias" in data else None, **kwargs)
+
+    def __call__(self, observations, masks):
+        logits = observations @ self.weights + self.bias
+        logits[~masks] = -np.inf
+        if self.greedy:
+            return logits.argmax(axis=1)
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        cumulative = np.cumsum(probs, axis=1)
+        u = self.rng.random(len(probs)) * cumulative[:, -1]
+        return np.minimum((u[:, None] >= cumulative).sum(axis=1), NUM_ACTIONS - 1)
+
+
+class BatchScheduler:
+    """
+    Collects decision requests from many coroutines and answers them with
+    one policy call once `max_batch` are waiting or the oldest has waited
+    `max_wait` seconds.
+    """
+
+    def __init__(self, policy, max_batch=256, max_wait=0.002):
+        self.policy = policy
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.encoder = ObservationEncoder(max_batch)
+        self.observations = np.zeros((max_batch, OBS_SIZE), np.float32)
+        self.masks = np.zeros((max_batch, NUM_ACTIONS), bool)
+        self.batches = 0
+        self.decisions = 0
+        self._waiting = []
+        self._timer = None
+
+    async def decide(self, state, seat=None):
+        """The policy's action for `seat` (by default the player to move) in `state`."""
+        seat = state.to_move if seat is None else seat
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((state, seat, future))
+        if len(self._waiting) == self.max_batch:
+            self.flush()
+        elif len(self._waiting) == 1:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+        return ACTIONS[await future]
+
+    def flush(self):
+        """Answers every waiting request now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        waiting, self._waiting = self._waiting, []
+        if not waiting:
+            return
+        count = len(waiting)
+        states, seats, futures = zip(*waiting)
+        try:
+            self.encoder.encode(states, seats, self.observations, self.masks)
+            codes = self.policy(self.observations[:count], self.masks[:count])
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.decisions += count
+        for future, code in zip(futures, codes):
+            if not future.done():
+                future.set_result(int(code))
+
+
+def play_batched(policy, games, num_players=2, seed=0, tables=256):
+    """
+    Plays `games` games between copies of `policy`, `tables` at a time,
+    with one policy call per round of decisions. Yields each final state
+    as its game ends (not in game order). Game N uses game N's deck stream,
+    as in the tournament runner.
+    """
+    encoder = ObservationEncoder(tables)
+    observations = np.zeros((tables, OBS_SIZE), np.float32)
+    masks = np.zeros((tables, NUM_ACTIONS), bool)
+    decks = [None] * tables
+    states = [None] * tables
+    started = 0
+    live = []
+    for table in range(min(tables, games)):
+        decks[table] = GameRng(game_seed(seed, started)).deck
+        states[table] = new_game(num_players, decks[table])
+        started += 1
+        live.append(table)
+    while live:
+        batch = [states[table] for table in live]
+        encoder.encode(batch, [state.to_move for state in batch], observations, masks)
+        codes = policy(observations[:len(live)], masks[:len(live)])
+        still_live = []
+        for table, code in zip(live, codes):
+            state = step(states[table], ACTIONS[code], decks[table])
+            if state.phase == GAME_OVER:
+                yield state
+                if started == games:
+                    continue
+                decks[table] = GameRng(game_seed(seed, started)).deck
+                state = new_game(num_players, decks[table])
+                started += 1
+            states[table] = state
+            still_live.append(table)
+        live = still_live
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play games between copies of a policy, batching its decisions.")
+    parser.add_argument("--games", type=int, default=10_000, help="number of games")
+    parser.add_argument("--players", type=int, default=2, help="players per game (2-6)")
+    parser.add_argument("--tables", type=int, default=256, help="games in play at once, i.e. the batch size")
+    parser.add_argument("--policy", metavar="NPZ", help="weights for a LinearPolicy (default: uniform random)")
+    parser.add_argument("--seed", type=int, default=0, help="base random seed")
+    args = parser.parse_args(argv)
+    if not 2 <= args.players <= MAX_PLAYERS:
+        parser.error("--players must be between 2 and 6")
+    policy = LinearPolicy.load(args.policy, seed=args.seed) if args.policy else RandomPolicy(args.seed)
+    start = time.perf_counter()
+    wins = [0] * args.players
+    turns = 0
+    for state in play_batched(policy, args.games, args.players, args.seed, args.tables):
+        wins[state.winner] += 1
+        turns += state.turn + 1
+    elapsed = time.perf_counter() - start
+    print(f"Played {args.games} games in {elapsed:.2f}s ({args.games / elapsed:.0f} games/sec)")
+    print(f"Average game length: {turns / args.games:.2f} turns")
+    for seat, count in enumerate(wins):
+        print(f"  Seat {seat + 1}: {100 * count / args.games:.2f}% wins")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# Where the time goes: timed spans and counters around each phase of play
+#
+#   python coup_tournament.py --games 100000 --timings timings.json
+#   python coup_tournament.py --games 100000 --timings timings.prom   # Prometheus text format
+#   python coup_tournament.py --games 20000 --profile profiles/      # cProfile in every worker
+#   python coup_profile.py timings.json                               # print a saved report
+#
+#   profiler = Profiler()
+#   games = ProfiledGames(profiler)
+#   play_game(games.bots(bots), rng, events=games)
+#   with profiler.span("my.phase"):
+#       ...
+#
+# A Profiler holds a histogram per span name (count, total time, p50 and p99
+# from a QuantileSketch) and a count per counter name, and merges with the
+# Profiler of another worker. ProfiledGames takes the place of an
+# EventStream (or wraps one) and times the engine's step per phase of the
+# turn, the deal, and the court deck draws; its bots() wraps each bot so
+# that decisions are timed per phase too:
+#
+#   deal                 span: new_game()
+#   step.<phase>         span: step() in the action, challenge, block, lose or exchange phase
+#   decide.<phase>       span: a bot's choose() in that phase
+#   draws.<phase>        counter: cards drawn from the court deck ("draws.deal" for the deal)
+#   games, steps         counters
+#
+# Nothing is timed unless the game is played through ProfiledGames, so
+# leaving profiling off costs nothing.
+
+import argparse
+import cProfile
+import json
+import os
+from contextlib import contextmanager
+from time import perf_counter
+
+from coup_engine import new_game, step
+from coup_stats import QuantileSketch
+
+PHASE_NAMES = ("action", "challenge", "block", "lose", "exchange")
+
+
+class Histogram:
+    """Count, total and quantiles of a span's durations in seconds."""
+    __slots__ = ('count', 'total', 'max', 'sketch')
+
+    def __init__(self, accuracy=0.01):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sketch = QuantileSketch(accuracy)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.sketch.add(seconds)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def snapshot(self):
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.sketch.quantile(0.5), "p99": self.sketch.quantile(0.99), "max": self.max}
+
+
+class Profiler:
+    """Timed spans and counters by name, mergeable across workers."""
+
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self.spans = {}
+        self.counters = {}
+
+    def record(self, name, seconds):
+        """Adds one span of `seconds` to `name`."""
+        histogram = self.spans.get(name)
+        if histogram is None:
+            histogram = self.spans[name] = Histogram(self.accuracy)
+        histogram.add(seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def span(self, name):
+        """Times the body of a with block as one span of `name`."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def merge(self, other):
+        for name, histogram in other.spans.items():
+            if name in self.spans:
+                self.spans[name].merge(histogram)
+            else:
+                self.spans[name] = histogram
+        for name, n in other.counters.items():
+            self.count(name, n)
+        return self
+
+    def snapshot(self):
+        return {"spans": {name: self.spans[name].snapshot() for name in sorted(self.spans)},
+                "counters": dict(sorted(self.counters.items()))}
+
+    def to_json(self, file):
+        json.dump(self.snapshot(), file, indent=2)
+        file.write("\n")
+
+    def to_prometheus(self, file):
+        """Writes the spans as a summary and the counters as counters, in the Prometheus text format."""
+        snapshot = self.snapshot()
+        file.write("# HELP coup_span_seconds Time spent in each span of play.\n")
+        file.write("# TYPE coup_span_seconds summary\n")
+        for name, span in snapshot["spans"].items():
+            for quantile, key in (("0.5", "p50"), ("0.99", "p99")):
+                file.write(f'coup_span_seconds{{span="{name}",quantile="{quantile}"}} {span[key]!r}\n')
+            file.write(f'coup_span_seconds_sum{{span="{name}"}} {span["total"]!r}\n')
+            file.write(f'coup_span_seconds_count{{span="{name}"}} {span["count"]}\n')
+        file.write("# HELP coup_events_total Things counted during play.\n")
+        file.write("# TYPE coup_events_total counter\n")
+        for name, n in snapshot["counters"].items():
+            file.write(f'coup_events_total{{counter="{name}"}} {n}\n')
+
+    def save(self, path):
+        """Writes the report to `path`, in the Prometheus format if it ends in .prom and as JSON otherwise."""
+        with open(path + ".tmp", "w") as f:
+            if path.endswith(".prom"):
+                self.to_prometheus(f)
+            else:
+                self.to_json(f)
+        os.replace(path + ".tmp", path)
+
+
+class _CountingRng:
+    """Passes draws through to `rng`, counting them."""
+    __slots__ = ('rng', 'draws')
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.draws = 0
+
+    def randrange(self, n):
+        self.draws += 1
+        return self.rng.randrange(n)
+
+
+class ProfiledGames:
+    """
+    new_game() and step() with the same arguments as the engine's, timing
+    each into `profiler`. Pass an EventStream as `events` to have it do the
+    playing.
+    """
+
+    def __init__(self, profiler, events=None):
+        self.profiler = profiler
+        self._new_game = events.new_game if events else new_game
+        self._step = events.step if events else step
+
+    def bots(self, bots):
+        """`bots`, each wrapped so that its decisions are timed."""
+        return [_TimedBot(bot, self.profiler) for bot in bots]
+
+    def new_game(self, num_players, rng):
+        profiler = self.profiler
+        counting = _CountingRng(rng)
+        start = perf_counter()
+        state = self._new_game(num_players, counting)
+        profiler.record("deal", perf_counter() - start)
+        profiler.count("games")
+        profiler.count("draws.deal", counting.draws)
+        return state
+
+    def step(self, state, action, rng):
+        profiler = self.profiler
+        phase = PHASE_NAMES[state.phase]
+        counting = _CountingRng(rng)
+        start = perf_counter()
+        after = self._step(state, action, counting)
+        profiler.record("step." + phase, perf_counter() - start)
+        profiler.count("steps")
+        if counting.draws:
+            profiler.count("draws." + phase, counting.draws)
+        return after
+
+
+class _TimedBot:
+    """A bot whose choose() is timed per phase; everything else goes straight to `bot`."""
+
+    def __init__(self, bot, profiler):
+        self.bot = bot
+        self.profiler = profiler
+
+    def choose(self, state):
+        start = perf_counter()
+        action = self.bot.choose(state)
+        self.profiler.record("decide." + PHASE_NAMES[state.phase], perf_counter() - start)
+        return action
+
+    def __getattr__(self, name):
+        return getattr(self.bot, name)
+
+
+@contextmanager
+def profiled(path):
+    """Runs the body of a with block under cProfile, saving the stats to `path`."""
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+
+
+def format_report(snapshot):
+    """A table of a Profiler snapshot, slowest spans first."""
+    spans = snapshot["spans"]
+    total = sum(span["total"] for span in spans.values()) or 1.0
+    lines = [f"{'span':<20} {'count':>10} {'total s':>9} {'share':>6} {'mean µs':>9} {'p50 µs':>8} {'p99 µs':>8}"]
+    for name, span in sorted(spans.items(), key=lambda item: -item[1]["total"]):
+        lines.append(f"{name:<20} {span['count']:>10} {span['total']:>9.3f} {100 * span['total'] / total:>5.1f}% "
+                     f"{1e6 * span['mean']:>9.2f} {1e6 * (span['p50'] or 0):>8.2f} {1e6 * (span['p99'] or 0):>8.2f}")
+    if snapshot["counters"]:
+        lines.append("")
+        lines += [f"{name:<20} {n:>10}" for name, n in snapshot["counters"].items()]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print a timing report saved by coup_tournament.py --timings.")
+    parser.add_argument("report", help="a JSON report")
+    args = parser.parse_args(argv)
+    with open(args.report) as f:
+        snapshot = json.load(f)
+    print(format_report(snapshot))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# Compact binary replays, and the coup-replay tool that plays them back
+#
+#   python coup_replay.py games.cpr            # list the games in a file
+#   python coup_replay.py games.cpr 12         # print game 12, event by event
+#   python coup_replay.py games.cpr 12 --step  # ...pausing after every turn
+#
+# A replay stores the moves and the court deck draws, nothing else: running
+# them through the engine again reproduces every state exactly. A file is a
+# header followed by games, each laid out as
+#
+#   players   1 byte
+#   deal      2 bytes per player, the draws new_game() made
+#   steps     1 byte per step: the action's code in the low 6 bits and the
+#             number of cards drawn in the top 2, then 1 byte per draw
+#   end       0xFF
+#
+# so a step is one byte unless it draws cards. No other byte can be 0xFF,
+# which lets the reader split a stream into games without parsing it.
+
+import argparse
+import sys
+from collections import namedtuple
+from itertools import combinations_with_replacement
+
+from coup_engine import (
+    CHALLENGE_ACTION, MAX_PLAYERS, PASS_ACTION, ROLES, Action, GAME_OVER, new_game, step,
+)
+from coup_events import GameEnded, GameStarted, JsonSink, Stepped, TextSink, describe_step
+
+MAGIC = b"COUP"
+VERSION = 1
+END = 0xFF
+
+Replay = namedtuple('Replay', ['num_players', 'deal', 'steps'])  # steps: (action, draws) pairs
+
+# Every action the engine can be given, in code order
+ACTIONS = (
+    [Action('Income'), Action('Foreign Aid'), Action('Tax'), Action('Exchange'), CHALLENGE_ACTION, PASS_ACTION]
+    + [Action(kind, target) for kind in ('Coup', 'Assassinate', 'Steal') for target in range(MAX_PLAYERS)]
+    + [Action('Block', role=role) for role in range(len(ROLES))]
+    + [Action('Lose', role=role) for role in range(len(ROLES))]
+    + [Action('Keep', role=keep) for size in (1, 2) for keep in combinations_with_replacement(range(len(ROLES)), size)]
+)
+CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+
+def encode(replay):
+    """The bytes of one game, end marker included."""
+    data = bytearray([replay.num_players])
+    data += bytes(replay.deal)
+    data += encode_steps(replay.steps)
+    data.append(END)
+    return data
+
+
+def encode_steps(steps):
+    data = bytearray()
+    for action, draws in steps:
+        data.append(CODES[action] | len(draws) << 6)
+        data += bytes(draws)
+    return data
+
+
+def decode(data):
+    """The Replay in `data`, one game's bytes without the end marker."""
+    num_players = data[0]
+    deal = tuple(data[1:1 + 2 * num_players])
+    return Replay(num_players, deal, decode_steps(data, 1 + 2 * num_players))
+
+
+def decode_steps(data, start=0):
+    """The (action, draws) pairs encoded in `data` from `start` on."""
+    steps = []
+    i = start
+    while i < len(data):
+        byte = data[i]
+        count = byte >> 6
+        steps.append((ACTIONS[byte & 0x3F], tuple(data[i + 1:i + 1 + count])))
+        i += 1 + count
+    return steps
+
+
+class ReplayWriter:
+    """
+    An event sink that writes each finished game to the binary file `file`
+    as soon as it ends. Also usable directly through write().
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.games = 0
+        self._game = None
+        file.write(MAGIC + bytes([VERSION]))
+
+    def emit(self, event):
+        if isinstance(event, GameStarted):
+            self._game = Replay(event.num_players, event.draws, [])
+        elif isinstance(event, Stepped):
+            self._game.steps.append((event.action, event.draws))
+        elif isinstance(event, GameEnded):
+            self.write(self._game)
+            self._game = None
+
+    def write(self, replay):
+        self.file.write(encode(replay))
+        self.games += 1
+
+
+def read_replays(file, chunk_size=1 << 16):
+    """Yields every Replay in the binary file `file`, reading it a chunk at a time."""
+    header = file.read(len(MAGIC) + 1)
+    if header[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a Coup replay file.")
+    if header[len(MAGIC)] != VERSION:
+        raise ValueError(f"Replay format {header[len(MAGIC)]} is not supported (expected {VERSION}).")
+    pending = b""
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        start = 0
+        end = pending.find(END, start)
+        while end >= 0:
+            yield decode(pending[start:end])
+            start = end + 1
+            end = pending.find(END, start)
+        pending = pending[start:]
+    if pending:
+        raise ValueError("Replay file ends in the middle of a game.")
+
+
+class _Replayed:
+    """Stands in for the RNG, handing the engine the draws a replay recorded."""
+    __slots__ = ('draws',)
+
+    def __init__(self, draws):
+        self.draws = iter(draws)
+
+    def randrange(self, n):
+        value = next(self.draws)
+        if not 0 <= value < n:
+            raise ValueError(f"Replayed draw {value} is out of range for a deck of {n}.")
+        return value
+
+
+def play_back(replay):
+    """Yields (before, action, after) for every step of `replay`, rebuilt with the engine."""
+    state = new_game(replay.num_players, _Replayed(replay.deal))
+    for action, draws in replay.steps:
+        after = step(state, action, _Replayed(draws))
+        yield state, action, after
+        state = after
+
+
+def final_state(replay):
+    state = new_game(replay.num_players, _Replayed(replay.deal))
+    for action, draws in replay.steps:
+        state = step(state, action, _Replayed(draws))
+    return state
+
+
+def format_state(state, names=None):
+    lines = []
+    for seat in range(state.num_players):
+        name = names[seat] if names else f"Player {seat + 1}"
+        cards = [ROLES[role] for role in state.hands[seat]] + [f"({ROLES[role]})" for role in state.dead[seat]]
+        lines.append(f"  {name}: {state.coins[seat]} coins, {', '.join(cards)}")
+    return "\n".join(lines)
+
+
+def list_games(path):
+    with open(path, "rb") as f:
+        for index, replay in enumerate(read_replays(f)):
+            state = final_state(replay)
+            result = f"Player {state.winner + 1} wins" if state.phase == GAME_OVER else "unfinished"
+            print(f"{index}: {replay.num_players} players, {state.turn + 1} turns, {len(replay.steps)} steps, {result}")
+
+
+def show_game(path, game, interactive=False, as_json=False):
+    with open(path, "rb") as f:
+        count = 0
+        for replay in read_replays(f):
+            if count == game:
+                break
+            count += 1
+        else:
+            sys.exit(f"{path} holds only {count} games.")
+    sink = JsonSink() if as_json else TextSink()
+    sink.emit(GameStarted(replay.num_players, replay.deal))
+    turn = None
+    for before, action, after in play_back(replay):
+        if before.turn != turn and not as_json:
+            if turn is not None and interactive:
+                input("-- Press Enter for the next turn --")
+            turn = before.turn
+            print(f"\n{format_state(before)}")
+        for event in describe_step(before, action, after):
+            sink.emit(event)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List the games in a Coup replay file, or play one back.")
+    parser.add_argument("file", help="binary replay file")
+    parser.add_argument("game", type=int, nargs="?", help="index of the game to play back")
+    parser.add_argument("--step", action="store_true", help="wait for Enter after every turn")
+    parser.add_argument("--json", action="store_true", help="print the game's events as JSON lines")
+    args = parser.parse_args(argv)
+    if args.game is None:
+        list_games(args.file)
+    else:
+        show_game(args.file, args.game, args.step, args.json)
+
+
+if __name__ == "__main__":
+    main()
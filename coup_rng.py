@@ -0,0 +1,74 @@
+# Seeded random streams, so any game can be played again exactly
+#
+# Each game owns a GameRng built from one seed. It hands out independent
+# streams: one for the court deck, one for each seat's decisions and one for
+# each seat's tie-breaks. Every stream is seeded from the game seed and its
+# own name, so drawing more (or fewer) numbers from one stream never shifts
+# another: a bot that thinks differently still sees the same cards dealt.
+#
+# Seeds are strings. random.Random hashes them with SHA-512, so a stream
+# comes out the same in every process and on every run.
+
+import inspect
+import random
+
+
+class GameRng:
+    """The random streams of one game, all derived from `seed`."""
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.deck = self.stream("deck")
+        self._seats = {}
+
+    def stream(self, name):
+        """A new stream for `name`, independent of every other name."""
+        return random.Random(f"{self.seed}/{name}")
+
+    def seat(self, seat):
+        """The stream for the decisions of the bot in `seat`."""
+        return self._seat_stream(seat, "decisions")
+
+    def tiebreak(self, seat):
+        """The stream `seat` uses to choose between equally good actions."""
+        return self._seat_stream(seat, "tiebreak")
+
+    def _seat_stream(self, seat, use):
+        key = (seat, use)
+        if key not in self._seats:
+            self._seats[key] = self.stream(f"seat{seat}/{use}")
+        return self._seats[key]
+
+
+def game_seed(seed, game):
+    """The seed of game number `game` in a run started from `seed`."""
+    return f"{seed}:{game}"
+
+
+def new_seed():
+    """A fresh seed for a run that did not ask for one."""
+    return random.SystemRandom().randrange(1 << 32)
+
+
+def seat_bots(classes, game_rng):
+    """
+    One bot per seat from `classes`, each drawing on its own seat's streams.
+    Bots that take a `tiebreak` argument get the seat's tie-break stream.
+    """
+    bots = []
+    for seat, cls in enumerate(classes):
+        kwargs = {"rng": game_rng.seat(seat)}
+        if "tiebreak" in inspect.signature(cls).parameters:
+            kwargs["tiebreak"] = game_rng.tiebreak(seat)
+        bots.append(cls(**kwargs))
+    return bots
+
+
+def break_tie(actions, score, tiebreak=None):
+    """
+    The action in `actions` with the highest score. Ties go to the first
+    one, or to a random one drawn from `tiebreak`.
+    """
+    best = max(score(a) for a in actions)
+    tied = [a for a in actions if score(a) == best]
+    return tiebreak.choice(tied) if tiebreak and len(tied) > 1 else tied[0]
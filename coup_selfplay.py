@@ -0,0 +1,277 @@
+# coup-selfplay: bot-vs-bot games as training data, in memory-mapped shards
+#
+#   python coup_selfplay.py data/ --games 1000000 --players 4 --strategies belief,random
+#
+#   from coup_selfplay import read_shards
+#   for shard in read_shards("data/"):
+#       shard["obs"], shard["mask"], shard["action"], shard["outcome"]
+#
+# Every decision made in the games becomes one row: the observation of the
+# player deciding and the legal-action mask (see coup_features.py), the
+# action code taken (coup_replay.ACTIONS), that player's seat, whether they
+# went on to win the game, and the game number. Each column is its own .npy
+# file per shard, so a shard loads with np.load(..., mmap_mode="r") and
+# nothing has to fit in memory.
+#
+# Games are played in chunks on a process pool. Workers write their shards
+# straight to disk through memory maps, starting a new shard whenever one
+# reaches the size cap, and only report file names back. `manifest.json`
+# lists the games and shards of every finished chunk and is rewritten after
+# each one, so an interrupted run picks up where it stopped when started
+# again with the same settings: finished chunks are skipped and an
+# unfinished chunk is played again from its first game. So is a chunk cut
+# short by a smaller --games than the run now asks for.
+
+import argparse
+import json
+import math
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from coup_bots import play_game
+from coup_features import NUM_ACTIONS, OBS_SIZE, ObservationEncoder
+from coup_replay import CODES
+from coup_rng import GameRng, game_seed, seat_bots
+from coup_strategies import STRATEGIES
+
+FORMAT = 2
+MANIFEST = "manifest.json"
+
+# Column name -> (dtype, width, or None for one value per row)
+COLUMNS = {
+    "obs": (np.float32, OBS_SIZE),
+    "mask": (np.bool_, NUM_ACTIONS),
+    "action": (np.uint8, None),
+    "seat": (np.uint8, None),
+    "outcome": (np.int8, None),   # 1 if the player deciding won the game, else 0
+    "game": (np.int64, None),
+}
+ROW_BYTES = sum(np.dtype(dtype).itemsize * (width or 1) for dtype, width in COLUMNS.values())
+_NPY_PREFIX = 10  # magic string, version and header length of a version 1.0 .npy file
+
+
+def _shrink_npy(path, rows):
+    """Cuts the .npy file at `path` down to its first `rows` rows, rewriting the header in place."""
+    with open(path, "r+b") as f:
+        if np.lib.format.read_magic(f) != (1, 0):
+            raise ValueError(f"{path} is not a version 1.0 .npy file.")
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        offset = f.tell()
+        header = repr({"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": fortran_order,
+                       "shape": (rows, *shape[1:])}).encode("latin1")
+        # Pad the new header to the old one's length so the data stays put
+        header = header.ljust(offset - _NPY_PREFIX - 1) + b"\n"
+        f.seek(0)
+        f.write(np.lib.format.magic(1, 0) + struct.pack("<H", len(header)) + header)
+        f.truncate(offset + rows * dtype.itemsize * math.prod(shape[1:]))
+
+
+class ShardWriter:
+    """
+    Writes decision rows into shards named `prefix`-NNN in `directory`,
+    each holding at most `max_rows` rows.
+    """
+
+    def __init__(self, directory, prefix, max_rows, encoder_capacity=512):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_rows = max_rows
+        self.shards = []
+        self._encoder = ObservationEncoder(encoder_capacity)
+        self._name = None
+        self._columns = None
+        self._rows = 0
+        self._games = None
+
+    def add_game(self, game, decisions, winner):
+        """Adds the rows of game number `game`: its (state, action) decisions and who won."""
+        done = 0
+        while done < len(decisions):
+            if self._columns is None:
+                self._open()
+            count = min(len(decisions) - done, self.max_rows - self._rows)
+            self._write(game, decisions[done:done + count], winner)
+            done += count
+            if self._rows == self.max_rows:
+                self._close()
+
+    def close(self):
+        """Finishes the last shard and returns the records of every shard written."""
+        if self._columns is not None:
+            self._close()
+        return self.shards
+
+    def _path(self, name, column):
+        return os.path.join(self.directory, f"{name}.{column}.npy")
+
+    def _open(self):
+        self._name = f"{self.prefix}-{len(self.shards):03d}"
+        self._columns = {
+            column: np.lib.format.open_memmap(self._path(self._name, column), mode="w+", dtype=dtype,
+                                              shape=(self.max_rows, width) if width else (self.max_rows,))
+            for column, (dtype, width) in COLUMNS.items()
+        }
+        self._rows = 0
+        self._games = None
+
+    def _write(self, game, decisions, winner):
+        columns = self._columns
+        start = self._rows
+        capacity = self._encoder.capacity
+        for i in range(0, len(decisions), capacity):
+            part = decisions[i:i + capacity]
+            states = [state for state, _ in part]
+            seats = [state.to_move for state in states]
+            rows = slice(start + i, start + i + len(part))
+            self._encoder.encode(states, seats, columns["obs"][rows], columns["mask"][rows])
+            columns["action"][rows] = [CODES[action] for _, action in part]
+            columns["seat"][rows] = seats
+            columns["outcome"][rows] = [seat == winner for seat in seats]
+        end = start + len(decisions)
+        columns["game"][start:end] = game
+        self._rows = end
+        self._games = (self._games or (game, game))[0], game
+
+    def _close(self):
+        for column in COLUMNS:
+            self._columns[column].flush()
+        self._columns = None  # Unmaps the files
+        for column in COLUMNS:
+            _shrink_npy(self._path(self._name, column), self._rows)
+        first, last = self._games
+        self.shards.append({"name": self._name, "rows": self._rows, "first_game": first, "last_game": last})
+
+
+def play_chunk(directory, strategies, first, games, seed, max_rows):
+    """
+    Plays games `first` to `first + games - 1` and writes their decisions to
+    shards named after `first`. Returns the shard records.
+    """
+    classes = [STRATEGIES[name] for name in strategies]
+    writer = ShardWriter(directory, f"chunk-{first:09d}", max_rows)
+    for game in range(first, first + games):
+        game_rng = GameRng(game_seed(seed, game))
+        decisions = []
+        state = play_game(seat_bots(classes, game_rng), game_rng.deck, decisions=decisions)
+        writer.add_game(game, decisions, state.winner)
+    return writer.close()
+
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def generate(directory, strategies, games, seed=0, workers=None, chunk_games=1000, shard_mb=64,
+             progress=None):
+    """
+    Fills `directory` with the decisions of `games` games, resuming from its
+    manifest if there is one. Calls `progress(manifest)` after each chunk.
+    """
+    os.makedirs(directory, exist_ok=True)
+    settings = {"format": FORMAT, "strategies": list(strategies), "seed": seed, "chunk_games": chunk_games,
+                "columns": {column: [np.dtype(dtype).str, width] for column, (dtype, width) in COLUMNS.items()}}
+    manifest = load_manifest(directory)
+    if manifest is None:
+        manifest = dict(settings, games=0, rows=0, chunks={})
+    elif any(manifest.get(key) != value for key, value in settings.items()):
+        raise ValueError(f"{directory} holds data made with different settings; "
+                         "use the same strategies, seed and chunk size to resume.")
+    max_rows = max(1, shard_mb * 2 ** 20 // ROW_BYTES)
+    todo = []
+    for first in range(0, games, chunk_games):
+        chunk = manifest["chunks"].get(str(first))
+        if chunk and chunk["games"] >= min(chunk_games, games - first):
+            continue
+        if chunk:
+            # Cut short by an earlier, smaller --games: drop it before its shards are overwritten
+            del manifest["chunks"][str(first)]
+            manifest["games"] -= chunk["games"]
+            manifest["rows"] -= sum(shard["rows"] for shard in chunk["shards"])
+            save_manifest(directory, manifest)
+        todo.append(first)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(play_chunk, directory, strategies, first, min(chunk_games, games - first),
+                               seed, max_rows): first
+                   for first in todo}
+        for future in as_completed(futures):
+            first = futures[future]
+            shards = future.result()
+            count = min(chunk_games, games - first)
+            manifest["chunks"][str(first)] = {"games": count, "shards": shards}
+            manifest["games"] += count
+            manifest["rows"] += sum(shard["rows"] for shard in shards)
+            save_manifest(directory, manifest)
+            if progress:
+                progress(manifest)
+    return manifest
+
+
+def read_shards(directory):
+    """Yields each shard in `directory` as a dict of read-only memory-mapped columns, in game order."""
+    manifest = load_manifest(directory)
+    if manifest is None:
+        raise ValueError(f"{directory} has no {MANIFEST}.")
+    for first in sorted(manifest["chunks"], key=int):
+        for shard in manifest["chunks"][first]["shards"]:
+            yield {column: np.load(os.path.join(directory, f"{shard['name']}.{column}.npy"), mmap_mode="r")
+                   for column in COLUMNS}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate training data from bot-vs-bot Coup games.")
+    parser.add_argument("directory", help="output directory; an existing run there is resumed")
+    parser.add_argument("--games", type=int, default=100_000, help="total games the run should hold")
+    parser.add_argument("--players", type=int, default=4, help="players per game (2-6)")
+    parser.add_argument("--strategies", default="random",
+                        help=f"comma separated bot per seat, cycled to fill the table ({', '.join(STRATEGIES)})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="base random seed")
+    parser.add_argument("--chunk-games", type=int, default=1000, help="games per work item, the unit of resuming")
+    parser.add_argument("--shard-mb", type=int, default=64, help="size cap of a shard in megabytes")
+    args = parser.parse_args(argv)
+    if not 2 <= args.players <= 6:
+        parser.error("--players must be between 2 and 6")
+    names = args.strategies.split(",")
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategy: {', '.join(unknown)}")
+    args.strategies = [names[i % len(names)] for i in range(args.players)]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.perf_counter()
+    done = (load_manifest(args.directory) or {}).get("games", 0)
+
+    def progress(manifest):
+        elapsed = time.perf_counter() - start
+        print(f"{manifest['games']:>10} games, {manifest['rows']:>12} decisions "
+              f"({(manifest['games'] - done) / elapsed:.0f} games/sec)", flush=True)
+
+    try:
+        manifest = generate(args.directory, args.strategies, args.games, args.seed, args.workers,
+                            args.chunk_games, args.shard_mb, progress)
+    except (ValueError, FileNotFoundError) as e:  # mismatched settings, or a bot missing its table
+        raise SystemExit(str(e))
+    shards = sum(len(chunk["shards"]) for chunk in manifest["chunks"].values())
+    print(f"{args.directory}: {manifest['games']} games, {manifest['rows']} decisions in {shards} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,537 @@
+# Coup over the network: one asyncio process hosting many tables at once
+#
+#   python coup_server.py serve --port 7878
+#   python coup_server.py play --name Alice --table friday --players 3 --bots random
+#
+# The protocol is newline-delimited JSON over TCP, so a plain `nc` works as a
+# client as well. A client joins a table by name:
+#
+#   {"type": "join", "table": "friday", "name": "Alice", "players": 3, "bots": ["random"]}
+#
+# "players" and "bots" only count for the join that creates the table; the
+# game starts as soon as its human seats are filled. Every decision that
+# coup.py asks for with input() arrives as a prompt listing the legal choices
+#
+#   {"type": "prompt", "id": 12, "question": "...", "options": ["Income", ...], "view": {...}}
+#
+# and is answered with {"type": "answer", "id": 12, "choice": 0} (options
+# count from 0). Everybody at the table gets the game's public events as
+# {"type": "event", "event": "ActionTaken", ...}. A player who disconnects
+# during a game is replaced by a RandomBot.
+#
+# Challenges and blocks are asked in one window: everyone who may answer a
+# claim (or block Foreign Aid) is prompted at the same time, with a
+# "deadline" in seconds, and silence by then counts as a pass. When several
+# answer, the first in the engine's order round the table from the claimant
+# takes it and the others are treated as having passed before them, so the
+# game still steps through the engine one answer at a time. Every other
+# prompt has a longer deadline too, so one idle player cannot hold up the
+# table: when it runs out the server plays a random legal action, or the
+# first card in hand when a card must be lost, and says so with
+# {"type": "expired", "id": 12, "option": "..."}.
+#
+# Bots choose inline on the event loop, so only the cheap strategies are
+# offered; a search bot would stall every other table while it thinks. The
+# "policy" bot is the exception: its seats across every table share one
+# BatchScheduler (see coup_policy.py), which answers them in batches.
+
+import argparse
+import asyncio
+import json
+import sys
+
+import coup_events
+from coup_belief import BeliefBot
+from coup_bots import HonestBot, RandomBot
+from coup_engine import (
+    ACTION, BLOCK, CHALLENGE, EXCHANGE, GAME_OVER, LOSE, MAX_PLAYERS, PASS_ACTION, ROLES, Action,
+    legal_actions, step,
+)
+from coup_events import Claimed, EventStream, GameEnded, GameStarted, Stepped, format_event
+from coup_policy import BatchScheduler, LinearPolicy, RandomPolicy
+from coup_rng import GameRng, game_seed, new_seed
+
+DEFAULT_PORT = 7878
+DEFAULT_WINDOW = 15.0  # seconds to answer a challenge or block window
+DEFAULT_TURN_TIME = 60.0  # seconds for any other decision
+# The strategies cheap enough to run on the event loop, plus the batched policy
+BOT_CLASSES = {bot.name: bot for bot in (RandomBot, HonestBot, BeliefBot)}
+BOTS = [*BOT_CLASSES, "policy"]
+
+
+def view(state, seat):
+    """What the player in `seat` can see of `state`: everything but the other hands and the deck order."""
+    record = {
+        "seat": seat,
+        "turn": state.turn,
+        "current": state.current,
+        "hand": [ROLES[role] for role in state.hands[seat]],
+        "coins": list(state.coins),
+        "influence": [state.influences(p) for p in range(state.num_players)],
+        "dead": [[ROLES[role] for role in dead] for dead in state.dead],
+        "deck": len(state.deck),
+    }
+    if state.phase == EXCHANGE and state.to_move == seat:
+        record["drawn"] = [ROLES[role] for role in state.drawn]
+    return record
+
+
+def question(state, names):
+    """The question coup.py would put to `state.to_move`."""
+    name = names[state.to_move]
+    phase = state.phase
+    if phase == ACTION:
+        if state.coins[state.to_move] >= 10:
+            return f"{name}, you have 10 or more coins and must perform a Coup."
+        return f"{name}, choose an action:"
+    if phase == CHALLENGE:
+        claim = "block with" if state.blocking else "perform"
+        return f"{name}, do you want to challenge {names[state.claimant]}'s claim to {claim} {ROLES[state.claim]}?"
+    if phase == BLOCK:
+        kind = state.action.kind
+        if kind == "Foreign Aid":
+            return f"{name}, do you want to block {names[state.current]}'s Foreign Aid?"
+        if kind == "Assassinate":
+            return f"{name}, do you want to block the assassination?"
+        return f"{name}, {names[state.current]} is stealing from you. Choose an option:"
+    if phase == LOSE:
+        return f"{name}, choose a card to lose:"
+    drawn = ", ".join(ROLES[role] for role in state.drawn)
+    return f"{name}, you drew {drawn}. Choose the cards to keep:"
+
+
+def describe_option(action, names):
+    kind = action.kind
+    if kind in ("Coup", "Assassinate"):
+        return f"{kind} {names[action.target]}"
+    if kind == "Steal":
+        return f"Steal from {names[action.target]}"
+    if kind == "Block":
+        return f"Block with {ROLES[action.role]}"
+    if kind == "Lose":
+        return ROLES[action.role]
+    if kind == "Keep":
+        return f"Keep {', '.join(ROLES[role] for role in action.role)}"
+    return kind
+
+
+def response_window(state):
+    """
+    The (seat, state) pairs of everyone who may answer the claim or block
+    open in `state`, in the order the engine would ask them; each state is
+    the one that seat would be asked in after the others before it passed.
+    """
+    if state.phase == CHALLENGE:
+        last = state.claimant
+    elif state.phase == BLOCK and state.action.kind == "Foreign Aid":
+        last = state.current
+    else:
+        return [(state.to_move, state)]
+    asked = []
+    while True:
+        asked.append((state.to_move, state))
+        if state.next_alive(state.to_move) == last:
+            return asked
+        state = step(state, PASS_ACTION)  # Passing on to another player draws no cards
+
+
+def settle_window(answers):
+    """
+    The actions to play for a window's `answers`, given in the engine's
+    order: the first challenge or block stands, everyone before it passes
+    and the answers after it are dropped.
+    """
+    for i, action in enumerate(answers):
+        if action != PASS_ACTION:
+            return [PASS_ACTION] * i + [action]
+    return list(answers)
+
+
+def default_action(state, rng):
+    """
+    What `state.to_move` plays when its time runs out outside a response
+    window: its first card if it must lose one, else a random legal action.
+    """
+    if state.phase == LOSE:
+        return Action('Lose', role=state.hands[state.to_move][0])
+    return rng.choice(legal_actions(state))
+
+
+def event_record(event):
+    """The JSON message for an event every player may see, or None for one that gives away cards."""
+    if isinstance(event, (GameStarted, Stepped, Claimed)):
+        return None
+    return {"type": "event", "event": type(event).__name__, **event._asdict()}
+
+
+class Connection:
+    """
+    One client. Prompts are futures keyed by id, resolved by the client's
+    answers; closing the connection fails them with ConnectionError.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.table = None
+        self.closed = False
+        self._prompts = {}
+        self._next_id = 0
+
+    def send(self, message):
+        if not self.closed:
+            self.writer.write(json.dumps(message).encode() + b"\n")
+
+    async def ask(self, text, options, seen, deadline=None, default=0):
+        """
+        Sends a prompt and waits for the index of the option chosen. If
+        `deadline` seconds pass without one, returns `default` instead.
+        """
+        if self.closed:
+            raise ConnectionError("The player has left.")
+        prompt_id = self._next_id
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._prompts[prompt_id] = (future, len(options))
+        prompt = {"type": "prompt", "id": prompt_id, "question": text, "options": options, "view": seen}
+        if deadline is not None:
+            prompt["deadline"] = deadline
+        self.send(prompt)
+        try:
+            await self.writer.drain()
+            return await asyncio.wait_for(future, deadline)
+        except asyncio.TimeoutError:
+            self.send({"type": "expired", "id": prompt_id, "option": options[default]})
+            return default
+        finally:
+            del self._prompts[prompt_id]
+
+    def answer(self, message):
+        prompt_id, choice = message.get("id"), message.get("choice")
+        if prompt_id not in self._prompts:
+            self.send({"type": "error", "message": f"No open prompt {prompt_id}."})
+            return
+        future, count = self._prompts[prompt_id]
+        if not isinstance(choice, int) or not 0 <= choice < count:
+            self.send({"type": "error", "id": prompt_id,
+                       "message": f"Invalid choice. Please choose a number between 0 and {count - 1}."})
+            return
+        if not future.done():
+            future.set_result(choice)
+
+    async def flush(self):
+        """Waits until everything sent so far has gone out, unless the client has gone."""
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+    def close(self):
+        self.closed = True
+        for future, _ in self._prompts.values():
+            if not future.done():
+                future.set_exception(ConnectionError("The player has left."))
+        self.writer.close()
+
+
+class HumanSeat:
+    def __init__(self, name, connection):
+        self.name = name
+        self.connection = connection
+
+    async def choose(self, state, names, deadline=None, default=None):
+        actions = legal_actions(state)
+        options = [describe_option(action, names) for action in actions]
+        choice = await self.connection.ask(question(state, names), options, view(state, state.to_move), deadline,
+                                           actions.index(default) if deadline is not None else 0)
+        return actions[choice]
+
+
+class BotSeat:
+    def __init__(self, name, bot):
+        self.name = name
+        self.bot = bot
+
+    async def choose(self, state, names, deadline=None, default=None):
+        return self.bot.choose(state)
+
+
+class PolicySeat:
+    def __init__(self, name, scheduler):
+        self.name = name
+        self.scheduler = scheduler
+
+    async def choose(self, state, names, deadline=None, default=None):
+        return await self.scheduler.decide(state)
+
+
+class Table:
+    """
+    One game: waits for `num_players - len(bots)` humans to join, then
+    plays. Also the event sink that relays the game to the humans.
+    """
+
+    def __init__(self, name, num_players, bots, seed, window=DEFAULT_WINDOW, scheduler=None,
+                 turn_time=DEFAULT_TURN_TIME):
+        self.name = name
+        self.num_players = num_players
+        self.bots = bots
+        self.seed = seed
+        self.window = window
+        self.turn_time = turn_time
+        self.scheduler = scheduler
+        self.humans = []
+        self.seats = None
+        self.names = None
+        self.started = False
+        self._rng = None
+        self._events = None
+
+    @property
+    def open_seats(self):
+        return self.num_players - len(self.bots) - len(self.humans)
+
+    def join(self, name, connection):
+        self.humans.append(HumanSeat(name, connection))
+        connection.table = self
+        self.broadcast({"type": "joined", "table": self.name, "name": name, "open_seats": self.open_seats})
+
+    def leave(self, connection):
+        self.humans = [human for human in self.humans if human.connection is not connection]
+
+    def broadcast(self, message):
+        for human in self.humans:
+            human.connection.send(message)
+
+    def emit(self, event):
+        message = event_record(event)
+        if message:
+            self.broadcast(message)
+
+    async def run(self):
+        self.started = True
+        self._rng = GameRng(self.seed)
+        self.seats = list(self.humans)
+        for i, strategy in enumerate(self.bots):
+            seat = len(self.seats)
+            name = f"{strategy} bot {i + 1}"
+            if strategy == "policy":
+                self.seats.append(PolicySeat(name, self.scheduler))
+            else:
+                self.seats.append(BotSeat(name, BOT_CLASSES[strategy](rng=self._rng.seat(seat))))
+        self.names = [seat.name for seat in self.seats]
+        for seat, human in enumerate(self.humans):
+            human.connection.send({"type": "started", "table": self.name, "seat": seat, "names": self.names,
+                                   "seed": self.seed})
+        self._events = EventStream([self])
+        state = self._events.new_game(self.num_players, self._rng.deck)
+        while state.phase != GAME_OVER:
+            if state.phase in (CHALLENGE, BLOCK):
+                asked = response_window(state)
+                answers = await asyncio.gather(*(self._respond(seat, position) for seat, position in asked))
+                for action in settle_window(answers):
+                    state = self._play(state, action)
+                continue
+            seat = state.to_move
+            player = self.seats[seat]
+            # Only a person can run out of time, so only they draw a default from the seat's stream
+            default = default_action(state, self._rng.seat(seat)) if isinstance(player, HumanSeat) else None
+            try:
+                action = await player.choose(state, self.names, self.turn_time, default)
+            except ConnectionError:
+                self._take_over(seat)
+                continue
+            state = self._play(state, action)
+        for human in self.humans:
+            await human.connection.flush()
+        return state
+
+    async def _respond(self, seat, state):
+        """One answer in a response window. Silence by the deadline counts as a pass, and so does leaving."""
+        try:
+            return await self.seats[seat].choose(state, self.names, self.window, PASS_ACTION)
+        except ConnectionError:
+            self._take_over(seat)
+            return PASS_ACTION
+
+    def _take_over(self, seat):
+        """Hands the seat of a player who left to a bot."""
+        self.seats[seat] = BotSeat(self.names[seat], RandomBot(rng=self._rng.seat(seat)))
+        self.broadcast({"type": "left", "seat": seat, "name": self.names[seat]})
+
+    def _play(self, state, action):
+        after = self._events.step(state, action, self._rng.deck)
+        for observer, player in enumerate(self.seats):
+            if isinstance(player, BotSeat) and hasattr(player.bot, "observe"):
+                player.bot.observe(observer, state, action, after)
+        return after
+
+
+class CoupServer:
+    """Hosts any number of tables, each one a task on the event loop."""
+
+    def __init__(self, seed=None, window=DEFAULT_WINDOW, policy=None, turn_time=DEFAULT_TURN_TIME):
+        self.seed = new_seed() if seed is None else seed
+        self.window = window
+        self.turn_time = turn_time
+        self.scheduler = BatchScheduler(policy or RandomPolicy(self.seed))
+        self.tables = {}
+        self.games = 0
+        self._tasks = set()
+
+    async def serve(self, host="localhost", port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        connection = Connection(reader, writer)
+        try:
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    connection.send({"type": "error", "message": "Messages must be JSON objects, one per line."})
+                    continue
+                kind = message.get("type") if isinstance(message, dict) else None
+                if kind == "join":
+                    self.join(connection, message)
+                elif kind == "answer":
+                    connection.answer(message)
+                else:
+                    connection.send({"type": "error", "message": f"Unknown message type {kind!r}."})
+        except ConnectionError:
+            pass
+        finally:
+            connection.close()
+            table = connection.table
+            if table is not None and not table.started:
+                table.leave(connection)
+                if not table.humans:
+                    del self.tables[table.name]
+
+    def join(self, connection, message):
+        if connection.table is not None:
+            connection.send({"type": "error", "message": f"You are already at table {connection.table.name}."})
+            return
+        name = str(message.get("name") or "Player")
+        table_name = str(message.get("table") or f"table-{self.games}")
+        table = self.tables.get(table_name)
+        if table is None:
+            num_players = message.get("players", 2)
+            bots = message.get("bots", [])
+            error = None
+            if not isinstance(num_players, int) or not 2 <= num_players <= MAX_PLAYERS:
+                error = f"Tables seat 2 to {MAX_PLAYERS} players."
+            elif not isinstance(bots, list) or len(bots) >= num_players:
+                error = "Bots must be a list leaving at least one seat for a person."
+            elif any(bot not in BOTS for bot in bots):
+                error = f"Bot strategies are {', '.join(BOTS)}."
+            if error:
+                connection.send({"type": "error", "message": error})
+                return
+            table = Table(table_name, num_players, bots, game_seed(self.seed, self.games), self.window,
+                          self.scheduler, self.turn_time)
+            self.games += 1
+            self.tables[table_name] = table
+        elif table.started:
+            connection.send({"type": "error", "message": f"The game at table {table_name} has already started."})
+            return
+        table.join(name, connection)
+        if not table.open_seats:
+            task = asyncio.create_task(self._play(table))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _play(self, table):
+        try:
+            await table.run()
+        except Exception as e:
+            table.broadcast({"type": "error", "message": f"The game stopped: {e}"})
+            raise
+        finally:
+            del self.tables[table.name]
+            for human in table.humans:
+                human.connection.table = None
+
+
+async def play(host, port, name, table, players, bots):
+    """A terminal client: prints what happens and answers prompts from the keyboard."""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(json.dumps({"type": "join", "table": table, "name": name, "players": players,
+                             "bots": bots}).encode() + b"\n")
+    names = None
+    loop = asyncio.get_running_loop()
+    async for line in reader:
+        message = json.loads(line)
+        kind = message["type"]
+        if kind == "joined":
+            waiting = f"; waiting for {message['open_seats']} more" if message["open_seats"] else ""
+            print(f"{message['name']} joined {message['table']}{waiting}.")
+        elif kind == "started":
+            names = message["names"]
+            print(f"\nThe game begins: {', '.join(names)}. You are {names[message['seat']]}.")
+        elif kind == "left":
+            print(f"{message['name']} left; a bot plays on for them.")
+        elif kind == "error":
+            print(message["message"])
+        elif kind == "expired":
+            print(f"Time is up: {message['option']}.")
+        elif kind == "event":
+            fields = {k: v for k, v in message.items() if k not in ("type", "event")}
+            event = getattr(coup_events, message["event"])(**fields)
+            print(format_event(event, names))
+            if isinstance(event, GameEnded):
+                break
+        elif kind == "prompt":
+            you = message["view"]
+            cards = you["hand"] + [f"({role})" for role in you["dead"][you["seat"]]]
+            print(f"\nCoins: {you['coins'][you['seat']]}  Cards: {', '.join(cards)}")
+            deadline = f" ({message['deadline']:g} seconds)" if "deadline" in message else ""
+            print(message["question"] + deadline)
+            for i, option in enumerate(message["options"]):
+                print(f"{i + 1}. {option}")
+            while True:
+                text = await loop.run_in_executor(None, input, "> ")
+                if text.strip().isdigit() and 1 <= int(text) <= len(message["options"]):
+                    break
+                print(f"Please enter a number between 1 and {len(message['options'])}.")
+            writer.write(json.dumps({"type": "answer", "id": message["id"], "choice": int(text) - 1}).encode() + b"\n")
+    writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host Coup tables over TCP, or join one.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run a server")
+    serve_parser.add_argument("--host", default="localhost")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--seed", type=int, help="base seed; table N plays game N of it")
+    serve_parser.add_argument("--window", type=float, default=DEFAULT_WINDOW,
+                              help="seconds players get to challenge or block")
+    serve_parser.add_argument("--turn-time", type=float, default=DEFAULT_TURN_TIME,
+                              help="seconds players get for any other decision")
+    serve_parser.add_argument("--policy", metavar="NPZ", help="weights for the policy bot (default: uniform random)")
+    play_parser = commands.add_parser("play", help="join a table from this terminal")
+    play_parser.add_argument("--host", default="localhost")
+    play_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    play_parser.add_argument("--name", default="Player")
+    play_parser.add_argument("--table", default="lobby", help="table to join or create")
+    play_parser.add_argument("--players", type=int, default=2, help="seats, if this creates the table")
+    play_parser.add_argument("--bots", nargs="*", default=[], choices=sorted(BOTS),
+                             help="bot strategies filling seats, if this creates the table")
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "serve":
+            policy = LinearPolicy.load(args.policy, seed=args.seed) if args.policy else None
+            server = CoupServer(args.seed, args.window, policy, args.turn_time)
+            print(f"Serving Coup on {args.host}:{args.port} (seed {server.seed})", file=sys.stderr)
+            asyncio.run(server.serve(args.host, args.port))
+        else:
+            asyncio.run(play(args.host, args.port, args.name, args.table, args.players, args.bots))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
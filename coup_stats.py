@@ -0,0 +1,236 @@
+# Streaming game statistics in constant memory
+#
+# GameStats is an event sink: hand it every event of millions of games and
+# it keeps only running totals, never a list of games. Aggregates from
+# separate workers merge with merge(), and snapshot() turns them into a
+# JSON-ready dict.
+#
+#   python coup_stats.py replays/*.cpr      # statistics of recorded games
+
+import argparse
+import json
+import math
+import sys
+
+from coup_engine import ACTION_KINDS, BLOCKS, ROLES
+from coup_events import ActionTaken, Blocked, Challenged, Claimed, GameEnded, GameStarted, describe_step
+from coup_replay import play_back, read_replays
+
+COIN_BRACKETS = ((0, 2), (3, 6), (7, 9), (10, None))  # the bot weight tables change at 3, 7 and 10 coins
+
+
+def _bracket(coins):
+    for i, (low, high) in enumerate(COIN_BRACKETS):
+        if high is None or coins <= high:
+            return i
+
+
+def _bracket_name(bracket):
+    low, high = COIN_BRACKETS[bracket]
+    return f"{low}+" if high is None else f"{low}-{high}"
+
+
+class RunningStats:
+    """Count, mean, variance, min and max by Welford's method, mergeable."""
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def snapshot(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.mean, "stdev": math.sqrt(self.variance),
+                "min": self.min, "max": self.max}
+
+
+class QuantileSketch:
+    """
+    A mergeable quantile sketch for non-negative values: values are counted
+    in buckets whose width grows geometrically, so any quantile comes back
+    within `accuracy` (relative) using a few hundred buckets at most.
+    """
+    __slots__ = ('gamma', 'log_gamma', 'buckets', 'zeros', 'count')
+
+    def __init__(self, accuracy=0.01):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, x):
+        self.count += 1
+        if x <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(x) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Only sketches with the same accuracy can be merged.")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class GameStats:
+    """
+    Aggregates the events of any number of games:
+
+    - win rate by seat, for each player count
+    - action frequencies by the actor's coins
+    - how often each role is claimed as a bluff, and how often a bluff is caught
+    - how often blocks stand, by the action blocked
+    - game length: mean and spread, plus quantiles
+    """
+
+    def __init__(self, accuracy=0.01):
+        self.games = {}            # player count -> games played
+        self.seat_wins = {}        # player count -> wins per seat
+        self.actions = [[0] * len(ACTION_KINDS) for _ in COIN_BRACKETS]
+        self.claims = [[0, 0, 0] for _ in ROLES]    # per role: claims, bluffs, bluffs caught
+        self.blocks = {kind: [0, 0] for kind in BLOCKS}  # per action blocked: blocks, blocks that stood
+        self.length = RunningStats()
+        self.length_quantiles = QuantileSketch(accuracy)
+        self._players = 0      # of the game in progress
+        self._kind = None      # action of the turn in progress
+
+    def emit(self, event):
+        if isinstance(event, ActionTaken):
+            self._kind = event.kind
+            self.actions[_bracket(event.coins)][ACTION_KINDS.index(event.kind)] += 1
+        elif isinstance(event, Claimed):
+            claims = self.claims[event.role]
+            claims[0] += 1
+            if not event.truthful:
+                claims[1] += 1
+        elif isinstance(event, Blocked):
+            blocks = self.blocks[self._kind]
+            blocks[0] += 1
+            blocks[1] += 1  # Taken back below if the block is challenged away
+        elif isinstance(event, Challenged):
+            if not event.upheld:
+                self.claims[event.role][2] += 1
+                if event.blocking:
+                    self.blocks[self._kind][1] -= 1
+        elif isinstance(event, GameStarted):
+            self._players = event.num_players
+        elif isinstance(event, GameEnded):
+            n = self._players
+            self.games[n] = self.games.get(n, 0) + 1
+            self.seat_wins.setdefault(n, [0] * n)[event.winner] += 1
+            self.length.add(event.turn + 1)
+            self.length_quantiles.add(event.turn + 1)
+
+    def merge(self, other):
+        for n, games in other.games.items():
+            self.games[n] = self.games.get(n, 0) + games
+            wins = self.seat_wins.setdefault(n, [0] * n)
+            self.seat_wins[n] = [a + b for a, b in zip(wins, other.seat_wins[n])]
+        for mine, theirs in zip(self.actions, other.actions):
+            mine[:] = [a + b for a, b in zip(mine, theirs)]
+        for mine, theirs in zip(self.claims, other.claims):
+            mine[:] = [a + b for a, b in zip(mine, theirs)]
+        for kind, (blocks, stood) in other.blocks.items():
+            self.blocks[kind][0] += blocks
+            self.blocks[kind][1] += stood
+        self.length.merge(other.length)
+        self.length_quantiles.merge(other.length_quantiles)
+        return self
+
+    def snapshot(self):
+        def rate(part, whole):
+            return part / whole if whole else None
+
+        actions = {}
+        for bracket, counts in enumerate(self.actions):
+            total = sum(counts)
+            actions[_bracket_name(bracket)] = {
+                kind: rate(count, total) for kind, count in zip(ACTION_KINDS, counts) if count
+            }
+        return {
+            "games": sum(self.games.values()),
+            "win_rate_by_seat": {
+                str(n): [rate(wins, self.games[n]) for wins in self.seat_wins[n]] for n in sorted(self.games)
+            },
+            "action_frequency_by_coins": actions,
+            "claims": {
+                ROLES[role]: {"claims": claims, "bluff_rate": rate(bluffs, claims), "bluffs_caught": rate(caught, bluffs)}
+                for role, (claims, bluffs, caught) in enumerate(self.claims)
+            },
+            "block_success": {
+                kind: {"blocks": blocks, "success_rate": rate(stood, blocks)}
+                for kind, (blocks, stood) in self.blocks.items()
+            },
+            "game_length": dict(self.length.snapshot(), **{
+                f"p{int(q * 100)}": self.length_quantiles.quantile(q) for q in (0.1, 0.5, 0.9, 0.99)
+            }),
+        }
+
+    def to_json(self, file, indent=2):
+        json.dump(self.snapshot(), file, indent=indent)
+        file.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate statistics over recorded Coup games.")
+    parser.add_argument("replays", nargs="+", help="binary replay files (see coup_replay.py)")
+    args = parser.parse_args(argv)
+    stats = GameStats()
+    for path in args.replays:
+        with open(path, "rb") as f:
+            for replay in read_replays(f):
+                stats.emit(GameStarted(replay.num_players, replay.deal))
+                for before, action, after in play_back(replay):
+                    for event in describe_step(before, action, after):
+                        stats.emit(event)
+    stats.to_json(sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
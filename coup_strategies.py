@@ -0,0 +1,14 @@
+# Every bot strategy by name, for the command-line tools
+#
+#   from coup_strategies import STRATEGIES
+#   bot = STRATEGIES["belief"](rng=random.Random(1))
+#
+# Each bot module adds its strategy to coup_bots.STRATEGIES when it is
+# imported. This module imports all of them, so every tool that takes
+# strategy names accepts the same ones.
+
+import coup_belief  # noqa: F401  (registers "belief")
+import coup_cfr  # noqa: F401  (registers "cfr")
+import coup_endgame  # noqa: F401  (registers "endgame")
+import coup_ismcts  # noqa: F401  (registers "ismcts")
+from coup_bots import STRATEGIES  # noqa: F401
@@ -0,0 +1,208 @@
+# Plays bot-only Coup games across a process pool and reports the results
+#
+#   python coup_tournament.py --games 20000 --players 4 --strategies random,honest
+
+import argparse
+import os
+import pstats
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+from coup_bots import play_game
+from coup_events import EventStream
+from coup_invariants import InvariantChecker, InvariantError
+from coup_profile import Profiler, ProfiledGames, format_report, profiled
+from coup_replay import ReplayWriter
+from coup_rng import GameRng, game_seed, seat_bots
+from coup_stats import GameStats
+from coup_strategies import STRATEGIES
+
+
+def empty_results(num_players):
+    return {
+        "games": 0,
+        "turns": 0,
+        "seat_wins": [0] * num_players,
+        "strategy_wins": {},
+        "strategy_seats": {},
+    }
+
+
+def merge_results(total, part):
+    total["games"] += part["games"]
+    total["turns"] += part["turns"]
+    total["seat_wins"] = [a + b for a, b in zip(total["seat_wins"], part["seat_wins"])]
+    for key in ("strategy_wins", "strategy_seats"):
+        for name, count in part[key].items():
+            total[key][name] = total[key].get(name, 0) + count
+    if "checked" in part:
+        total["checked"] = total.get("checked", 0) + part["checked"]
+    if "profiles" in part:
+        total["profiles"] = total.get("profiles", []) + part["profiles"]
+    for key in ("stats", "timings"):
+        if key in part:
+            if key in total:
+                total[key].merge(part[key])
+            else:
+                total[key] = part[key]
+    return total
+
+
+def play_batch(strategies, first, games, seed, record=None, stats=False, check=None, timings=False, profile=None,
+               check_every=8):
+    """
+    Plays games `first` to `first + games - 1` of the run seeded with `seed`.
+    Every game gets its own GameRng, so a game's result does not depend on
+    which batch or worker plays it. With a `record` directory, the games are
+    also saved there as replays; with `stats`, the results include a
+    GameStats of the batch. With a `check` directory, states are checked
+    against the engine's invariants (every state of one game in
+    `check_every`, the first and last of the others) and a game that breaks
+    one is saved there before InvariantError is raised. With `timings`, the results
+    include a Profiler of the batch's phases; with a `profile` directory,
+    the batch runs under cProfile and the results list the stats file saved
+    there under "profiles".
+    """
+    classes = [STRATEGIES[name] for name in strategies]
+    results = empty_results(len(classes))
+    for name in strategies:
+        results["strategy_seats"][name] = results["strategy_seats"].get(name, 0) + games
+        results["strategy_wins"].setdefault(name, 0)
+    with ExitStack() as stack:
+        if profile:
+            results["profiles"] = [os.path.join(profile, f"batch-{first}.pstats")]
+            stack.enter_context(profiled(results["profiles"][0]))
+        sinks = []
+        if record:
+            f = stack.enter_context(open(os.path.join(record, f"games-{first}.cpr"), "wb"))
+            sinks.append(ReplayWriter(f))
+        if stats:
+            results["stats"] = GameStats()
+            sinks.append(results["stats"])
+        events = EventStream(sinks) if sinks else None
+        if timings:
+            results["timings"] = Profiler()
+            events = timed = ProfiledGames(results["timings"], events)
+        if check:
+            events = InvariantChecker(events, dump_dir=check, every=check_every)
+        for game in range(first, first + games):
+            game_rng = GameRng(game_seed(seed, game))
+            bots = seat_bots(classes, game_rng)
+            state = play_game(timed.bots(bots) if timings else bots, game_rng.deck, events)
+            results["games"] += 1
+            results["turns"] += state.turn + 1
+            results["seat_wins"][state.winner] += 1
+            results["strategy_wins"][strategies[state.winner]] += 1
+        if check:
+            events.flush()
+            results["checked"] = events.checked
+    return results
+
+
+def run_tournament(strategies, games, workers=None, seed=0, batch_size=500, record=None, stats=False,
+                   check=None, timings=False, profile=None, progress=None, check_every=8):
+    """
+    Splits `games` into batches, plays them on `workers` processes and returns
+    the merged results, which are the same for any number of workers and any
+    batch size. Calls `progress(results)` with the results so far after each
+    batch.
+    """
+    for directory in (record, profile):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    results = empty_results(len(strategies))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_batch, strategies, first, min(batch_size, games - first), seed, record, stats,
+                               check, timings, profile, check_every)
+                   for first in range(0, games, batch_size)]
+        for future in futures:
+            merge_results(results, future.result())
+            if progress:
+                progress(results)
+    return results
+
+
+def print_report(results, strategies, elapsed):
+    games = results["games"]
+    print(f"Played {games} games in {elapsed:.2f}s ({games / elapsed:.0f} games/sec)")
+    print(f"Average game length: {results['turns'] / games:.2f} turns")
+    if "checked" in results:
+        print(f"Checked {results['checked']} states: every invariant held")
+    print()
+    print("Win rate by seat:")
+    for seat, wins in enumerate(results["seat_wins"]):
+        print(f"  Seat {seat + 1} ({strategies[seat]}): {100 * wins / games:.2f}%")
+    print()
+    print("Win rate by strategy:")
+    for name, wins in results["strategy_wins"].items():
+        seats = results["strategy_seats"][name]
+        print(f"  {name}: {100 * wins / seats:.2f}% over {seats} seats")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Play all-bot Coup games and report win rates.")
+    parser.add_argument("--games", type=int, default=10000, help="number of games to play")
+    parser.add_argument("--players", type=int, default=4, help="players per game (2-6)")
+    parser.add_argument("--strategies", default="random",
+                        help=f"comma separated bot per seat, cycled to fill the table ({', '.join(STRATEGIES)})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="base random seed")
+    parser.add_argument("--batch-size", type=int, default=500, help="games per work item")
+    parser.add_argument("--record", metavar="DIR", help="save every game as a replay file per batch in DIR")
+    parser.add_argument("--stats", metavar="FILE", help="write detailed game statistics to FILE as JSON")
+    parser.add_argument("--check", metavar="DIR", nargs="?", const=".",
+                        help="check states against the engine's invariants, saving a game that breaks one "
+                             "to DIR (default: the current directory)")
+    parser.add_argument("--check-every", type=int, default=8, metavar="N",
+                        help="with --check, check and record every state of one game in N, and only the first "
+                             "and last states of the others (default: 8; 1 checks everything)")
+    parser.add_argument("--timings", metavar="FILE",
+                        help="time every phase of play and write the report to FILE as JSON, or in the Prometheus "
+                             "text format if FILE ends in .prom; rewritten after every batch")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="run every batch under cProfile, saving the stats in DIR, and print the busiest "
+                             "functions of the whole run")
+    args = parser.parse_args(argv)
+    if not 2 <= args.players <= 6:
+        parser.error("--players must be between 2 and 6")
+    names = args.strategies.split(",")
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategy: {', '.join(unknown)}")
+    args.strategies = [names[i % len(names)] for i in range(args.players)]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.perf_counter()
+
+    def progress(results):
+        results["timings"].save(args.timings)
+
+    try:
+        results = run_tournament(args.strategies, args.games, args.workers, args.seed, args.batch_size,
+                                 args.record, bool(args.stats), args.check, bool(args.timings), args.profile,
+                                 progress if args.timings else None, args.check_every)
+    except InvariantError as e:
+        raise SystemExit(f"Invariant broken: {e}")
+    except FileNotFoundError as e:  # a bot missing the table it plays from
+        raise SystemExit(str(e))
+    print_report(results, args.strategies, time.perf_counter() - start)
+    if args.timings:
+        print()
+        print(format_report(results["timings"].snapshot()))
+    if args.profile:
+        print()
+        print(f"Busiest functions over every worker (all stats in {os.path.join(args.profile, 'all.pstats')}):")
+        stats = pstats.Stats(*results["profiles"])  # only this run's, not older files in the directory
+        stats.dump_stats(os.path.join(args.profile, "all.pstats"))
+        stats.sort_stats("tottime").print_stats(20)
+    if args.stats:
+        with open(args.stats, "w") as f:
+            results["stats"].to_json(f)
+
+
+if __name__ == "__main__":
+    main()